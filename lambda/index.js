@@ -5,20 +5,51 @@ const axios = require('axios');
 const YTMUSIC_API_ENDPOINT = process.env.YTMUSIC_API_ENDPOINT || 'http://localhost:8080';
 const API_KEY = process.env.API_KEY || '';
 
-// Helper function to make requests to our Python service
-async function callYTMusicAPI(endpoint, params = {}, method = 'POST') {
+// YouTube Music account per Alexa user, for the multi-account Vercel handler:
+// {"<Alexa userId>": {"account": "<account>", "token": "<account token>"}}
+let YTMUSIC_ACCOUNTS = {};
+try {
+    YTMUSIC_ACCOUNTS = JSON.parse(process.env.YTMUSIC_ACCOUNTS || '{}');
+} catch (error) {
+    console.error('Ignoring invalid YTMUSIC_ACCOUNTS:', error.message);
+}
+
+// Alexa waits about 8 seconds for a response; keep some room to build it
+const ALEXA_RESPONSE_BUDGET_MS = 7000;
+const DEFAULT_API_TIMEOUT_MS = 15000;
+
+// Helper function to make requests to our Python service.
+// When deadlineAt (epoch ms) is given, the call times out at the deadline and
+// the service is told how long it has via X-Request-Deadline-Ms. An account
+// ({account, token}) is sent as X-Account-Id / X-Account-Token.
+async function callYTMusicAPI(endpoint, params = {}, method = 'POST', deadlineAt = null, account = null) {
     try {
         const config = {
             headers: {
                 'Content-Type': 'application/json',
             },
-            timeout: 15000, // 15 second timeout
+            timeout: DEFAULT_API_TIMEOUT_MS,
         };
 
         if (API_KEY) {
             config.headers['X-API-Key'] = API_KEY;
         }
 
+        if (account) {
+            config.headers['X-Account-Id'] = account.account;
+            config.headers['X-Account-Token'] = account.token;
+        }
+
+        if (deadlineAt) {
+            const remaining = deadlineAt - Date.now();
+            if (remaining <= 0) {
+                console.error(`Skipping ${endpoint}: response deadline already passed`);
+                return null;
+            }
+            config.timeout = remaining;
+            config.headers['X-Request-Deadline-Ms'] = String(remaining);
+        }
+
         let response;
         if (method === 'GET') {
             response = await axios.get(`${YTMUSIC_API_ENDPOINT}${endpoint}`, config);
@@ -38,6 +69,56 @@ function getLocaleMessage(handlerInput, esMessage, enMessage) {
     return locale.startsWith('es') ? esMessage : enMessage;
 }
 
+// The play queue lives in the Python service, keyed by the device so that
+// AudioPlayer events (which have no session) reach the same queue.
+function getQueueId(handlerInput) {
+    const envelope = handlerInput.requestEnvelope;
+    const system = envelope.context && envelope.context.System;
+    if (system && system.device && system.device.deviceId) {
+        return system.device.deviceId;
+    }
+    return envelope.session ? envelope.session.sessionId : null;
+}
+
+// Create the queue for these tracks; the response carries the first track
+// with its stream_url already resolved.
+async function startQueue(handlerInput, tracks) {
+    return callYTMusicAPI('/queue', {
+        queue_id: getQueueId(handlerInput),
+        tracks: tracks.map(t => ({ video_id: t.video_id, title: t.title, artist: t.artist })),
+    }, 'POST', handlerInput.deadlineAt, handlerInput.account);
+}
+
+// Move the queue by step (1 next, -1 previous) and get the resolved track
+async function advanceQueue(handlerInput, step, wrap = true) {
+    const queueId = getQueueId(handlerInput);
+    if (!queueId) {
+        return null;
+    }
+    return callYTMusicAPI(`/queue/${encodeURIComponent(queueId)}/advance`, {
+        step,
+        wrap,
+    }, 'POST', handlerInput.deadlineAt, handlerInput.account);
+}
+
+// Remember only the current song (for resume) and the queue id in session.
+// AudioPlayer events come without a session, and the queue already lives in
+// the service, so there is nothing to save for them.
+function saveCurrentSong(handlerInput, queueResult) {
+    if (!handlerInput.requestEnvelope.session) {
+        return;
+    }
+    const sessionAttributes = handlerInput.attributesManager.getSessionAttributes();
+    sessionAttributes.queueId = queueResult.queue_id;
+    sessionAttributes.currentSong = {
+        video_id: queueResult.current.video_id,
+        title: queueResult.current.title,
+        artist: queueResult.current.artist,
+        stream_url: queueResult.current.stream_url,
+    };
+    handlerInput.attributesManager.setSessionAttributes(sessionAttributes);
+}
+
 // Helper to search and play music
 async function searchAndPlay(handlerInput, query) {
     if (!query) {
@@ -53,7 +134,7 @@ async function searchAndPlay(handlerInput, query) {
     }
 
     // Search music on YouTube Music
-    const searchResult = await callYTMusicAPI('/search', { query });
+    const searchResult = await callYTMusicAPI('/search', { query }, 'POST', handlerInput.deadlineAt, handlerInput.account);
 
     if (!searchResult || !searchResult.results || searchResult.results.length === 0) {
         const speakOutput = getLocaleMessage(
@@ -66,14 +147,10 @@ async function searchAndPlay(handlerInput, query) {
             .getResponse();
     }
 
-    const firstResult = searchResult.results[0];
-
-    // Get the actual audio stream URL (critical step)
-    const streamData = await callYTMusicAPI('/stream', {
-        video_id: firstResult.video_id
-    });
+    // Queue the results and get the first track's audio stream URL
+    const queueResult = await startQueue(handlerInput, searchResult.results);
 
-    if (!streamData || !streamData.stream_url) {
+    if (!queueResult || !queueResult.current || !queueResult.current.stream_url) {
         const speakOutput = getLocaleMessage(
             handlerInput,
             'No pude obtener el audio. Por favor intentá de nuevo.',
@@ -84,28 +161,20 @@ async function searchAndPlay(handlerInput, query) {
             .getResponse();
     }
 
+    const firstResult = queueResult.current;
     const speakOutput = getLocaleMessage(
         handlerInput,
         `Reproduciendo ${firstResult.title} de ${firstResult.artist}`,
         `Playing ${firstResult.title} by ${firstResult.artist}`
     );
 
-    // Save current song info in session for playback controls
-    const sessionAttributes = handlerInput.attributesManager.getSessionAttributes();
-    sessionAttributes.currentSong = {
-        video_id: firstResult.video_id,
-        title: firstResult.title,
-        artist: firstResult.artist,
-        stream_url: streamData.stream_url,
-    };
-    sessionAttributes.lastSearchResults = searchResult.results;
-    handlerInput.attributesManager.setSessionAttributes(sessionAttributes);
+    saveCurrentSong(handlerInput, queueResult);
 
     return handlerInput.responseBuilder
         .speak(speakOutput)
         .addAudioPlayerPlayDirective(
             'REPLACE_ALL',
-            streamData.stream_url,
+            firstResult.stream_url,
             firstResult.video_id,
             0
         )
@@ -183,7 +252,7 @@ const PlayPlaylistIntentHandler = {
         }
 
         // Search user playlists
-        const playlistsResult = await callYTMusicAPI('/playlists', {}, 'POST');
+        const playlistsResult = await callYTMusicAPI('/playlists', {}, 'POST', handlerInput.deadlineAt, handlerInput.account);
 
         if (!playlistsResult || !playlistsResult.playlists || playlistsResult.playlists.length === 0) {
             const speakOutput = getLocaleMessage(
@@ -214,7 +283,7 @@ const PlayPlaylistIntentHandler = {
         }
 
         // Get playlist songs
-        const playlistSongs = await callYTMusicAPI(`/playlist/${playlist.playlist_id}`, {}, 'GET');
+        const playlistSongs = await callYTMusicAPI(`/playlist/${playlist.playlist_id}`, {}, 'GET', handlerInput.deadlineAt, handlerInput.account);
 
         if (!playlistSongs || !playlistSongs.songs || playlistSongs.songs.length === 0) {
             const speakOutput = getLocaleMessage(
@@ -227,13 +296,10 @@ const PlayPlaylistIntentHandler = {
                 .getResponse();
         }
 
-        // Get stream URL for first song
-        const firstSong = playlistSongs.songs[0];
-        const streamData = await callYTMusicAPI('/stream', {
-            video_id: firstSong.video_id
-        });
+        // Queue the playlist and get the stream URL for the first song
+        const queueResult = await startQueue(handlerInput, playlistSongs.songs);
 
-        if (!streamData || !streamData.stream_url) {
+        if (!queueResult || !queueResult.current || !queueResult.current.stream_url) {
             const speakOutput = getLocaleMessage(
                 handlerInput,
                 'No pude obtener el audio de la playlist. Intentá de nuevo.',
@@ -244,29 +310,20 @@ const PlayPlaylistIntentHandler = {
                 .getResponse();
         }
 
+        const firstSong = queueResult.current;
         const speakOutput = getLocaleMessage(
             handlerInput,
             `Reproduciendo la playlist ${playlist.title}. Primera canción: ${firstSong.title} de ${firstSong.artist}`,
             `Playing playlist ${playlist.title}. First song: ${firstSong.title} by ${firstSong.artist}`
         );
 
-        // Save playlist songs in session for next/previous navigation
-        const sessionAttributes = handlerInput.attributesManager.getSessionAttributes();
-        sessionAttributes.currentPlaylist = playlistSongs.songs;
-        sessionAttributes.currentIndex = 0;
-        sessionAttributes.currentSong = {
-            video_id: firstSong.video_id,
-            title: firstSong.title,
-            artist: firstSong.artist,
-            stream_url: streamData.stream_url,
-        };
-        handlerInput.attributesManager.setSessionAttributes(sessionAttributes);
+        saveCurrentSong(handlerInput, queueResult);
 
         return handlerInput.responseBuilder
             .speak(speakOutput)
             .addAudioPlayerPlayDirective(
                 'REPLACE_ALL',
-                streamData.stream_url,
+                firstSong.stream_url,
                 firstSong.video_id,
                 0
             )
@@ -281,11 +338,9 @@ const NextIntentHandler = {
             && Alexa.getIntentName(handlerInput.requestEnvelope) === 'AMAZON.NextIntent';
     },
     async handle(handlerInput) {
-        const sessionAttributes = handlerInput.attributesManager.getSessionAttributes();
-        const playlist = sessionAttributes.currentPlaylist;
-        let currentIndex = sessionAttributes.currentIndex || 0;
+        const queueResult = await advanceQueue(handlerInput, 1);
 
-        if (!playlist || playlist.length === 0) {
+        if (!queueResult) {
             const speakOutput = getLocaleMessage(
                 handlerInput,
                 'No hay una playlist activa para avanzar.',
@@ -296,15 +351,7 @@ const NextIntentHandler = {
                 .getResponse();
         }
 
-        currentIndex = (currentIndex + 1) % playlist.length;
-        const nextSong = playlist[currentIndex];
-
-        // Get stream URL for next song
-        const streamData = await callYTMusicAPI('/stream', {
-            video_id: nextSong.video_id
-        });
-
-        if (!streamData || !streamData.stream_url) {
+        if (!queueResult.current || !queueResult.current.stream_url) {
             const speakOutput = getLocaleMessage(
                 handlerInput,
                 'No pude obtener el audio de la siguiente canción.',
@@ -315,14 +362,8 @@ const NextIntentHandler = {
                 .getResponse();
         }
 
-        sessionAttributes.currentIndex = currentIndex;
-        sessionAttributes.currentSong = {
-            video_id: nextSong.video_id,
-            title: nextSong.title,
-            artist: nextSong.artist,
-            stream_url: streamData.stream_url,
-        };
-        handlerInput.attributesManager.setSessionAttributes(sessionAttributes);
+        const nextSong = queueResult.current;
+        saveCurrentSong(handlerInput, queueResult);
 
         const speakOutput = getLocaleMessage(
             handlerInput,
@@ -334,7 +375,7 @@ const NextIntentHandler = {
             .speak(speakOutput)
             .addAudioPlayerPlayDirective(
                 'REPLACE_ALL',
-                streamData.stream_url,
+                nextSong.stream_url,
                 nextSong.video_id,
                 0
             )
@@ -349,11 +390,9 @@ const PreviousIntentHandler = {
             && Alexa.getIntentName(handlerInput.requestEnvelope) === 'AMAZON.PreviousIntent';
     },
     async handle(handlerInput) {
-        const sessionAttributes = handlerInput.attributesManager.getSessionAttributes();
-        const playlist = sessionAttributes.currentPlaylist;
-        let currentIndex = sessionAttributes.currentIndex || 0;
+        const queueResult = await advanceQueue(handlerInput, -1);
 
-        if (!playlist || playlist.length === 0) {
+        if (!queueResult) {
             const speakOutput = getLocaleMessage(
                 handlerInput,
                 'No hay una playlist activa para retroceder.',
@@ -364,14 +403,7 @@ const PreviousIntentHandler = {
                 .getResponse();
         }
 
-        currentIndex = currentIndex > 0 ? currentIndex - 1 : playlist.length - 1;
-        const prevSong = playlist[currentIndex];
-
-        const streamData = await callYTMusicAPI('/stream', {
-            video_id: prevSong.video_id
-        });
-
-        if (!streamData || !streamData.stream_url) {
+        if (!queueResult.current || !queueResult.current.stream_url) {
             const speakOutput = getLocaleMessage(
                 handlerInput,
                 'No pude obtener el audio de la canción anterior.',
@@ -382,14 +414,8 @@ const PreviousIntentHandler = {
                 .getResponse();
         }
 
-        sessionAttributes.currentIndex = currentIndex;
-        sessionAttributes.currentSong = {
-            video_id: prevSong.video_id,
-            title: prevSong.title,
-            artist: prevSong.artist,
-            stream_url: streamData.stream_url,
-        };
-        handlerInput.attributesManager.setSessionAttributes(sessionAttributes);
+        const prevSong = queueResult.current;
+        saveCurrentSong(handlerInput, queueResult);
 
         const speakOutput = getLocaleMessage(
             handlerInput,
@@ -401,7 +427,7 @@ const PreviousIntentHandler = {
             .speak(speakOutput)
             .addAudioPlayerPlayDirective(
                 'REPLACE_ALL',
-                streamData.stream_url,
+                prevSong.stream_url,
                 prevSong.video_id,
                 0
             )
@@ -468,35 +494,18 @@ const AudioPlayerEventHandler = {
                 break;
             case 'AudioPlayer.PlaybackFinished':
                 console.log('Playback finished');
-                // Auto-play next song if in playlist mode
-                const sessionAttributes = handlerInput.attributesManager.getSessionAttributes();
-                const playlist = sessionAttributes.currentPlaylist;
-                if (playlist && playlist.length > 0) {
-                    let currentIndex = (sessionAttributes.currentIndex || 0) + 1;
-                    if (currentIndex < playlist.length) {
-                        const nextSong = playlist[currentIndex];
-                        const streamData = await callYTMusicAPI('/stream', {
-                            video_id: nextSong.video_id
-                        });
-                        if (streamData && streamData.stream_url) {
-                            sessionAttributes.currentIndex = currentIndex;
-                            sessionAttributes.currentSong = {
-                                video_id: nextSong.video_id,
-                                title: nextSong.title,
-                                artist: nextSong.artist,
-                                stream_url: streamData.stream_url,
-                            };
-                            handlerInput.attributesManager.setSessionAttributes(sessionAttributes);
-                            return handlerInput.responseBuilder
-                                .addAudioPlayerPlayDirective(
-                                    'REPLACE_ALL',
-                                    streamData.stream_url,
-                                    nextSong.video_id,
-                                    0
-                                )
-                                .getResponse();
-                        }
-                    }
+                // Auto-play the next queued song; stop at the end of the queue
+                const queueResult = await advanceQueue(handlerInput, 1, false);
+                if (queueResult && queueResult.current && queueResult.current.stream_url) {
+                    saveCurrentSong(handlerInput, queueResult);
+                    return handlerInput.responseBuilder
+                        .addAudioPlayerPlayDirective(
+                            'REPLACE_ALL',
+                            queueResult.current.stream_url,
+                            queueResult.current.video_id,
+                            0
+                        )
+                        .getResponse();
                 }
                 break;
             case 'AudioPlayer.PlaybackStopped':
@@ -603,6 +612,22 @@ const ErrorHandler = {
     }
 };
 
+// Stamp each request with the time by which we must have answered Alexa
+const DeadlineRequestInterceptor = {
+    process(handlerInput) {
+        handlerInput.deadlineAt = Date.now() + ALEXA_RESPONSE_BUDGET_MS;
+    }
+};
+
+// Pick the YouTube Music account configured for this Alexa user, if any
+const AccountRequestInterceptor = {
+    process(handlerInput) {
+        const system = handlerInput.requestEnvelope.context && handlerInput.requestEnvelope.context.System;
+        const userId = system && system.user && system.user.userId;
+        handlerInput.account = (userId && YTMUSIC_ACCOUNTS[userId]) || null;
+    }
+};
+
 // Skill Builder
 exports.handler = Alexa.SkillBuilders.custom()
     .addRequestHandlers(
@@ -620,6 +645,7 @@ exports.handler = Alexa.SkillBuilders.custom()
         FallbackIntentHandler,
         SessionEndedRequestHandler
     )
+    .addRequestInterceptors(DeadlineRequestInterceptor, AccountRequestInterceptor)
     .addErrorHandlers(ErrorHandler)
     .withCustomUserAgent('youtube-music-alexa-skill/v1.0')
     .lambda();
@@ -239,5 +239,122 @@ test('AudioPlayer directive has correct structure', () => {
     assert.strictEqual(response.directives[0].offset, 0);
 });
 
+test('Deadline header carries the remaining Alexa budget', async () => {
+    const { calls } = await invokeSkill(createAudioPlayerEvent('AudioPlayer.PlaybackFinished'), NEXT_IN_QUEUE);
+
+    const config = calls[0].config;
+    const header = Number(config.headers['X-Request-Deadline-Ms']);
+    assert.ok(header > 0 && header <= 7000, `deadline header ${header} should fit the Alexa budget`);
+    assert.ok(config.timeout > 0 && config.timeout <= 7000, `timeout ${config.timeout} should fit the Alexa budget`);
+    assert.strictEqual(config.timeout, header);
+});
+
+test('Queue id prefers the device over the session', () => {
+    const mockInput = createMockRequest('AudioPlayer.PlaybackFinished', null, 'en-US');
+    mockInput.requestEnvelope.context = { System: { device: { deviceId: 'amzn1.ask.device.A' } } };
+    mockInput.requestEnvelope.session = { sessionId: 'amzn1.echo-api.session.B' };
+
+    const envelope = mockInput.requestEnvelope;
+    const system = envelope.context && envelope.context.System;
+    const queueId = system && system.device && system.device.deviceId
+        ? system.device.deviceId
+        : envelope.session.sessionId;
+    assert.strictEqual(queueId, 'amzn1.ask.device.A');
+
+    // Only the current song and the queue id stay in session attributes
+    mockInput.attributesManager.setSessionAttributes({
+        queueId,
+        currentSong: { video_id: 'a', title: 'Song A', artist: 'Artist 1', stream_url: 'https://example.com/a' },
+    });
+    const attrs = mockInput.attributesManager.getSessionAttributes();
+    assert.deepStrictEqual(Object.keys(attrs).sort(), ['currentSong', 'queueId']);
+});
+
+// Session-less AudioPlayer event, as Alexa sends it to the real skill handler
+function createAudioPlayerEvent(type, userId = 'amzn1.ask.account.test') {
+    return {
+        version: '1.0',
+        context: {
+            System: {
+                application: { applicationId: 'amzn1.ask.skill.test' },
+                device: { deviceId: 'amzn1.ask.device.A', supportedInterfaces: { AudioPlayer: {} } },
+                user: { userId },
+            },
+            AudioPlayer: { token: 'a', offsetInMilliseconds: 200000, playerActivity: 'FINISHED' },
+        },
+        request: {
+            type,
+            requestId: 'amzn1.echo-api.request.test',
+            timestamp: new Date().toISOString(),
+            locale: 'en-US',
+            token: 'a',
+            offsetInMilliseconds: 200000,
+        },
+    };
+}
+
+// Run index.js's handler on event with axios.post answering queueResult;
+// returns the response envelope and the recorded API calls
+async function invokeSkill(event, queueResult) {
+    // Only the HTTP call to the service is stubbed
+    const axios = require('axios');
+    const { handler } = require('../index.js');
+    const calls = [];
+    const originalPost = axios.post;
+    axios.post = async (url, params, config) => {
+        calls.push({ url, params, config });
+        return { data: queueResult };
+    };
+    try {
+        const envelope = await new Promise((resolve, reject) => {
+            handler(event, {}, (err, result) => (err ? reject(err) : resolve(result)));
+        });
+        return { envelope, calls };
+    } finally {
+        axios.post = originalPost;
+    }
+}
+
+const NEXT_IN_QUEUE = {
+    queue_id: 'amzn1.ask.device.A',
+    position: 1,
+    length: 2,
+    current: { video_id: 'b', title: 'Song B', artist: 'Artist 2', stream_url: 'https://example.com/b' },
+};
+
+test('PlaybackFinished without a session plays the next queued song', async () => {
+    const { envelope, calls } = await invokeSkill(createAudioPlayerEvent('AudioPlayer.PlaybackFinished'), NEXT_IN_QUEUE);
+
+    assert.strictEqual(calls.length, 1);
+    assert.ok(calls[0].url.endsWith('/queue/amzn1.ask.device.A/advance'));
+    assert.deepStrictEqual(calls[0].params, { step: 1, wrap: false });
+    assert.strictEqual(calls[0].config.headers['X-Account-Id'], undefined);
+
+    const response = envelope.response;
+    assert.strictEqual(response.outputSpeech, undefined, 'should not fall through to the error handler');
+    assert.strictEqual(response.directives.length, 1);
+    assert.strictEqual(response.directives[0].type, 'AudioPlayer.Play');
+    assert.strictEqual(response.directives[0].playBehavior, 'REPLACE_ALL');
+    assert.strictEqual(response.directives[0].audioItem.stream.url, 'https://example.com/b');
+    assert.strictEqual(response.directives[0].audioItem.stream.token, 'b');
+});
+
+test('Configured Alexa users send their account and token', async () => {
+    // YTMUSIC_ACCOUNTS is read when index.js loads
+    process.env.YTMUSIC_ACCOUNTS = JSON.stringify({
+        'amzn1.ask.account.maria': { account: 'maria', token: 'token-for-maria' },
+    });
+    delete require.cache[require.resolve('../index.js')];
+    try {
+        const { calls } = await invokeSkill(
+            createAudioPlayerEvent('AudioPlayer.PlaybackFinished', 'amzn1.ask.account.maria'), NEXT_IN_QUEUE);
+        assert.strictEqual(calls[0].config.headers['X-Account-Id'], 'maria');
+        assert.strictEqual(calls[0].config.headers['X-Account-Token'], 'token-for-maria');
+    } finally {
+        delete process.env.YTMUSIC_ACCOUNTS;
+        delete require.cache[require.resolve('../index.js')];
+    }
+});
+
 // Run all tests
 runTests();
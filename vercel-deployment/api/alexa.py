@@ -1,7 +1,13 @@
 from http.server import BaseHTTPRequestHandler
+from collections import OrderedDict
+import hashlib
+import hmac
 import json
+import re
 import sys
 import os
+import threading
+import time
 
 # Add the parent directory to Python path to import ytmusicapi
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
@@ -12,21 +18,171 @@ except ImportError:
     # Fallback if ytmusicapi is not available
     YTMusic = None
 
+# Shared credentials used when a request names no account
+DEFAULT_OAUTH_PATH = os.path.join(os.path.dirname(__file__), '..', 'oauth.json')
+# One <account>.json credentials file per additional account
+OAUTH_DIR = os.environ.get('YTMUSIC_OAUTH_DIR', os.path.join(os.path.dirname(__file__), '..', 'oauth'))
+ACCOUNT_HEADER = 'X-Account-Id'
+ACCOUNT_TOKEN_HEADER = 'X-Account-Token'
+ACCOUNT_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+DEFAULT_ACCOUNT = 'default'
+# Signs account tokens; without it only the default account is served
+ACCOUNT_SECRET = os.environ.get('YTMUSIC_ACCOUNT_SECRET', '')
+
+
+class UnknownAccount(Exception):
+    pass
+
+
+def account_token(account):
+    """Token a caller must send in X-Account-Token to use ``account``."""
+    return hmac.new(ACCOUNT_SECRET.encode(), account.encode(), hashlib.sha256).hexdigest()
+
+
+class AccountClient:
+    """An authenticated YTMusic client plus that account's playlist caches."""
+
+    def __init__(self, yt, max_playlists):
+        self.yt = yt
+        self.max_playlists = max_playlists
+        self.last_used = time.time()
+        self.library = None  # (timestamp, playlists)
+        self.playlists = OrderedDict()  # playlist_id -> (timestamp, playlist)
+        self.lock = threading.Lock()
+
+    def library_playlists(self, ttl):
+        with self.lock:
+            if self.library and time.time() - self.library[0] < ttl:
+                return self.library[1]
+        playlists = self.yt.get_library_playlists(limit=25)
+        with self.lock:
+            self.library = (time.time(), playlists)
+        return playlists
+
+    def playlist(self, playlist_id, ttl):
+        with self.lock:
+            cached = self.playlists.get(playlist_id)
+            if cached and time.time() - cached[0] < ttl:
+                self.playlists.move_to_end(playlist_id)
+                return cached[1]
+        playlist = self.yt.get_playlist(playlist_id, limit=100)
+        with self.lock:
+            self.playlists[playlist_id] = (time.time(), playlist)
+            self.playlists.move_to_end(playlist_id)
+            while len(self.playlists) > self.max_playlists:
+                self.playlists.popitem(last=False)
+        return playlist
+
+
+class YTMusicPool:
+    """Bounded LRU pool of authenticated YTMusic clients keyed by account.
+
+    A warm process serves many accounts without re-reading credentials or
+    re-authenticating per request: a client is built on the account's first
+    request, looked up in O(1) afterwards, and evicted when least recently
+    used beyond ``max_clients`` or idle for ``idle_ttl`` seconds.
+    """
+
+    def __init__(self, max_clients=32, idle_ttl=1800, playlist_ttl=300, max_playlists=20):
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        self.playlist_ttl = playlist_ttl
+        self.max_playlists = max_playlists
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, account):
+        """Return the AccountClient for ``account``, creating it on first use."""
+        now = time.time()
+        with self._lock:
+            self._evict_idle(now)
+            client = self._clients.get(account)
+            if client is not None:
+                client.last_used = now
+                self._clients.move_to_end(account)
+                return client
+
+        # Build outside the lock; reading credentials and the first
+        # authentication must not block other accounts
+        client = AccountClient(self._load(account), self.max_playlists)
+        with self._lock:
+            client = self._clients.setdefault(account, client)
+            self._clients.move_to_end(account)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        return client
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._clients), 'max_clients': self.max_clients}
+
+    def _evict_idle(self, now):
+        # Caller holds the lock; least recently used entries come first
+        while self._clients:
+            account, client = next(iter(self._clients.items()))
+            if now - client.last_used <= self.idle_ttl:
+                break
+            del self._clients[account]
+
+    @staticmethod
+    def _load(account):
+        if YTMusic is None:
+            raise UnknownAccount('YouTube Music API not initialized')
+        path = os.path.join(OAUTH_DIR, f'{account}.json')
+        if os.path.exists(path):
+            return YTMusic(path)
+        if account == DEFAULT_ACCOUNT:
+            if os.path.exists(DEFAULT_OAUTH_PATH):
+                return YTMusic(DEFAULT_OAUTH_PATH)
+            return YTMusic()
+        raise UnknownAccount(f'No credentials for account {account}')
+
+
+ytmusic_pool = YTMusicPool(
+    max_clients=int(os.environ.get('YTMUSIC_POOL_MAX', '32')),
+    idle_ttl=int(os.environ.get('YTMUSIC_POOL_IDLE_TTL', '1800')),
+    playlist_ttl=int(os.environ.get('YTMUSIC_PLAYLIST_CACHE_TTL', '300')),
+)
+
+
 class handler(BaseHTTPRequestHandler):
-    def __init__(self):
-        # Initialize YTMusic
-        self.yt = None
-        if YTMusic:
-            try:
-                # Try to load with oauth if available
-                oauth_path = os.path.join(os.path.dirname(__file__), '..', 'oauth.json')
-                if os.path.exists(oauth_path):
-                    self.yt = YTMusic(oauth_path)
-                else:
-                    self.yt = YTMusic()
-            except Exception as e:
-                print(f"Error initializing YTMusic: {e}")
-                self.yt = None
+    def __init__(self, *args, **kwargs):
+        # Clients live in ytmusic_pool rather than on each handler instance.
+        # handler_func builds the handler without arguments.
+        if args:
+            super().__init__(*args, **kwargs)
+
+    def get_client(self):
+        """Check out the pooled client for the request's account.
+
+        The account comes from the X-Account-Id header and must come with
+        its X-Account-Token (see account_token); without the header the
+        shared oauth.json account is used. Sends the error response and
+        returns None when there is no usable client.
+        """
+        account = self.headers.get(ACCOUNT_HEADER)
+        if account is None:
+            account = DEFAULT_ACCOUNT
+        elif not ACCOUNT_ID_RE.match(account):
+            self.send_error_response('Invalid account id', 400)
+            return None
+        elif not ACCOUNT_SECRET:
+            self.send_error_response('Per-account access is not configured', 403)
+            return None
+        else:
+            token = self.headers.get(ACCOUNT_TOKEN_HEADER) or ''
+            if not hmac.compare_digest(token.encode(), account_token(account).encode()):
+                self.send_error_response('Invalid account token', 401)
+                return None
+        try:
+            return ytmusic_pool.get(account)
+        except UnknownAccount as e:
+            status = 401 if YTMusic is not None else 500
+            self.send_error_response(str(e), status)
+        except Exception as e:
+            print(f"Error initializing YTMusic for {account}: {e}")
+            self.send_error_response('YouTube Music API not initialized', 500)
+        return None
 
     def do_POST(self):
         if self.path == '/search':
@@ -48,7 +204,8 @@ class handler(BaseHTTPRequestHandler):
             self.end_headers()
             response = {
                 'status': 'healthy',
-                'ytmusic_initialized': self.yt is not None
+                'ytmusic_available': YTMusic is not None,
+                'ytmusic_pool': ytmusic_pool.stats(),
             }
             self.wfile.write(json.dumps(response).encode())
         else:
@@ -66,12 +223,12 @@ class handler(BaseHTTPRequestHandler):
                 self.send_error_response('Query parameter is required', 400)
                 return
                 
-            if not self.yt:
-                self.send_error_response('YouTube Music API not initialized', 500)
+            client = self.get_client()
+            if not client:
                 return
             
             # Search in YouTube Music
-            search_results = self.yt.search(query, filter='songs', limit=10)
+            search_results = client.yt.search(query, filter='songs', limit=10)
             
             # Format results for Alexa
             formatted_results = []
@@ -100,12 +257,12 @@ class handler(BaseHTTPRequestHandler):
 
     def handle_playlists(self):
         try:
-            if not self.yt:
-                self.send_error_response('YouTube Music API not initialized', 500)
+            client = self.get_client()
+            if not client:
                 return
             
-            # Get user playlists (requires authentication)
-            playlists = self.yt.get_library_playlists(limit=25)
+            # Get user playlists (requires authentication), cached per account
+            playlists = client.library_playlists(ytmusic_pool.playlist_ttl)
             
             formatted_playlists = []
             for playlist in playlists:
@@ -130,12 +287,12 @@ class handler(BaseHTTPRequestHandler):
 
     def handle_playlist_songs(self, playlist_id):
         try:
-            if not self.yt:
-                self.send_error_response('YouTube Music API not initialized', 500)
+            client = self.get_client()
+            if not client:
                 return
             
-            # Get playlist songs
-            playlist = self.yt.get_playlist(playlist_id, limit=100)
+            # Get playlist songs, cached per account
+            playlist = client.playlist(playlist_id, ytmusic_pool.playlist_ttl)
             
             if not playlist:
                 self.send_error_response('Playlist not found', 404)
@@ -185,4 +342,11 @@ class handler(BaseHTTPRequestHandler):
 def handler_func(request):
     h = handler()
     h.setup(request)
-    return h
\ No newline at end of file
+    return h
+
+
+if __name__ == '__main__':
+    # python api/alexa.py <account>: print the token to configure for it
+    if len(sys.argv) != 2 or not ACCOUNT_SECRET:
+        sys.exit('usage: YTMUSIC_ACCOUNT_SECRET=... python api/alexa.py <account>')
+    print(account_token(sys.argv[1]))
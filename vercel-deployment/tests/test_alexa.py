@@ -0,0 +1,152 @@
+"""Tests for the Vercel handler's per-account YTMusic client pool."""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'api'))
+
+import alexa
+from alexa import AccountClient, UnknownAccount, YTMusicPool
+
+
+class FakeYTMusic:
+    """Stands in for ytmusicapi.YTMusic and counts the API calls made."""
+
+    def __init__(self, auth=None):
+        self.auth = auth
+        self.calls = []
+
+    def get_library_playlists(self, limit=25):
+        self.calls.append(('library', limit))
+        return [{'playlistId': 'PL1', 'title': 'Favorites'}]
+
+    def get_playlist(self, playlist_id, limit=100):
+        self.calls.append(('playlist', playlist_id))
+        return {'title': playlist_id, 'tracks': []}
+
+
+@pytest.fixture
+def oauth_dir(tmp_path, monkeypatch):
+    """Credentials for accounts maria and juan; the default has none."""
+    for account in ('maria', 'juan'):
+        (tmp_path / f'{account}.json').write_text('{}')
+    monkeypatch.setattr(alexa, 'YTMusic', FakeYTMusic)
+    monkeypatch.setattr(alexa, 'OAUTH_DIR', str(tmp_path))
+    monkeypatch.setattr(alexa, 'DEFAULT_OAUTH_PATH', str(tmp_path / 'missing.json'))
+    return tmp_path
+
+
+class TestAccountClient:
+    def test_library_cached_until_ttl(self):
+        client = AccountClient(FakeYTMusic(), max_playlists=2)
+        assert client.library_playlists(ttl=60) == client.library_playlists(ttl=60)
+        assert client.yt.calls == [('library', 25)]
+        client.library_playlists(ttl=0)
+        assert len(client.yt.calls) == 2
+
+    def test_playlists_bounded_lru(self):
+        client = AccountClient(FakeYTMusic(), max_playlists=2)
+        client.playlist('PL1', ttl=60)
+        client.playlist('PL2', ttl=60)
+        client.playlist('PL1', ttl=60)  # hit, now most recently used
+        client.playlist('PL3', ttl=60)  # evicts PL2
+        assert list(client.playlists) == ['PL1', 'PL3']
+        assert client.yt.calls == [('playlist', 'PL1'), ('playlist', 'PL2'), ('playlist', 'PL3')]
+
+
+class TestYTMusicPool:
+    def test_reuses_client_per_account(self, oauth_dir):
+        pool = YTMusicPool()
+        maria = pool.get('maria')
+        assert pool.get('maria') is maria
+        assert maria.yt.auth == str(oauth_dir / 'maria.json')
+        assert pool.get('juan') is not maria
+        assert pool.stats()['clients'] == 2
+
+    def test_default_account_without_credentials_is_unauthenticated(self, oauth_dir):
+        assert YTMusicPool().get(alexa.DEFAULT_ACCOUNT).yt.auth is None
+
+    def test_unknown_account(self, oauth_dir):
+        with pytest.raises(UnknownAccount):
+            YTMusicPool().get('pedro')
+
+    def test_without_ytmusicapi(self, monkeypatch):
+        monkeypatch.setattr(alexa, 'YTMusic', None)
+        with pytest.raises(UnknownAccount):
+            YTMusicPool().get(alexa.DEFAULT_ACCOUNT)
+
+    def test_evicts_least_recently_used(self, oauth_dir):
+        pool = YTMusicPool(max_clients=2)
+        maria = pool.get('maria')
+        pool.get('juan')
+        pool.get('maria')
+        pool.get(alexa.DEFAULT_ACCOUNT)  # evicts juan
+        assert list(pool._clients) == ['maria', alexa.DEFAULT_ACCOUNT]
+        assert pool.get('maria') is maria
+
+    def test_evicts_idle_clients(self, oauth_dir):
+        pool = YTMusicPool(idle_ttl=60)
+        maria = pool.get('maria')
+        maria.last_used -= 61
+        assert pool.get('juan') is not None
+        assert list(pool._clients) == ['juan']
+        assert pool.get('maria') is not maria
+
+
+class FakeHandler(alexa.handler):
+    """The request handler with headers given directly and errors recorded."""
+
+    def __init__(self, headers):
+        super().__init__()
+        self.headers = headers
+        self.errors = []
+
+    def send_error_response(self, message, status_code):
+        self.errors.append(status_code)
+
+
+class TestGetClient:
+    @pytest.fixture(autouse=True)
+    def pool(self, oauth_dir, monkeypatch):
+        monkeypatch.setattr(alexa, 'ACCOUNT_SECRET', 'secret')
+        monkeypatch.setattr(alexa, 'ytmusic_pool', YTMusicPool())
+
+    def test_no_account_uses_default(self):
+        handler = FakeHandler({})
+        assert handler.get_client() is alexa.ytmusic_pool.get(alexa.DEFAULT_ACCOUNT)
+
+    def test_account_with_its_token(self):
+        handler = FakeHandler({'X-Account-Id': 'maria', 'X-Account-Token': alexa.account_token('maria')})
+        assert handler.get_client() is alexa.ytmusic_pool.get('maria')
+
+    def test_account_without_token(self):
+        handler = FakeHandler({'X-Account-Id': 'maria'})
+        assert handler.get_client() is None
+        assert handler.errors == [401]
+
+    def test_token_of_another_account(self):
+        handler = FakeHandler({'X-Account-Id': 'maria', 'X-Account-Token': alexa.account_token('juan')})
+        assert handler.get_client() is None
+        assert handler.errors == [401]
+        assert alexa.ytmusic_pool.stats()['clients'] == 0
+
+    def test_accounts_disabled_without_secret(self, monkeypatch):
+        monkeypatch.setattr(alexa, 'ACCOUNT_SECRET', '')
+        handler = FakeHandler({'X-Account-Id': 'maria', 'X-Account-Token': alexa.account_token('maria')})
+        assert handler.get_client() is None
+        assert handler.errors == [403]
+
+    def test_invalid_account_id(self):
+        handler = FakeHandler({'X-Account-Id': '../maria'})
+        assert handler.get_client() is None
+        assert handler.errors == [400]
+
+    def test_unknown_account_with_valid_token(self):
+        handler = FakeHandler({'X-Account-Id': 'pedro', 'X-Account-Token': alexa.account_token('pedro')})
+        assert handler.get_client() is None
+        assert handler.errors == [401]
+
+    def test_non_ascii_token(self):
+        handler = FakeHandler({'X-Account-Id': 'maria', 'X-Account-Token': 'contraseña'})
+        assert handler.get_client() is None
+        assert handler.errors == [401]
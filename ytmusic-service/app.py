@@ -1,11 +1,31 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, send_file, stream_with_context
 from flask_cors import CORS
-import yt_dlp
+import atexit
+import hashlib
+import hmac
 import os
+import json
+import signal
+import sys
+import tempfile
+import threading
 import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dotenv import load_dotenv
 import logging
 
+from timing import RequestTimer, Profiler, phase
+from warmup import Warmup, save_hot_keys, load_hot_keys
+from extraction import VIDEO_URL, build_profiles, extract, extract_entries
+from deadline import Deadline, DeadlineExceeded, call_with_deadline
+from cache_trace import CacheTracer
+from queue_store import QueueStore
+from http_pool import DNSCache, YDLPool, enable_http2
+from hedging import Hedger
+from audio_store import AudioStore
+from process_backend import ProcessBackend
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -26,16 +46,187 @@ CACHE_TTL = 3600 * 4  # 4 hours (conservative, URLs last ~6h)
 search_cache = {}
 SEARCH_CACHE_TTL = 600  # 10 minutes
 
+# Expired entries are kept a while longer and served (flagged "stale") when a
+# caller's deadline runs out before a fresh answer is ready
+STREAM_STALE_TTL = 3600 * 5.5  # stream URLs stop working after ~6h
+SEARCH_STALE_TTL = 3600
+
+# Per-request timing (Server-Timing header + structured log line)
+TIMING_LOG = os.environ.get('TIMING_LOG', '1') != '0'
+
+# On-demand profiling: send X-Profile-Key to profile one request, or sample a
+# fraction of traffic. Profiles are stored as pstats dumps for download.
+profiler = Profiler(
+    directory=os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'ytmusic-profiles')),
+    profile_key=os.environ.get('PROFILE_KEY', ''),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+    max_files=int(os.environ.get('PROFILE_MAX_FILES', '50')),
+)
+
+# Startup warm-up. yt_dlp is imported lazily (its extractor registry is the
+# bulk of import time); WARMUP_STEPS runs in the background when the service
+# starts and /ready reports 503 until it finishes.
+WARMUP = os.environ.get('WARMUP', '1') != '0'
+WARMUP_STEPS = [step.strip() for step in os.environ.get('WARMUP_STEPS', 'extractors,hot_keys,canary').split(',') if step.strip()]
+WARMUP_CANARY_VIDEO_ID = os.environ.get('WARMUP_CANARY_VIDEO_ID', '')
+HOT_KEYS_FILE = os.environ.get('HOT_KEYS_FILE', '')
+HOT_KEYS_MAX = int(os.environ.get('HOT_KEYS_MAX', '200'))
+
+warmup = Warmup()
+
+# Lean extraction profiles per endpoint. STREAM_PLAYER_CLIENTS pins the
+# YouTube player clients for /stream (comma-separated, e.g. "web_music");
+# empty keeps yt-dlp's defaults.
+STREAM_PLAYER_CLIENTS = [c.strip() for c in os.environ.get('STREAM_PLAYER_CLIENTS', '').split(',') if c.strip()]
+
+# Hedged /stream extraction (see hedging.py): when the primary attempt is
+# slower than STREAM_HEDGE_PERCENTILE of recent ones, retry in parallel on
+# STREAM_HEDGE_PLAYER_CLIENTS and keep whichever answers first. Hedges are
+# capped at STREAM_HEDGE_MAX_RATIO of stream extractions.
+STREAM_HEDGE = os.environ.get('STREAM_HEDGE', '0') == '1'
+STREAM_HEDGE_PLAYER_CLIENTS = [c.strip() for c in os.environ.get('STREAM_HEDGE_PLAYER_CLIENTS', 'tv').split(',')
+                               if c.strip()]
+PROFILES = build_profiles(stream_player_clients=STREAM_PLAYER_CLIENTS,
+                          hedge_player_clients=STREAM_HEDGE_PLAYER_CLIENTS if STREAM_HEDGE else ())
+
+# Batch search: max queries per /search/batch call and concurrent extractions
+SEARCH_BATCH_MAX = int(os.environ.get('SEARCH_BATCH_MAX', '10'))
+SEARCH_BATCH_WORKERS = int(os.environ.get('SEARCH_BATCH_WORKERS', '4'))
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_BATCH_WORKERS, thread_name_prefix='search')
+
+# Deadlines: callers send X-Request-Deadline-Ms with the time they have left.
+# DEADLINE_MARGIN_MS is kept back for sending the response; extractions for
+# requests with a deadline run on the extraction pool so the request can
+# stop waiting (and cancel them) when time runs out.
+DEADLINE_MARGIN_MS = int(os.environ.get('DEADLINE_MARGIN_MS', '250'))
+DEADLINE_MAX_MS = int(os.environ.get('DEADLINE_MAX_MS', '30000'))
+DEADLINE_RETRY_AFTER = 1  # seconds, sent with 504s
+EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', '8'))
+extraction_executor = ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS, thread_name_prefix='extract')
+
+# EXTRACTION_BACKEND=process runs search, stream and metadata extractions in
+# warm worker processes (see process_backend.py), so their CPU-bound parts
+# don't hold the GIL while cache hits are served. Streaming search stays on
+# threads, as it consumes yt-dlp's entry generator as it goes.
+EXTRACTION_BACKEND = os.environ.get('EXTRACTION_BACKEND', 'thread')
+process_backend = ProcessBackend(
+    PROFILES,
+    workers=int(os.environ.get('EXTRACTION_PROCESSES', '2')),
+    max_tasks_per_child=int(os.environ.get('EXTRACTION_MAX_TASKS_PER_CHILD', '100')),
+    max_rss_mb=int(os.environ.get('EXTRACTION_MAX_RSS_MB', '400')),
+    task_timeout=DEADLINE_MAX_MS / 1000,
+    start_method=os.environ.get('EXTRACTION_START_METHOD', 'forkserver'),
+) if EXTRACTION_BACKEND == 'process' else None
+
+stream_hedger = Hedger(
+    ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS, thread_name_prefix='hedge'),
+    percentile=float(os.environ.get('STREAM_HEDGE_PERCENTILE', '95')),
+    max_ratio=float(os.environ.get('STREAM_HEDGE_MAX_RATIO', '0.05')),
+    min_delay=int(os.environ.get('STREAM_HEDGE_MIN_DELAY_MS', '500')) / 1000,
+    min_samples=int(os.environ.get('STREAM_HEDGE_MIN_SAMPLES', '20')),
+    max_seconds=DEADLINE_MAX_MS / 1000,
+) if STREAM_HEDGE else None
+
+# Stream extractions in flight, so concurrent requests for one video share it
+stream_inflight = {}
+stream_inflight_lock = threading.Lock()
+
+# Optional cache access trace for offline replay with simulate.py
+CACHE_TRACE_FILE = os.environ.get('CACHE_TRACE_FILE', '')
+cache_tracer = CacheTracer(
+    CACHE_TRACE_FILE,
+    hash_keys=os.environ.get('CACHE_TRACE_HASH_KEYS', '1') != '0',
+) if CACHE_TRACE_FILE else None
+
+# Server-side play queues (see queue_store.py). Advancing a queue warms the
+# stream URLs of the next QUEUE_PREFETCH_DEPTH tracks in the background.
+queue_store = QueueStore(
+    ttl=int(os.environ.get('QUEUE_TTL', str(3600 * 4))),
+    max_queues=int(os.environ.get('QUEUE_MAX', '1000')),
+    max_tracks=int(os.environ.get('QUEUE_MAX_TRACKS', '200')),
+)
+QUEUE_PREFETCH_DEPTH = int(os.environ.get('QUEUE_PREFETCH_DEPTH', '1'))
+prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='prefetch')
+
+# Long-lived yt-dlp instances per extraction profile so extractions reuse
+# keep-alive connections (see http_pool.py). HTTP_POOL_SIZE=0 goes back to a
+# fresh YoutubeDL per extraction. DNS_CACHE_TTL caches host lookups (0 off);
+# HTTP2=1 tries urllib3's experimental HTTP/2 (needs the h2 package).
+ydl_pool = YDLPool(
+    size=int(os.environ.get('HTTP_POOL_SIZE', '4')),
+    idle_timeout=float(os.environ.get('HTTP_POOL_IDLE_TIMEOUT', '90')),
+)
+DNS_CACHE_TTL = float(os.environ.get('DNS_CACHE_TTL', '60'))
+dns_cache = DNSCache(ttl=DNS_CACHE_TTL) if DNS_CACHE_TTL > 0 else None
+HTTP2 = os.environ.get('HTTP2', '0') == '1'
+
+# Optional disk cache of heavy-rotation tracks (see audio_store.py), off
+# unless AUDIO_CACHE_DIR is set. Cached tracks are served by /audio/<id>;
+# Alexa fetches audio without our headers, so those URLs carry an expiring
+# HMAC token instead of needing X-API-Key.
+AUDIO_CACHE_DIR = os.environ.get('AUDIO_CACHE_DIR', '')
+audio_store = AudioStore(
+    AUDIO_CACHE_DIR,
+    max_bytes=int(os.environ.get('AUDIO_CACHE_MAX_MB', '2048')) * 1024 * 1024,
+    min_plays=float(os.environ.get('AUDIO_CACHE_MIN_PLAYS', '3')),
+) if AUDIO_CACHE_DIR else None
+AUDIO_BASE_URL = os.environ.get('AUDIO_BASE_URL', '').rstrip('/')
+AUDIO_URL_TTL = int(os.environ.get('AUDIO_URL_TTL', str(3600 * 6)))
+AUDIO_URL_SECRET = (os.environ.get('AUDIO_URL_SECRET') or API_KEY or uuid.uuid4().hex).encode()
+# Behind nginx, set AUDIO_ACCEL_REDIRECT to an internal location aliased to
+# AUDIO_CACHE_DIR (see deployment/nginx-ytmusic.conf): /audio then only checks
+# the token and nginx sends the file with sendfile and its own Range handling.
+AUDIO_ACCEL_REDIRECT = os.environ.get('AUDIO_ACCEL_REDIRECT', '').rstrip('/')
+
+
+def __getattr__(name):
+    # yt_dlp is not imported at module load; keep `app.yt_dlp` working.
+    if name == 'yt_dlp':
+        import yt_dlp
+        return yt_dlp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def cleanup_cache():
-    """Remove expired entries from stream cache."""
+    """Remove entries too old to be served even as stale."""
     now = time.time()
-    expired = [k for k, v in stream_cache.items() if now - v['timestamp'] > CACHE_TTL]
+    # Copy before iterating: batch workers may insert concurrently
+    expired = [k for k, v in list(stream_cache.items()) if now - v['timestamp'] > STREAM_STALE_TTL]
     for k in expired:
-        del stream_cache[k]
-    expired = [k for k, v in search_cache.items() if now - v['timestamp'] > SEARCH_CACHE_TTL]
+        stream_cache.pop(k, None)
+    expired = [k for k, v in list(search_cache.items()) if now - v['timestamp'] > SEARCH_STALE_TTL]
     for k in expired:
-        del search_cache[k]
+        search_cache.pop(k, None)
+
+
+def stale_entry(cache, key, max_age):
+    """Return cached data younger than ``max_age``, even if past its TTL."""
+    cached = cache.get(key)
+    if cached and time.time() - cached['timestamp'] < max_age:
+        return dict(cached['data'], stale=True)
+    return None
+
+
+def trace_lookup(endpoint, key, data):
+    """Record a cache lookup (``data`` is the cached value, None on a miss)."""
+    if cache_tracer is not None:
+        cache_tracer.record(endpoint, key, data is not None, data)
+
+
+def deadline_response():
+    """Fast 504 telling the caller when a retry is likely to succeed."""
+    response = jsonify({'error': 'Deadline exceeded', 'retry_after': DEADLINE_RETRY_AFTER})
+    response.headers['Retry-After'] = str(DEADLINE_RETRY_AFTER)
+    return response, 504
+
+
+@app.before_request
+def start_request_timing():
+    """Attach a phase timer and, if requested, a profiler to the request."""
+    g.timer = RequestTimer()
+    g.profile = profiler.start(request.headers)
+    g.deadline = Deadline.from_headers(request.headers, margin=DEADLINE_MARGIN_MS / 1000,
+                                       max_seconds=DEADLINE_MAX_MS / 1000)
 
 
 @app.before_request
@@ -44,8 +235,12 @@ def check_api_key():
     if not API_KEY:
         return  # No API key configured, skip validation
 
-    # Skip auth for health check
-    if request.path == '/health':
+    # Skip auth for health and readiness checks
+    if request.path in ('/health', '/ready'):
+        return
+
+    # Cached audio is fetched by Alexa; serve_audio checks its URL token
+    if request.path.startswith('/audio/'):
         return
 
     provided_key = request.headers.get('X-API-Key', '')
@@ -53,15 +248,179 @@ def check_api_key():
         return jsonify({'error': 'Unauthorized'}), 401
 
 
+@app.after_request
+def finish_request_timing(response):
+    """Emit Server-Timing, log the per-phase breakdown and store any profile.
+
+    A generated body (``/search/stream``) is only produced after this hook,
+    so its log line and profile are written once the body has been sent, and
+    it gets no Server-Timing header. Files (``send_file``) are complete here.
+    """
+    profile = g.pop('profile', None)
+    timer = g.get('timer')
+    method, path = request.method, request.path
+
+    if response.is_streamed and not response.direct_passthrough:
+        profile_id = None
+        if profile is not None:
+            profile_id = uuid.uuid4().hex
+            response.headers['X-Profile-Id'] = profile_id
+        response.call_on_close(lambda: record_request_timing(
+            method, path, response.status_code, timer, profile, profile_id))
+        return response
+
+    if timer is not None:
+        response.headers['Server-Timing'] = timer.server_timing()
+    profile_id = record_request_timing(method, path, response.status_code, timer, profile)
+    if profile_id:
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def record_request_timing(method, path, status, timer, profile, profile_id=None):
+    """Store the request's profile and write its timing log line.
+
+    Returns the profile id, or None when the request was not profiled.
+    """
+    if profile is not None:
+        profile_id = profiler.stop(profile, method, path, profile_id)
+    if timer is not None and TIMING_LOG:
+        logger.info('request_timing %s', json.dumps({
+            'method': method,
+            'path': path,
+            'status': status,
+            **timer.as_dict(),
+        }))
+    return profile_id
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
         'cache_size': len(stream_cache),
-        'search_cache_size': len(search_cache)
+        'search_cache_size': len(search_cache),
+        'queue_count': len(queue_store),
+        'http_pool': ydl_pool.stats(),
+        'dns_cache': dns_cache.stats() if dns_cache else None,
+        'stream_hedging': stream_hedger.stats() if stream_hedger else None,
+        'audio_cache': audio_store.stats() if audio_store else None,
+        'process_backend': process_backend.stats() if process_backend else None,
     })
 
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until the startup warm-up has finished."""
+    return jsonify(warmup.as_dict()), 200 if warmup.ready else 503
+
+
+def run_extract(profile, target, deadline=None):
+    """Run an extraction on the configured backend: pooled threads or worker processes."""
+    if process_backend is not None:
+        return process_backend.extract(profile, target, deadline)
+    return extract(profile, target, deadline, ydl_pool)
+
+
+def normalize_query(query):
+    """Normalize a search query for cache keys and batch de-duplication."""
+    return ' '.join(query.lower().split())
+
+
+def format_search_result(entry):
+    """Format one yt-dlp search entry for the API, or None if it has no id."""
+    if not entry or not entry.get('id'):
+        return None
+
+    # Parse title to extract artist if possible
+    title = entry.get('title', 'Unknown Title')
+    artist = entry.get('uploader', entry.get('channel', 'Unknown Artist'))
+    # Clean up artist name (remove " - Topic" suffix from YT Music channels)
+    if artist and artist.endswith(' - Topic'):
+        artist = artist[:-8]
+
+    duration_secs = entry.get('duration')
+    if duration_secs:
+        mins = int(duration_secs) // 60
+        secs = int(duration_secs) % 60
+        duration_str = f"{mins}:{secs:02d}"
+    else:
+        duration_str = 'Unknown'
+
+    return {
+        'video_id': entry['id'],
+        'title': title,
+        'artist': artist,
+        'duration': duration_str,
+        'duration_seconds': int(duration_secs) if duration_secs else 0,
+        'thumbnail': entry.get('thumbnails', [{}])[0].get('url', '') if entry.get('thumbnails') else '',
+    }
+
+
+def search_cache_key(query, limit):
+    return f"{normalize_query(query)}:{limit}"
+
+
+def cached_search(query, limit):
+    """Return cached search data for a query, or None on a miss."""
+    key = search_cache_key(query, limit)
+    with phase('cache'):
+        cached = search_cache.get(key)
+    if cached and time.time() - cached['timestamp'] < SEARCH_CACHE_TTL:
+        logger.info(f"Search cache hit for '{query}'")
+        trace_lookup('/search', key, cached['data'])
+        return dict(cached['data'], query=query)
+    trace_lookup('/search', key, None)
+    return None
+
+
+def search_songs(query, limit, deadline=None):
+    """Search YouTube Music, from the cache when still fresh.
+
+    Raises DeadlineExceeded if ``deadline`` runs out before the search does.
+    """
+    cached = cached_search(query, limit)
+    if cached:
+        return cached
+    return call_with_deadline(extraction_executor, deadline, run_search, query, limit, deadline)
+
+
+def run_search(query, limit, deadline=None):
+    """Run a search with yt-dlp and cache the formatted results."""
+    # Use yt-dlp to search YouTube Music
+    info = run_extract(PROFILES['search'], f'ytsearch{limit}:{query}', deadline)
+
+    with phase('format'):
+        formatted_results = [r for r in map(format_search_result, info.get('entries', [])) if r]
+
+    return store_search(query, limit, formatted_results)
+
+
+def store_search(query, limit, results):
+    """Cache a complete, formatted result set and return the response data."""
+    response_data = {
+        'query': query,
+        'results': results,
+        'count': len(results)
+    }
+
+    # Cache search results
+    search_cache[search_cache_key(query, limit)] = {
+        'data': response_data,
+        'timestamp': time.time()
+    }
+
+    # Cleanup old cache entries periodically
+    if len(search_cache) > 100:
+        cleanup_cache()
+
+    return response_data
+
+
+def clamp_limit(limit):
+    return min(max(1, limit), 20)
+
+
 @app.route('/search', methods=['POST'])
 def search_music():
     """Search for songs using yt-dlp's YouTube search.
@@ -77,73 +436,17 @@ def search_music():
         if not query:
             return jsonify({'error': 'Query parameter is required'}), 400
 
-        # Clamp limit
-        limit = min(max(1, limit), 20)
-
-        # Check search cache
-        cache_key = f"{query}:{limit}"
-        if cache_key in search_cache:
-            cached = search_cache[cache_key]
-            if time.time() - cached['timestamp'] < SEARCH_CACHE_TTL:
-                logger.info(f"Search cache hit for '{query}'")
-                return jsonify(cached['data'])
-
-        # Use yt-dlp to search YouTube Music
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': True,
-            'default_search': 'ytsearch',
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            search_query = f'ytsearch{limit}:{query}'
-            info = ydl.extract_info(search_query, download=False)
-
-            formatted_results = []
-            for entry in info.get('entries', []):
-                if entry and entry.get('id'):
-                    # Parse title to extract artist if possible
-                    title = entry.get('title', 'Unknown Title')
-                    artist = entry.get('uploader', entry.get('channel', 'Unknown Artist'))
-                    # Clean up artist name (remove " - Topic" suffix from YT Music channels)
-                    if artist and artist.endswith(' - Topic'):
-                        artist = artist[:-8]
-
-                    duration_secs = entry.get('duration')
-                    if duration_secs:
-                        mins = int(duration_secs) // 60
-                        secs = int(duration_secs) % 60
-                        duration_str = f"{mins}:{secs:02d}"
-                    else:
-                        duration_str = 'Unknown'
-
-                    formatted_result = {
-                        'video_id': entry['id'],
-                        'title': title,
-                        'artist': artist,
-                        'duration': duration_str,
-                        'duration_seconds': int(duration_secs) if duration_secs else 0,
-                        'thumbnail': entry.get('thumbnails', [{}])[0].get('url', '') if entry.get('thumbnails') else '',
-                    }
-                    formatted_results.append(formatted_result)
-
-            response_data = {
-                'query': query,
-                'results': formatted_results,
-                'count': len(formatted_results)
-            }
-
-            # Cache search results
-            search_cache[cache_key] = {
-                'data': response_data,
-                'timestamp': time.time()
-            }
-
-            # Cleanup old cache entries periodically
-            if len(search_cache) > 100:
-                cleanup_cache()
+        limit = clamp_limit(limit)
+        try:
+            response_data = search_songs(query, limit, g.deadline)
+        except DeadlineExceeded:
+            response_data = stale_entry(search_cache, search_cache_key(query, limit), SEARCH_STALE_TTL)
+            if not response_data:
+                return deadline_response()
+            logger.warning(f"Deadline exceeded, serving stale search for '{query}'")
+            response_data['query'] = query
 
+        with phase('serialize'):
             return jsonify(response_data)
 
     except Exception as e:
@@ -151,6 +454,329 @@ def search_music():
         return jsonify({'error': str(e)}), 500
 
 
+def ndjson_line(event):
+    return json.dumps(event) + '\n'
+
+
+def search_events(query, limit, cached, deadline, prefetch):
+    """Yield NDJSON search events, one per result as soon as it is known.
+
+    The first result's stream is resolved in the background when
+    ``prefetch`` is set, so a following /stream or /queue call finds it
+    cached or in flight. Only a complete result set is cached.
+    """
+    if cached:
+        results = cached['results']
+        if prefetch and results:
+            prefetch_executor.submit(prefetch_stream, results[0]['video_id'])
+        for index, result in enumerate(results):
+            yield ndjson_line({'type': 'result', 'index': index, 'result': result})
+        yield ndjson_line({'type': 'done', 'query': query, 'count': len(results), 'cached': True})
+        return
+
+    results = []
+    try:
+        for entry in extract_entries(PROFILES['search'], f'ytsearch{limit}:{query}', deadline, ydl_pool):
+            result = format_search_result(entry)
+            if not result:
+                continue
+            if prefetch and not results:
+                prefetch_executor.submit(prefetch_stream, result['video_id'])
+            yield ndjson_line({'type': 'result', 'index': len(results), 'result': result})
+            results.append(result)
+    except DeadlineExceeded:
+        yield ndjson_line({'type': 'error', 'error': 'Deadline exceeded', 'partial': True,
+                           'count': len(results), 'retry_after': DEADLINE_RETRY_AFTER})
+        return
+    except Exception as e:
+        logger.error(f"Error in streaming search for '{query}': {e}")
+        yield ndjson_line({'type': 'error', 'error': str(e), 'partial': True, 'count': len(results)})
+        return
+
+    store_search(query, limit, results)
+    yield ndjson_line({'type': 'done', 'query': query, 'count': len(results), 'cached': False})
+
+
+@app.route('/search/stream', methods=['POST'])
+def search_stream():
+    """Search and stream the results as NDJSON while yt-dlp produces them.
+
+    Body: ``{"query": "...", "limit": 10, "prefetch": false}``. Each line is
+    an event: ``{"type": "result", "index": 0, "result": {...}}`` per
+    result, then ``{"type": "done", "count": N, "cached": bool}``, or
+    ``{"type": "error", "partial": true, ...}`` if the search failed or ran
+    out of time part way. Set ``prefetch`` to start resolving the top hit's
+    stream as soon as it arrives.
+    """
+    data = request.get_json(silent=True) or {}
+    query = data.get('query', '')
+    if not query:
+        return jsonify({'error': 'Query parameter is required'}), 400
+
+    limit = clamp_limit(data.get('limit', 10))
+    cached = cached_search(query, limit)
+    events = search_events(query, limit, cached, g.deadline, bool(data.get('prefetch', False)))
+    response = Response(stream_with_context(events), mimetype='application/x-ndjson')
+    # Ask reverse proxies (nginx) not to hold the lines back
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """Run several searches in one call.
+
+    Body: ``{"queries": [{"query": "...", "limit": 5}, ...]}``. Queries are
+    de-duplicated after normalization, cache hits are answered immediately
+    and misses run concurrently (at most SEARCH_BATCH_WORKERS at a time).
+    Results come back in request order, each with its own ``error`` on failure.
+    """
+    try:
+        data = request.get_json()
+        items = data.get('queries')
+
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'queries must be a non-empty list'}), 400
+        if len(items) > SEARCH_BATCH_MAX:
+            return jsonify({'error': f'At most {SEARCH_BATCH_MAX} queries per batch'}), 400
+
+        # Resolve each distinct (normalized query, limit) once
+        keys = []
+        unique = {}
+        for item in items:
+            query = item.get('query', '') if isinstance(item, dict) else ''
+            if not query:
+                keys.append(None)
+                continue
+            limit = clamp_limit(item.get('limit', 10))
+            key = (normalize_query(query), limit)
+            keys.append(key)
+            unique.setdefault(key, (query, limit))
+
+        deadline = g.deadline
+        results = {}
+        pending = {}
+        for key, (query, limit) in unique.items():
+            cached = cached_search(query, limit)
+            if cached:
+                results[key] = cached
+            else:
+                pending[key] = search_executor.submit(run_search, query, limit, deadline)
+
+        # Wait for misses until the deadline; whatever isn't done by then is
+        # answered from the stale cache or reported as timed out
+        partial = False
+        with phase('batch_wait'):
+            for key, future in pending.items():
+                query, limit = unique[key]
+                try:
+                    results[key] = future.result(timeout=deadline.remaining() if deadline else None)
+                except (FutureTimeout, DeadlineExceeded):
+                    partial = True
+                    results[key] = (stale_entry(search_cache, search_cache_key(query, limit), SEARCH_STALE_TTL) or
+                                    {'error': 'Deadline exceeded', 'retry_after': DEADLINE_RETRY_AFTER})
+                except Exception as e:
+                    logger.error(f"Error in batch search for '{query}': {e}")
+                    results[key] = {'error': str(e)}
+        if partial:
+            # Nobody will read the rest; stop them at their next request.
+            # Without a request deadline, a worker's own timeout may still
+            # have made the batch partial.
+            if deadline is not None:
+                deadline.cancel()
+            for future in pending.values():
+                future.cancel()
+
+        response_items = []
+        for item, key in zip(items, keys):
+            if key is None:
+                response_items.append({'error': 'Query parameter is required'})
+                continue
+            query = item['query']
+            response_items.append(dict(results[key], query=query))
+
+        with phase('serialize'):
+            return jsonify({
+                'results': response_items,
+                'count': len(response_items),
+                'unique': len(unique),
+                'extracted': len(pending),
+                'partial': partial,
+            })
+
+    except Exception as e:
+        logger.error(f"Error in batch search: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def resolve_stream(video_id, deadline=None, trace=True):
+    """Return stream data for a video, from the cache when still fresh.
+
+    Concurrent requests for the same video share one extraction. Returns
+    None if yt-dlp found no audio-only format; yt-dlp errors propagate, and
+    DeadlineExceeded is raised if ``deadline`` runs out first. Background
+    prefetches pass ``trace=False`` so they don't show up as client lookups.
+    """
+    with phase('cache'):
+        cached = stream_cache.get(video_id)
+    if cached and time.time() - cached['timestamp'] < CACHE_TTL:
+        logger.info(f"Cache hit for {video_id}")
+        if trace:
+            trace_lookup('/stream', video_id, cached['data'])
+        return cached['data']
+    if trace:
+        trace_lookup('/stream', video_id, None)
+
+    while True:
+        with stream_inflight_lock:
+            future = stream_inflight.get(video_id)
+            owner = future is None
+            if owner:
+                future = Future()
+                stream_inflight[video_id] = future
+        if owner:
+            break
+
+        with phase('inflight_wait'):
+            try:
+                return future.result(timeout=deadline.remaining() if deadline else None)
+            except FutureTimeout:
+                raise DeadlineExceeded('Deadline exceeded')
+            except DeadlineExceeded:
+                # The owner's caller gave up; extract ourselves if time is left
+                if deadline is not None and deadline.expired:
+                    raise
+
+    try:
+        response_data = call_with_deadline(extraction_executor, deadline, extract_stream, video_id, deadline)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(response_data)
+        return response_data
+    finally:
+        with stream_inflight_lock:
+            stream_inflight.pop(video_id, None)
+
+
+def extract_stream(video_id, deadline=None):
+    """Extract the audio stream for a video with yt-dlp and cache it."""
+    # Extract audio stream URL using yt-dlp
+    url = VIDEO_URL.format(video_id)
+    if stream_hedger is not None:
+        info = stream_hedger.run(lambda d: run_extract(PROFILES['stream'], url, d),
+                                 lambda d: run_extract(PROFILES['stream_hedge'], url, d),
+                                 deadline)
+    else:
+        info = run_extract(PROFILES['stream'], url, deadline)
+
+    audio_url = info.get('url', '')
+
+    # If no direct URL, look through formats for audio-only
+    if not audio_url:
+        with phase('format_fallback'):
+            for fmt in info.get('formats', []):
+                if (fmt.get('acodec', 'none') != 'none' and
+                        fmt.get('vcodec', 'none') == 'none'):
+                    audio_url = fmt['url']
+                    break
+
+    if not audio_url:
+        return None
+
+    response_data = {
+        'video_id': video_id,
+        'stream_url': audio_url,
+        'title': info.get('title', ''),
+        'artist': info.get('artist', info.get('uploader', '')),
+        'duration': info.get('duration', 0),
+        'format': info.get('ext', 'unknown'),
+    }
+
+    # Cache the result
+    stream_cache[video_id] = {
+        'data': response_data,
+        'timestamp': time.time()
+    }
+
+    # Cleanup old cache entries periodically
+    if len(stream_cache) > 50:
+        cleanup_cache()
+
+    return response_data
+
+
+def audio_token(video_id, expires):
+    message = f'{video_id}:{expires}'.encode()
+    return hmac.new(AUDIO_URL_SECRET, message, hashlib.sha256).hexdigest()[:32]
+
+
+def local_audio_url(video_id):
+    """Signed URL of a cached track, valid for AUDIO_URL_TTL seconds."""
+    expires = int(time.time()) + AUDIO_URL_TTL
+    base = AUDIO_BASE_URL or request.host_url.rstrip('/')
+    return f'{base}/audio/{video_id}?e={expires}&t={audio_token(video_id, expires)}'
+
+
+def resolve_playback(video_id, deadline=None):
+    """Resolve a stream to play, from the local audio cache when it has the track.
+
+    Counts the play; once a track is hot, its resolved stream is downloaded
+    in the background and later plays skip extraction altogether.
+    """
+    if audio_store is None:
+        return resolve_stream(video_id, deadline)
+
+    audio_store.record_play(video_id)
+    local = audio_store.get(video_id)
+    if local:
+        return {
+            'video_id': video_id,
+            'stream_url': local_audio_url(video_id),
+            'title': local['title'],
+            'artist': local['artist'],
+            'duration': local['duration'],
+            'format': local['format'],
+            'local': True,
+        }
+
+    response_data = resolve_stream(video_id, deadline)
+    if response_data:
+        audio_store.maybe_fetch(video_id, response_data)
+    return response_data
+
+
+@app.route('/audio/<video_id>', methods=['GET'])
+def serve_audio(video_id):
+    """Serve a cached track from disk; Range requests get 206 partial content.
+
+    With AUDIO_ACCEL_REDIRECT the file is handed to nginx instead. Otherwise
+    werkzeug reads and sends it from Python, which is fine for a few
+    listeners but keeps a request thread busy per download.
+    """
+    if audio_store is None:
+        return jsonify({'error': 'Not found'}), 404
+
+    expires = request.args.get('e', 0, type=int)
+    token = request.args.get('t', '')
+    # Compared as bytes: compare_digest rejects non-ASCII str with TypeError
+    if expires < time.time() or not hmac.compare_digest(token.encode(), audio_token(video_id, expires).encode()):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    entry = audio_store.get(video_id, hit=False)
+    if entry is None:
+        return jsonify({'error': 'Not found'}), 404
+
+    if AUDIO_ACCEL_REDIRECT:
+        response = Response(mimetype=audio_store.mimetype(entry))
+        response.headers['X-Accel-Redirect'] = f"{AUDIO_ACCEL_REDIRECT}/{os.path.basename(entry['path'])}"
+        response.headers['Cache-Control'] = f'max-age={AUDIO_URL_TTL}'
+        return response
+    return send_file(entry['path'], mimetype=audio_store.mimetype(entry),
+                     conditional=True, max_age=AUDIO_URL_TTL)
+
+
 @app.route('/stream', methods=['POST'])
 def get_stream_url():
     """Extract the actual playable audio URL from a YouTube video ID.
@@ -159,6 +785,8 @@ def get_stream_url():
     Alexa's AudioPlayer requires direct audio URLs (MP3, AAC/M4A, HLS).
     YouTube page URLs don't work - we need yt-dlp to extract the real stream.
     """
+    import yt_dlp
+
     try:
         data = request.get_json()
         video_id = data.get('video_id', '')
@@ -166,72 +794,181 @@ def get_stream_url():
         if not video_id:
             return jsonify({'error': 'video_id is required'}), 400
 
-        # Check cache first
-        if video_id in stream_cache:
-            cached = stream_cache[video_id]
-            if time.time() - cached['timestamp'] < CACHE_TTL:
-                logger.info(f"Cache hit for {video_id}")
-                return jsonify(cached['data'])
-
-        # Extract audio stream URL using yt-dlp
-        ydl_opts = {
-            'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio',
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'no_check_certificates': True,
-            'geo_bypass': True,
-        }
+        response_data = resolve_playback(video_id, g.deadline)
+        if not response_data:
+            return jsonify({'error': 'Could not extract audio stream'}), 500
+
+        with phase('serialize'):
+            return jsonify(response_data)
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            url = f'https://music.youtube.com/watch?v={video_id}'
-            info = ydl.extract_info(url, download=False)
+    except DeadlineExceeded:
+        stale = stale_entry(stream_cache, video_id, STREAM_STALE_TTL)
+        if stale:
+            logger.warning(f"Deadline exceeded, serving stale stream for {video_id}")
+            return jsonify(stale)
+        return deadline_response()
+    except yt_dlp.utils.DownloadError as e:
+        logger.error(f"yt-dlp download error for {video_id}: {e}")
+        return jsonify({'error': 'Video not available or region-restricted'}), 404
+    except Exception as e:
+        logger.error(f"Error extracting stream for {video_id}: {e}")
+        return jsonify({'error': str(e)}), 500
 
-            audio_url = info.get('url', '')
 
-            # If no direct URL, look through formats for audio-only
-            if not audio_url:
-                for fmt in info.get('formats', []):
-                    if (fmt.get('acodec', 'none') != 'none' and
-                            fmt.get('vcodec', 'none') == 'none'):
-                        audio_url = fmt['url']
-                        break
+def prefetch_stream(video_id):
+    """Resolve a stream in the background so a later request hits the cache."""
+    try:
+        resolve_stream(video_id, trace=False)
+    except Exception as e:
+        logger.warning(f"Prefetch failed for {video_id}: {e}")
 
-            if not audio_url:
-                return jsonify({'error': 'Could not extract audio stream'}), 500
 
-            response_data = {
-                'video_id': video_id,
-                'stream_url': audio_url,
-                'title': info.get('title', ''),
-                'artist': info.get('artist', info.get('uploader', '')),
-                'duration': info.get('duration', 0),
-                'format': info.get('ext', 'unknown'),
-            }
+def prefetch_upcoming(queue_id):
+    """Warm the stream URLs of the next tracks in a queue."""
+    now = time.time()
+    for track in queue_store.peek(queue_id, QUEUE_PREFETCH_DEPTH) or []:
+        cached = stream_cache.get(track['video_id'])
+        if not cached or now - cached['timestamp'] >= CACHE_TTL:
+            prefetch_executor.submit(prefetch_stream, track['video_id'])
 
-            # Cache the result
-            stream_cache[video_id] = {
-                'data': response_data,
-                'timestamp': time.time()
-            }
 
-            # Cleanup old cache entries periodically
-            if len(stream_cache) > 50:
-                cleanup_cache()
+def play_queue_track(queue_id, track):
+    """Resolve a queue track's stream, make it current and warm the next ones.
 
-            return jsonify(response_data)
+    The queue position only moves once the stream resolved, so a failed
+    skip leaves the listener where they were.
+    """
+    import yt_dlp
 
+    try:
+        stream = resolve_playback(track['video_id'], g.deadline)
+    except DeadlineExceeded:
+        stream = stale_entry(stream_cache, track['video_id'], STREAM_STALE_TTL)
+        if not stream:
+            return deadline_response()
     except yt_dlp.utils.DownloadError as e:
-        logger.error(f"yt-dlp download error for {video_id}: {e}")
-        return jsonify({'error': 'Video not available or region-restricted'}), 404
+        logger.error(f"yt-dlp download error for {track['video_id']}: {e}")
+        return jsonify({'error': 'Video not available or region-restricted', 'current': track}), 404
+
+    if not stream:
+        return jsonify({'error': 'Could not extract audio stream', 'current': track}), 500
+
+    queue_store.move_to(queue_id, track['index'])
+    prefetch_upcoming(queue_id)
+
+    with phase('serialize'):
+        return jsonify({
+            'queue_id': queue_id,
+            **(queue_store.info(queue_id) or {}),
+            'current': dict(track, stream_url=stream['stream_url']),
+        })
+
+
+@app.route('/queue', methods=['POST'])
+def create_queue():
+    """Create a play queue and resolve its first track.
+
+    Body: ``{"queue_id": "...", "tracks": [{video_id, title, artist}, ...],
+    "start_index": 0}``. ``queue_id`` is generated when omitted. Pass
+    ``"resolve": false`` to skip resolving the current track.
+    """
+    try:
+        data = request.get_json()
+        queue_id = data.get('queue_id') or uuid.uuid4().hex
+        tracks = data.get('tracks')
+
+        if not isinstance(tracks, list):
+            return jsonify({'error': 'tracks must be a list'}), 400
+
+        try:
+            start_index = int(data.get('start_index', 0))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'start_index must be an integer'}), 400
+
+        queue_store.cleanup()
+        try:
+            track = queue_store.create(queue_id, tracks, start_index)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not data.get('resolve', True):
+            prefetch_upcoming(queue_id)
+            return jsonify({'queue_id': queue_id, **queue_store.info(queue_id), 'current': track})
+        return play_queue_track(queue_id, track)
+
     except Exception as e:
-        logger.error(f"Error extracting stream for {video_id}: {e}")
+        logger.error(f"Error creating queue: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/queue/<queue_id>/advance', methods=['POST'])
+def advance_queue(queue_id):
+    """Move the queue by ``step`` (default 1, -1 for previous) and resolve that track.
+
+    With ``"wrap": false`` moving past either end returns ``done: true``
+    instead of wrapping around.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            step = int(data.get('step', 1))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'step must be an integer'}), 400
+        wrap = bool(data.get('wrap', True))
+
+        if queue_store.info(queue_id) is None:
+            return jsonify({'error': 'Queue not found'}), 404
+
+        track = queue_store.target(queue_id, step, wrap)
+        if track is None:
+            return jsonify({'queue_id': queue_id, **(queue_store.info(queue_id) or {}),
+                            'current': None, 'done': True})
+        return play_queue_track(queue_id, track)
+
+    except Exception as e:
+        logger.error(f"Error advancing queue {queue_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/queue/<queue_id>', methods=['GET'])
+def peek_queue(queue_id):
+    """Return the current track and the next ``count`` tracks without moving.
+
+    Upcoming tracks include ``stream_url`` when it is already cached.
+    """
+    count = min(max(1, request.args.get('count', 1, type=int)), 20)
+    current = queue_store.current(queue_id)
+    if current is None:
+        return jsonify({'error': 'Queue not found'}), 404
+
+    now = time.time()
+    upcoming = []
+    for track in queue_store.peek(queue_id, count) or []:
+        cached = stream_cache.get(track['video_id'])
+        if cached and now - cached['timestamp'] < CACHE_TTL:
+            track['stream_url'] = cached['data']['stream_url']
+        upcoming.append(track)
+
+    return jsonify({
+        'queue_id': queue_id,
+        **(queue_store.info(queue_id) or {}),
+        'current': current,
+        'upcoming': upcoming,
+    })
+
+
+@app.route('/queue/<queue_id>', methods=['DELETE'])
+def delete_queue(queue_id):
+    if not queue_store.delete(queue_id):
+        return jsonify({'error': 'Queue not found'}), 404
+    return jsonify({'queue_id': queue_id, 'deleted': True})
+
+
 @app.route('/get_song', methods=['POST'])
 def get_song_details():
     """Get song details using yt-dlp (replaces ytmusicapi.get_song which is blocked)."""
+    import yt_dlp
+
     try:
         data = request.get_json()
         video_id = data.get('video_id', '')
@@ -239,21 +976,16 @@ def get_song_details():
         if not video_id:
             return jsonify({'error': 'video_id parameter is required'}), 400
 
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'skip_download': True,
-        }
+        trace_lookup('/get_song', video_id, None)
+        deadline = g.deadline
+        info = call_with_deadline(extraction_executor, deadline, run_extract,
+                                  PROFILES['metadata'], VIDEO_URL.format(video_id), deadline)
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            url = f'https://music.youtube.com/watch?v={video_id}'
-            info = ydl.extract_info(url, download=False)
-
-            artist = info.get('artist', info.get('uploader', info.get('channel', 'Unknown')))
-            if artist and artist.endswith(' - Topic'):
-                artist = artist[:-8]
+        artist = info.get('artist', info.get('uploader', info.get('channel', 'Unknown')))
+        if artist and artist.endswith(' - Topic'):
+            artist = artist[:-8]
 
+        with phase('serialize'):
             return jsonify({
                 'video_id': video_id,
                 'title': info.get('title', 'Unknown'),
@@ -263,6 +995,8 @@ def get_song_details():
                 'thumbnail': info.get('thumbnail', ''),
             })
 
+    except DeadlineExceeded:
+        return deadline_response()
     except yt_dlp.utils.DownloadError as e:
         logger.error(f"yt-dlp error getting song details for {video_id}: {e}")
         return jsonify({'error': 'Song not found or unavailable'}), 404
@@ -271,6 +1005,120 @@ def get_song_details():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    """List captured request profiles (requires X-Profile-Key)."""
+    if not profiler.is_authorized(request.headers):
+        return jsonify({'error': 'Not found'}), 404
+    profiles = profiler.list()
+    return jsonify({'profiles': profiles, 'count': len(profiles)})
+
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """Download a pstats dump; inspect with `python -m pstats <file>`."""
+    if not profiler.is_authorized(request.headers):
+        return jsonify({'error': 'Not found'}), 404
+    path = profiler.path_for(profile_id)
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/octet-stream',
+                     as_attachment=True, download_name=f'{profile_id}.prof')
+
+
+def warm_extractors():
+    """Import yt_dlp and instantiate the YouTube extractors.
+
+    With pooling on, this builds the first pooled instance of each profile,
+    so the first request doesn't pay for it. With the process backend it
+    also starts the worker processes, which warm their own instances.
+    """
+    import yt_dlp
+
+    if process_backend is not None:
+        process_backend.warm()
+
+    if ydl_pool.enabled:
+        for profile in PROFILES.values():
+            with ydl_pool.checkout(profile) as ydl:
+                ydl.get_info_extractor(profile.ie_key)
+        return
+
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+        for ie_key in ('Youtube', 'YoutubeSearch'):
+            ydl.get_info_extractor(ie_key)
+
+
+def warm_hot_keys():
+    """Reload cache entries persisted by the previous process."""
+    if not HOT_KEYS_FILE:
+        return 'skipped'
+    return {'loaded': load_hot_keys(HOT_KEYS_FILE, hot_key_caches())}
+
+
+def warm_canary(resolver=None):
+    """Resolve a canary video end to end to fetch player JS and warm caches.
+
+    ``resolver`` defaults to ``resolve_stream``; pass a stand-in to exercise
+    the warm-up path without network access.
+    """
+    if not WARMUP_CANARY_VIDEO_ID:
+        return 'skipped'
+    resolver = resolver or resolve_stream
+    data = resolver(WARMUP_CANARY_VIDEO_ID)
+    if not data:
+        raise RuntimeError(f'canary {WARMUP_CANARY_VIDEO_ID} returned no stream')
+    return {'video_id': WARMUP_CANARY_VIDEO_ID}
+
+
+WARMUP_STEP_FUNCS = {
+    'extractors': warm_extractors,
+    'hot_keys': warm_hot_keys,
+    'canary': warm_canary,
+}
+
+
+def hot_key_caches():
+    return {'stream': (stream_cache, CACHE_TTL), 'search': (search_cache, SEARCH_CACHE_TTL)}
+
+
+def persist_hot_keys():
+    """Save hot cache entries so the next process can reload them."""
+    if not HOT_KEYS_FILE:
+        return
+    try:
+        saved = save_hot_keys(HOT_KEYS_FILE, hot_key_caches(), HOT_KEYS_MAX)
+        logger.info(f"Persisted {saved} hot cache entries to {HOT_KEYS_FILE}")
+    except Exception as e:
+        logger.error(f"Error persisting hot keys: {e}")
+
+
+def start_warmup(background=True):
+    """Register the configured warm-up steps and start running them."""
+    for name in WARMUP_STEPS:
+        if name not in WARMUP_STEP_FUNCS:
+            logger.warning(f"Unknown warm-up step '{name}'")
+            continue
+        warmup.add_step(name, WARMUP_STEP_FUNCS[name])
+    warmup.start(background=background)
+
+
+def handle_sigterm(signum, frame):
+    # systemd stops the service with SIGTERM; exit normally so atexit runs
+    sys.exit(0)
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    atexit.register(persist_hot_keys)
+    atexit.register(ydl_pool.clear)
+    if process_backend is not None:
+        atexit.register(process_backend.shutdown)
+    if dns_cache:
+        dns_cache.install()
+    if HTTP2:
+        enable_http2()
+    if WARMUP:
+        start_warmup()
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,252 @@
+"""Disk cache of audio files for tracks in heavy rotation.
+
+Every play of a track normally means an extraction plus Alexa fetching the
+audio from googlevideo. ``AudioStore`` counts plays per video; once a track
+is popular enough, its already-selected audio format is downloaded in the
+background to a local directory, and later plays are served from disk by
+``/audio/<video_id>`` (with HTTP Range support) without any extraction or
+upstream traffic.
+
+Popularity is a play count that halves every ``half_life`` seconds, so
+tracks that were hot last month don't hold space forever. The directory is
+kept under ``max_bytes`` by evicting the least popular files first. Each
+cached file has a JSON sidecar with its metadata, so the cache survives
+restarts.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+MIMETYPES = {
+    'm4a': 'audio/mp4',
+    'mp4': 'audio/mp4',
+    'mp3': 'audio/mpeg',
+    'webm': 'audio/webm',
+    'opus': 'audio/ogg',
+}
+
+
+class AudioStore:
+    """Byte-budgeted, popularity-evicted audio files on local disk."""
+
+    def __init__(self, directory, max_bytes, min_plays=3, half_life=7 * 86400,
+                 max_file_bytes=50 * 1024 * 1024, chunk_size=10 * 1024 * 1024,
+                 timeout=30, workers=2, max_tracked=10000):
+        # Imported here so `import app` doesn't pay for requests when the
+        # cache is off
+        import requests
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.half_life = half_life
+        self.max_file_bytes = max_file_bytes
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_tracked = max_tracked
+        self.session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio-fetch')
+        self._lock = threading.Lock()
+        self._scores = {}      # video_id -> (score, timestamp)
+        self._entries = {}     # video_id -> metadata of a cached file
+        self._downloading = set()
+        self._counts = {'local_plays': 0, 'downloads': 0, 'download_failures': 0, 'evictions': 0}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def total_bytes(self):
+        return sum(entry['size'] for entry in self._entries.values())
+
+    def record_play(self, video_id):
+        """Count a play and return the track's current popularity."""
+        now = time.time()
+        with self._lock:
+            score = self._score(video_id, now) + 1
+            self._scores[video_id] = (score, now)
+            if len(self._scores) > self.max_tracked:
+                self._forget_unpopular(now)
+            return score
+
+    def get(self, video_id, hit=True):
+        """Return the cached file's metadata (with ``path``), or None.
+
+        ``hit`` counts the lookup as a play served from disk.
+        """
+        with self._lock:
+            entry = self._entries.get(video_id)
+        if entry is None:
+            return None
+        path = self.path_for(video_id, entry['ext'])
+        if not os.path.exists(path):
+            with self._lock:
+                self._entries.pop(video_id, None)
+            return None
+        if hit:
+            with self._lock:
+                self._counts['local_plays'] += 1
+        return dict(entry, path=path)
+
+    def maybe_fetch(self, video_id, stream):
+        """Download ``stream['stream_url']`` in the background if the track is hot.
+
+        Returns True if a download was started.
+        """
+        if not VIDEO_ID_RE.match(video_id) or not stream.get('stream_url'):
+            return False
+        with self._lock:
+            # Rounded: the score decays slightly between record_play and here
+            popular = round(self._score(video_id, time.time()), 3) >= self.min_plays
+            if not popular or video_id in self._entries or video_id in self._downloading:
+                return False
+            self._downloading.add(video_id)
+        self._executor.submit(self._download, video_id, stream)
+        return True
+
+    def mimetype(self, entry):
+        return MIMETYPES.get(entry['ext'], 'application/octet-stream')
+
+    def path_for(self, video_id, ext):
+        return os.path.join(self.directory, f'{video_id}.{ext}')
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                'files': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'downloading': len(self._downloading),
+            }
+
+    def wait(self):
+        """Block until queued downloads have finished (tests, shutdown)."""
+        self._executor.submit(lambda: None).result()
+        while True:
+            with self._lock:
+                if not self._downloading:
+                    return
+            time.sleep(0.01)
+
+    def _score(self, video_id, now):
+        # Caller holds the lock
+        score, timestamp = self._scores.get(video_id, (0.0, now))
+        return score * 0.5 ** ((now - timestamp) / self.half_life)
+
+    def _forget_unpopular(self, now):
+        # Caller holds the lock; never forget tracks that are on disk
+        candidates = sorted((v for v in self._scores if v not in self._entries),
+                            key=lambda v: self._score(v, now))
+        for video_id in candidates[:len(candidates) // 2]:
+            del self._scores[video_id]
+
+    def _download(self, video_id, stream):
+        ext = stream.get('format') or 'm4a'
+        if ext not in MIMETYPES:
+            ext = 'm4a'
+        path = self.path_for(video_id, ext)
+        part = f'{path}.part'
+        try:
+            size = self._fetch(stream['stream_url'], part)
+            os.replace(part, path)
+            entry = {
+                'video_id': video_id,
+                'ext': ext,
+                'size': size,
+                'title': stream.get('title', ''),
+                'artist': stream.get('artist', ''),
+                'duration': stream.get('duration', 0),
+                'format': stream.get('format', ext),
+                'downloaded_at': time.time(),
+            }
+            with open(self.path_for(video_id, 'json'), 'w') as f:
+                json.dump(entry, f)
+            with self._lock:
+                self._entries[video_id] = entry
+                self._counts['downloads'] += 1
+            self._evict(keep=video_id)
+            logger.info(f"Cached audio for {video_id} ({size} bytes)")
+        except Exception as e:
+            with self._lock:
+                self._counts['download_failures'] += 1
+            logger.warning(f"Audio download failed for {video_id}: {e}")
+            if os.path.exists(part):
+                os.remove(part)
+        finally:
+            with self._lock:
+                self._downloading.discard(video_id)
+
+    def _fetch(self, url, path):
+        """Download ``url`` to ``path`` in Range requests of ``chunk_size``.
+
+        googlevideo throttles long single requests; ranged chunks are what
+        yt-dlp itself uses. A server that ignores Range gets read in one go.
+        """
+        written = 0
+        total = None
+        with open(path, 'wb') as f:
+            while total is None or written < total:
+                headers = {'Range': f'bytes={written}-{written + self.chunk_size - 1}'}
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    if response.status_code == 206:
+                        match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+                        if match and match.group(3) != '*':
+                            total = int(match.group(3))
+                    for chunk in response.iter_content(64 * 1024):
+                        written += len(chunk)
+                        if written > self.max_file_bytes:
+                            raise ValueError(f'larger than {self.max_file_bytes} bytes')
+                        f.write(chunk)
+                    if response.status_code != 206 or total is None:
+                        break
+        if total is not None and written != total:
+            raise ValueError(f'incomplete download ({written} of {total} bytes)')
+        return written
+
+    def _evict(self, keep=None):
+        """Delete the least popular files until the store fits ``max_bytes``."""
+        now = time.time()
+        while True:
+            with self._lock:
+                if self.total_bytes <= self.max_bytes:
+                    return
+                candidates = [v for v in self._entries if v != keep]
+                if not candidates:
+                    # The newest file alone is over budget
+                    candidates = list(self._entries)
+                victim = min(candidates, key=lambda v: self._score(v, now))
+                entry = self._entries.pop(victim)
+                self._counts['evictions'] += 1
+            for path in (self.path_for(victim, entry['ext']), self.path_for(victim, 'json')):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _load(self):
+        """Rebuild the index from sidecar files left by a previous process."""
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.part'):
+                os.remove(path)
+                continue
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+                if os.path.exists(self.path_for(entry['video_id'], entry['ext'])):
+                    self._entries[entry['video_id']] = entry
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping audio cache entry {name}: {e}")
+        self._evict()
@@ -0,0 +1,141 @@
+"""Benchmark cache-hit latency while extractions run, per extraction backend.
+
+Serves /stream cache hits through the Flask test client while background
+threads keep extractions running, once on extraction threads (the default)
+and once on worker processes (EXTRACTION_BACKEND=process).
+
+    # Offline: synthetic CPU-bound extractions (JSON parsing, like the
+    # player response handling in yt-dlp)
+    python benchmarks/bench_backends.py offline [--load 4] [--requests 300]
+
+    # Live: real stream extractions (needs network)
+    python benchmarks/bench_backends.py live --video-id dQw4w9WgXcQ --video-id kXYiU_JCYtU
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+os.environ.setdefault('WARMUP', '0')
+os.environ.setdefault('TIMING_LOG', '0')
+
+import app  # noqa: E402
+from extraction import VIDEO_URL  # noqa: E402
+from hedging import percentile  # noqa: E402
+from process_backend import ProcessBackend  # noqa: E402
+
+HIT_VIDEO_ID = 'benchhit001'
+
+# Roughly the size of a watch page's player response
+PAYLOAD = json.dumps({'formats': [{'url': 'https://rr1---sn.googlevideo.com/videoplayback?' + 'x' * 600,
+                                   'itag': i, 'bitrate': i * 1000, 'mimeType': 'audio/mp4'}
+                                  for i in range(80)]})
+
+
+def burn(ms, deadline=None):
+    """Synthetic extraction: parse and sort player JSON for ``ms`` of CPU time."""
+    end = time.thread_time() + ms / 1000
+    while time.thread_time() < end:
+        formats = json.loads(PAYLOAD)['formats']
+        formats.sort(key=lambda f: (-f['bitrate'], f['itag']))
+    return {'url': formats[0]['url'][:40]}
+
+
+def hit_latencies(client, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = client.post('/stream', data=json.dumps({'video_id': HIT_VIDEO_ID}),
+                               content_type='application/json')
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return samples
+
+
+def run_load(task, threads):
+    """Call ``task()`` in a loop on ``threads`` threads until stopped."""
+    stop = threading.Event()
+    done = [0]
+
+    def loop():
+        while not stop.is_set():
+            try:
+                task()
+                done[0] += 1
+            except Exception as e:
+                print(f'load task failed: {e}', file=sys.stderr)
+                time.sleep(0.1)
+
+    workers = [threading.Thread(target=loop, daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    return stop, workers, done
+
+
+def measure(name, task, args, client):
+    stop, workers, done = run_load(task, args.load) if task else (None, [], [0])
+    time.sleep(0.5)  # let the load ramp up
+    start = time.perf_counter()
+    samples = hit_latencies(client, args.requests)
+    elapsed = time.perf_counter() - start
+    if stop:
+        stop.set()
+        for worker in workers:
+            worker.join()
+    result = {f'p{p}_ms': round(percentile(samples, p) * 1000, 2) for p in (50, 95, 99)}
+    result['extractions_per_s'] = round(done[0] / elapsed, 1) if task else None
+    print(f"{name:10s} hit p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+          f"p99 {result['p99_ms']:7.2f} ms  extractions/s {result['extractions_per_s']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('mode', choices=('offline', 'live'))
+    parser.add_argument('--load', type=int, default=4, help='concurrent extractions')
+    parser.add_argument('--requests', type=int, default=300, help='cache hits measured per backend')
+    parser.add_argument('--burn-ms', type=int, default=200, help='CPU time per synthetic extraction')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--video-id', action='append', default=[])
+    args = parser.parse_args()
+    if args.mode == 'live' and not args.video_id:
+        parser.error('live mode needs at least one --video-id')
+
+    app.stream_cache[HIT_VIDEO_ID] = {
+        'data': {'video_id': HIT_VIDEO_ID, 'stream_url': 'https://example.invalid/audio', 'title': 'Hit',
+                 'artist': 'Bench', 'duration': 200, 'format': 'm4a'},
+        'timestamp': time.time() + 3600,
+    }
+    client = app.app.test_client()
+    backend = ProcessBackend(app.PROFILES, workers=args.processes, max_rss_mb=0)
+    backend.warm()
+
+    if args.mode == 'offline':
+        thread_task = lambda: burn(args.burn_ms)  # noqa: E731
+        process_task = lambda: backend.call(burn, args.burn_ms)  # noqa: E731
+    else:
+        targets = [VIDEO_URL.format(video_id) for video_id in args.video_id]
+        counter = iter(range(10 ** 9))
+
+        def thread_task():
+            app.run_extract(app.PROFILES['stream'], targets[next(counter) % len(targets)])
+
+        def process_task():
+            backend.extract(app.PROFILES['stream'], targets[next(counter) % len(targets)])
+
+    results = {}
+    try:
+        results['idle'] = measure('idle', None, args, client)
+        results['thread'] = measure('thread', thread_task, args, client)
+        results['process'] = measure('process', process_task, args, client)
+    finally:
+        backend.shutdown()
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Benchmark the extraction profiles against the previous per-endpoint ydl_opts.
+
+    # Record real info dicts (needs network) into benchmarks/fixtures/
+    python benchmarks/bench_profiles.py record --video-id dQw4w9WgXcQ --query "oasis wonderwall"
+
+    # Offline: size of the info dict held per request, before/after trimming
+    python benchmarks/bench_profiles.py offline
+
+    # Live: wall time and HTTP requests per extraction, old opts vs profile
+    python benchmarks/bench_profiles.py live --video-id dQw4w9WgXcQ --query "oasis wonderwall"
+
+Without recorded fixtures the offline mode falls back to a synthetic info
+dict shaped like a typical YouTube Music watch page (dozens of formats,
+thumbnails and auto-caption languages); record real ones for real numbers.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(SERVICE_DIR, 'benchmarks', 'fixtures')
+sys.path.insert(0, SERVICE_DIR)
+
+from extraction import VIDEO_URL, build_profiles  # noqa: E402
+
+# The ydl_opts each endpoint used before extraction profiles
+LEGACY_OPTS = {
+    'search': {'quiet': True, 'no_warnings': True, 'extract_flat': True, 'default_search': 'ytsearch'},
+    'stream': {'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio', 'quiet': True,
+               'no_warnings': True, 'extract_flat': False, 'no_check_certificates': True, 'geo_bypass': True},
+    'metadata': {'quiet': True, 'no_warnings': True, 'extract_flat': False, 'skip_download': True},
+}
+
+
+def targets(args):
+    return {
+        'search': f'ytsearch10:{args.query}',
+        'stream': VIDEO_URL.format(args.video_id),
+        'metadata': VIDEO_URL.format(args.video_id),
+    }
+
+
+def deep_size(obj, seen=None):
+    """Approximate retained size of a nested dict/list structure in bytes."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(v, seen) for v in obj)
+    return size
+
+
+def synthetic_info():
+    fmt = {'url': 'https://rr1---sn-example.googlevideo.com/videoplayback?' + 'x' * 900,
+           'http_headers': {'User-Agent': 'Mozilla/5.0', 'Accept': '*/*', 'Accept-Language': 'en-us'},
+           'downloader_options': {'http_chunk_size': 10485760}, 'protocol': 'https'}
+    formats = [dict(fmt, format_id=str(i), acodec='mp4a.40.2' if i < 6 else 'none',
+                    vcodec='none' if i < 6 else 'avc1', ext='m4a' if i < 6 else 'mp4') for i in range(30)]
+    captions = {f'l{i}': [{'ext': ext, 'url': 'https://www.youtube.com/api/timedtext?' + 'y' * 300}
+                          for ext in ('json3', 'srv1', 'srv2', 'srv3', 'ttml', 'vtt')] for i in range(150)}
+    return {
+        'id': 'synthetic', 'title': 'Song', 'artist': 'Artist', 'uploader': 'Artist - Topic',
+        'channel': 'Artist - Topic', 'album': 'Album', 'duration': 258, 'ext': 'm4a',
+        'url': formats[0]['url'], 'thumbnail': 'https://i.ytimg.com/vi/x/maxresdefault.jpg',
+        'thumbnails': [{'url': f'https://i.ytimg.com/vi/x/{i}.jpg', 'id': str(i)} for i in range(40)],
+        'formats': formats, 'automatic_captions': captions, 'description': 'z' * 2000,
+        'tags': ['tag'] * 30, 'heatmap': [{'start_time': i, 'value': 0.5} for i in range(100)],
+    }
+
+
+def load_fixtures():
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.json'))):
+        purpose = os.path.basename(path).split('_', 1)[0]
+        with open(path) as f:
+            fixtures.setdefault(purpose, []).append((os.path.basename(path), json.load(f)))
+    if not fixtures:
+        print('No recorded fixtures; using a synthetic info dict.\n')
+        info = synthetic_info()
+        search = {'entries': [dict(info, id=f'v{i}') for i in range(10)]}
+        fixtures = {'stream': [('synthetic', info)], 'metadata': [('synthetic', info)],
+                    'search': [('synthetic', search)]}
+    return fixtures
+
+
+def cmd_record(args):
+    import yt_dlp
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for purpose, target in targets(args).items():
+        with yt_dlp.YoutubeDL(LEGACY_OPTS[purpose]) as ydl:
+            info = ydl.sanitize_info(ydl.extract_info(target, download=False))
+        key = args.video_id if purpose != 'search' else args.query.replace(' ', '-')
+        path = os.path.join(FIXTURE_DIR, f'{purpose}_{key}.json')
+        with open(path, 'w') as f:
+            json.dump(info, f)
+        print(f'recorded {path}')
+
+
+def cmd_offline(args):
+    profiles = build_profiles()
+    for purpose, items in load_fixtures().items():
+        for name, info in items:
+            start = time.perf_counter()
+            trimmed = profiles[purpose].trim(info)
+            trim_ms = (time.perf_counter() - start) * 1000
+            before, after = deep_size(info), deep_size(trimmed)
+            print(f'{purpose:9s} {name:30s} held {before / 1024:9.1f} KiB -> {after / 1024:7.1f} KiB '
+                  f'({100 * (1 - after / before):5.1f}% smaller), trim {trim_ms:.2f} ms')
+
+
+def cmd_live(args):
+    import yt_dlp
+
+    requests_made = []
+    original_urlopen = yt_dlp.YoutubeDL.urlopen
+
+    def counting_urlopen(self, req):
+        requests_made.append(req)
+        return original_urlopen(self, req)
+
+    yt_dlp.YoutubeDL.urlopen = counting_urlopen
+    profiles = build_profiles()
+    for purpose, target in targets(args).items():
+        variants = {
+            'legacy': (LEGACY_OPTS[purpose], None),
+            'profile': (profiles[purpose].ydl_opts, profiles[purpose].ie_key),
+        }
+        for variant, (opts, ie_key) in variants.items():
+            times, counts = [], []
+            for _ in range(args.runs):
+                requests_made.clear()
+                start = time.perf_counter()
+                with yt_dlp.YoutubeDL(opts) as ydl:
+                    ydl.extract_info(target, download=False, ie_key=ie_key)
+                times.append((time.perf_counter() - start) * 1000)
+                counts.append(len(requests_made))
+            print(f'{purpose:9s} {variant:8s} median {statistics.median(times):8.1f} ms, '
+                  f'{statistics.median(counts):4.0f} HTTP requests')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('mode', choices=['record', 'offline', 'live'], nargs='?', default='offline')
+    parser.add_argument('--video-id', default='dQw4w9WgXcQ')
+    parser.add_argument('--query', default='oasis wonderwall')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+    {'record': cmd_record, 'offline': cmd_offline, 'live': cmd_live}[args.mode](args)
+
+
+if __name__ == '__main__':
+    main()
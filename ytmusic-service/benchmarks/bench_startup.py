@@ -0,0 +1,89 @@
+"""Benchmark service import time and time to first request.
+
+Each measurement runs in a fresh interpreter so nothing is cached in-process.
+
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    # Import the app module only (yt_dlp stays deferred)
+    'import_app': """
+import time; t = time.perf_counter()
+import app
+print(time.perf_counter() - t)
+""",
+    # What the old eager import cost: app plus the full yt_dlp package
+    'import_app_and_yt_dlp': """
+import time; t = time.perf_counter()
+import app, yt_dlp
+print(time.perf_counter() - t)
+""",
+    # Interpreter start to first /health response
+    'first_health_request': """
+import time; t = time.perf_counter()
+import app
+app.app.test_client().get('/health')
+print(time.perf_counter() - t)
+""",
+    # Cost of the 'extractors' warm-up step in a cold process
+    'warmup_extractors': """
+import time
+import app
+t = time.perf_counter()
+app.warm_extractors()
+print(time.perf_counter() - t)
+""",
+    # YoutubeDL construction after warm-up (what a request pays once warm)
+    'ydl_init_after_warmup': """
+import time
+import app, yt_dlp
+app.warm_extractors()
+t = time.perf_counter()
+with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+    ydl.get_info_extractor('Youtube')
+print(time.perf_counter() - t)
+""",
+    # Borrowing a pooled YoutubeDL after warm-up (HTTP_POOL_SIZE > 0)
+    'pool_checkout_after_warmup': """
+import time
+import app
+app.warm_extractors()
+t = time.perf_counter()
+with app.ydl_pool.checkout(app.PROFILES['stream']) as ydl:
+    ydl.get_info_extractor('Youtube')
+print(time.perf_counter() - t)
+""",
+}
+
+
+def run(code):
+    env = dict(os.environ, WARMUP='0', TIMING_LOG='0')
+    out = subprocess.run([sys.executable, '-c', code], cwd=SERVICE_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in SCENARIOS.items():
+        samples = [run(code) * 1000 for _ in range(args.runs)]
+        results[name] = {'median_ms': round(statistics.median(samples), 1),
+                         'min_ms': round(min(samples), 1)}
+        print(f"{name:28s} median {results[name]['median_ms']:8.1f} ms   min {results[name]['min_ms']:8.1f} ms")
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Cache access traces for offline cache-policy simulation.
+
+With ``CACHE_TRACE_FILE`` set, every cache lookup made by ``/search``,
+``/stream`` and ``/get_song`` is appended to an NDJSON trace, one record
+per lookup::
+
+    {"ts": 1718000000.123, "endpoint": "/stream", "key": "3f2a...", "hit": false}
+    {"ts": 1718000042.551, "endpoint": "/stream", "key": "3f2a...", "hit": true, "size": 412}
+
+``size`` is the serialized size of the cached value, known on hits. Keys are
+hashed by default so traces don't contain search text. Recording only pushes
+onto a queue; a background thread does the JSON encoding and file writes, so
+the request path pays close to nothing. ``simulate.py`` replays the trace.
+"""
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def hash_key(key):
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+class CacheTracer:
+    """Appends cache lookups to an NDJSON file from a background thread."""
+
+    def __init__(self, path, hash_keys=True, flush_interval=1.0):
+        self.path = path
+        self.hash_keys = hash_keys
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer, name='cache-trace', daemon=True)
+        self._thread.start()
+
+    def record(self, endpoint, key, hit, value=None):
+        """Record one lookup. ``value`` (the cached data) is sized off-thread."""
+        self._queue.put((time.time(), endpoint, key, hit, value))
+
+    def flush(self, timeout=5.0):
+        """Block until everything recorded so far has been written."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _encode(self, item):
+        ts, endpoint, key, hit, value = item
+        record = {
+            'ts': round(ts, 3),
+            'endpoint': endpoint,
+            'key': hash_key(key) if self.hash_keys else key,
+            'hit': hit,
+        }
+        if value is not None:
+            record['size'] = len(json.dumps(value, separators=(',', ':')))
+        return json.dumps(record) + '\n'
+
+    def _writer(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while not isinstance(items[-1], threading.Event) and time.monotonic() < deadline:
+                try:
+                    items.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            events = [item for item in items if isinstance(item, threading.Event)]
+            lines = [self._encode(item) for item in items if not isinstance(item, threading.Event)]
+            try:
+                if lines:
+                    with open(self.path, 'a') as f:
+                        f.writelines(lines)
+            except OSError as e:
+                logger.error(f"Error writing cache trace: {e}")
+            for event in events:
+                event.set()
+
+
+def read_trace(path):
+    """Yield trace records from an NDJSON trace file, skipping bad lines."""
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
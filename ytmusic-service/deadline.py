@@ -0,0 +1,97 @@
+"""Request deadlines propagated from the caller.
+
+Alexa gives the skill about 8 seconds per request. The Lambda sends the time
+it has left in ``X-Request-Deadline-Ms``; the service turns that into a
+``Deadline`` that travels with the request into extractions, waits on
+in-flight work and batch operations. When it runs out, callers fall back to
+the best answer they have (stale cache, partial batch) or a fast 504, and
+the extraction is cancelled instead of running on for nobody.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from timing import profiled
+
+DEADLINE_HEADER = 'X-Request-Deadline-Ms'
+
+
+class DeadlineExceeded(Exception):
+    """The caller's time budget ran out, or its work was cancelled."""
+
+
+class Deadline:
+    """A point in (monotonic) time after which the caller no longer waits."""
+
+    def __init__(self, seconds, parent=None, cancelled=None):
+        """``cancelled`` is an Event shared with the canceller, e.g. a
+        ``multiprocessing.Manager().Event()`` across processes; by default a
+        private ``threading.Event``.
+        """
+        self.expires_at = time.monotonic() + seconds
+        self.parent = parent
+        self._cancelled = cancelled if cancelled is not None else threading.Event()
+
+    @classmethod
+    def from_headers(cls, headers, margin=0.0, max_seconds=None):
+        """Build a deadline from the request header, or None if absent/invalid.
+
+        ``margin`` is kept back for serializing and sending the response.
+        """
+        value = headers.get(DEADLINE_HEADER, '')
+        try:
+            seconds = float(value) / 1000
+        except ValueError:
+            return None
+        if max_seconds is not None:
+            seconds = min(seconds, max_seconds)
+        return cls(max(0.0, seconds - margin))
+
+    def child(self):
+        """A deadline expiring with this one that can also be cancelled on its own.
+
+        Used to stop one of several attempts made for the same caller.
+        """
+        return Deadline(self.remaining(), parent=self)
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        if self.parent is not None and self.parent.expired:
+            return True
+        return self._cancelled.is_set() or time.monotonic() >= self.expires_at
+
+    def cancel(self):
+        """Signal all work under this deadline to stop at its next check."""
+        self._cancelled.set()
+
+    def check(self):
+        """Raise DeadlineExceeded if the deadline passed or was cancelled."""
+        if self.expired:
+            raise DeadlineExceeded('Deadline exceeded')
+
+
+def call_with_deadline(executor, deadline, fn, *args):
+    """Run ``fn(*args)``, giving up when ``deadline`` expires.
+
+    Without a deadline ``fn`` runs inline. Otherwise it runs on ``executor``
+    (with the caller's context, so request timing and profiling still work)
+    and the caller stops waiting at the deadline; the deadline is then
+    cancelled so ``fn`` stops at its next ``check()`` rather than burning a
+    worker.
+    """
+    if deadline is None:
+        return fn(*args)
+    deadline.check()
+
+    ctx = contextvars.copy_context()
+    future = executor.submit(ctx.run, profiled, fn, *args)
+    try:
+        return future.result(timeout=deadline.remaining())
+    except FutureTimeout:
+        deadline.cancel()
+        future.cancel()
+        raise DeadlineExceeded('Deadline exceeded')
@@ -0,0 +1,237 @@
+"""Purpose-specific yt-dlp extraction profiles.
+
+yt-dlp's generic pipeline does more than any one endpoint needs: extractor
+dispatch over every registered extractor, DASH/HLS manifest downloads,
+translated subtitle tracks, the player JS for signature deciphering. Each
+profile pins the extractor, turns off the steps its endpoint never reads and
+trims the resulting ``info`` dict down to the fields the endpoint uses, so
+less is fetched and less is held in memory for the rest of the request.
+"""
+from contextlib import ExitStack
+
+from deadline import DeadlineExceeded
+from http_pool import connection_counts
+from timing import count, phase
+
+VIDEO_URL = 'https://music.youtube.com/watch?v={}'
+
+BASE_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,
+    'writesubtitles': False,
+    'writeautomaticsub': False,
+    'writethumbnail': False,
+    'getcomments': False,
+}
+
+
+class ExtractionProfile:
+    """yt-dlp options, pinned extractor and field trimming for one purpose."""
+
+    def __init__(self, name, ie_key, ydl_opts, trim, trim_entry=None):
+        self.name = name
+        self.ie_key = ie_key
+        self.ydl_opts = ydl_opts
+        self.trim = trim
+        self.trim_entry = trim_entry
+
+    def __repr__(self):
+        return f'ExtractionProfile({self.name!r})'
+
+
+def _pick(info, fields):
+    return {k: info[k] for k in fields if k in info}
+
+
+def _trim_search_entry(entry):
+    trimmed = _pick(entry, ('id', 'title', 'uploader', 'channel', 'duration'))
+    if entry.get('thumbnails'):
+        trimmed['thumbnails'] = entry['thumbnails'][:1]
+    return trimmed
+
+
+def _trim_search(info):
+    return {'entries': [_trim_search_entry(entry) for entry in info.get('entries') or [] if entry]}
+
+
+def _trim_stream(info):
+    trimmed = _pick(info, ('url', 'title', 'artist', 'uploader', 'duration', 'ext'))
+    # Formats are only needed when yt-dlp did not select a single URL
+    if not info.get('url'):
+        trimmed['formats'] = [_pick(fmt, ('url', 'acodec', 'vcodec', 'ext'))
+                              for fmt in info.get('formats') or []]
+    return trimmed
+
+
+def _trim_metadata(info):
+    return _pick(info, ('title', 'artist', 'uploader', 'channel', 'duration', 'album', 'thumbnail'))
+
+
+def _stream_profile(name, player_clients):
+    stream_args = {'skip': ['dash', 'hls', 'translated_subs']}
+    if player_clients:
+        stream_args['player_client'] = list(player_clients)
+    return ExtractionProfile(
+        name,
+        ie_key='Youtube',
+        ydl_opts={
+            **BASE_OPTS,
+            'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio',
+            'extract_flat': False,
+            'no_check_certificates': True,
+            'geo_bypass': True,
+            'check_formats': False,
+            'extractor_args': {'youtube': stream_args},
+        },
+        trim=_trim_stream,
+    )
+
+
+def build_profiles(stream_player_clients=(), hedge_player_clients=()):
+    """Build the ``search``, ``stream`` and ``metadata`` profiles.
+
+    ``stream_player_clients`` pins the YouTube player clients used for stream
+    extraction; empty keeps yt-dlp's default client set. With
+    ``hedge_player_clients`` a ``stream_hedge`` profile is added: the stream
+    profile on other player clients, for hedged extraction.
+    """
+    profiles = {
+        'search': ExtractionProfile(
+            'search',
+            ie_key='YoutubeSearch',
+            ydl_opts={
+                **BASE_OPTS,
+                'extract_flat': True,
+                'default_search': 'ytsearch',
+            },
+            trim=_trim_search,
+            trim_entry=_trim_search_entry,
+        ),
+        'stream': _stream_profile('stream', stream_player_clients),
+        'metadata': ExtractionProfile(
+            'metadata',
+            ie_key='Youtube',
+            ydl_opts={
+                **BASE_OPTS,
+                'extract_flat': False,
+                'skip_download': True,
+                # No stream URLs are returned, so skip the player JS and
+                # don't fail when no format survives without it
+                'ignore_no_formats_error': True,
+                'extractor_args': {'youtube': {
+                    'skip': ['dash', 'hls', 'translated_subs'],
+                    'player_skip': ['js'],
+                }},
+            },
+            trim=_trim_metadata,
+        ),
+    }
+    if hedge_player_clients:
+        profiles['stream_hedge'] = _stream_profile('stream_hedge', hedge_player_clients)
+    return profiles
+
+
+def _guard_requests(ydl, deadline):
+    """Check ``deadline`` before every HTTP request the extractor makes.
+
+    A cancelled or expired deadline raises DeadlineExceeded out of
+    ``extract_info`` at the next request instead of finishing the extraction.
+    Each request's timeout is also capped to the time left, which matters for
+    pooled instances whose ``socket_timeout`` was fixed when they were built.
+    Returns a function that removes the guard.
+    """
+    from yt_dlp.networking import Request
+
+    urlopen = ydl.urlopen
+
+    def guarded_urlopen(req):
+        deadline.check()
+        if isinstance(req, str):
+            req = Request(req)
+        if isinstance(req, Request):
+            timeout = max(1.0, deadline.remaining())
+            current = req.extensions.get('timeout')
+            req.extensions['timeout'] = min(current, timeout) if current else timeout
+        return urlopen(req)
+
+    ydl.urlopen = guarded_urlopen
+
+    def unguard():
+        ydl.urlopen = urlopen
+    return unguard
+
+
+def _record_connections(pool, profile, ydl, before):
+    after = connection_counts(ydl)
+    connections = max(0, after[0] - before[0])
+    requests_sent = max(0, after[1] - before[1])
+    pool.record(profile, connections, requests_sent)
+    count('http_connections', connections)
+    count('http_requests', requests_sent)
+
+
+def _open(stack, profile, deadline, pool):
+    """Enter a YoutubeDL for ``profile`` on ``stack`` and return it.
+
+    With an enabled ``pool`` the instance is borrowed (and its connection
+    counts recorded when the stack closes); otherwise a fresh one is built.
+    """
+    import yt_dlp
+
+    if pool is not None and pool.enabled:
+        # Lazily iterated entries raise ExtractorError, not DownloadError
+        expected = (yt_dlp.utils.DownloadError, yt_dlp.utils.ExtractorError, DeadlineExceeded)
+        with phase('ydl_init'):
+            ydl = stack.enter_context(pool.checkout(profile, expected))
+        stack.callback(_record_connections, pool, profile, ydl, connection_counts(ydl))
+    else:
+        ydl_opts = profile.ydl_opts
+        if deadline is not None:
+            ydl_opts = dict(ydl_opts, socket_timeout=max(1.0, deadline.remaining()))
+        with phase('ydl_init'):
+            ydl = stack.enter_context(yt_dlp.YoutubeDL(ydl_opts))
+    if deadline is not None:
+        stack.callback(_guard_requests(ydl, deadline))
+    return ydl
+
+
+def extract(profile, target, deadline=None, pool=None):
+    """Run ``profile`` against a URL or search target and return the trimmed info.
+
+    With a ``deadline``, request timeouts are capped to the time left and the
+    extraction stops at its next HTTP request once the deadline is cancelled.
+    With a ``pool`` (an enabled ``http_pool.YDLPool``), a long-lived
+    YoutubeDL is borrowed so its open connections are reused, and the
+    connections opened and requests sent are counted on the request.
+    """
+    if deadline is not None:
+        deadline.check()
+
+    with ExitStack() as stack:
+        ydl = _open(stack, profile, deadline, pool)
+        with phase('extract'):
+            info = ydl.extract_info(target, download=False, ie_key=profile.ie_key)
+
+    with phase('trim'):
+        return profile.trim(info)
+
+
+def extract_entries(profile, target, deadline=None, pool=None):
+    """Yield the trimmed entries of a search target as yt-dlp produces them.
+
+    ``extract`` waits for yt-dlp to process the whole result list; here the
+    extractor runs with ``process=False`` and its lazy entry generator is
+    consumed directly, so each entry is available as soon as its result page
+    has been parsed. The YoutubeDL stays in use until the generator is
+    exhausted or closed. ``deadline`` and ``pool`` work as in ``extract``.
+    """
+    if deadline is not None:
+        deadline.check()
+
+    with ExitStack() as stack:
+        ydl = _open(stack, profile, deadline, pool)
+        info = ydl.extract_info(target, download=False, ie_key=profile.ie_key, process=False)
+        for entry in (info or {}).get('entries') or []:
+            if entry:
+                yield profile.trim_entry(entry)
@@ -0,0 +1,183 @@
+"""Hedged stream extraction.
+
+Most ``/stream`` extractions finish close to the median, but a few take many
+times longer: one YouTube player client is slow for that video, or needs
+extra signature/JS work. Waiting longer does not help those requests;
+asking differently does. ``Hedger`` runs the primary attempt and, if it has
+not finished by a high percentile of recent primary latencies, starts a
+second attempt (another player client). The first good answer wins and the
+other attempt is cancelled through its own child ``Deadline``, so it stops
+at its next HTTP request.
+
+Hedges are capped to ``max_ratio`` of requests, so load grows by at most
+that share. ``stats()`` reports how often hedging fired and won, next to the
+primary and served latency percentiles, to show what it buys.
+"""
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from deadline import Deadline, DeadlineExceeded
+from timing import profiled
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of ``samples`` (p in 0-100), or None if empty."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LatencyTracker:
+    """The last ``window`` latencies (seconds) of one kind of operation."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = list(self._samples)
+        return percentile(samples, p)
+
+
+class Hedger:
+    """Runs a primary attempt and, when it is slow, a hedge; the first good answer wins.
+
+    ``percentile`` of the last primary latencies (at least ``min_delay``
+    seconds) is how long the primary gets before the hedge starts. No hedge
+    is sent until ``min_samples`` primary latencies are known, or when
+    hedges already make up ``max_ratio`` of requests. Attempts run on
+    ``executor``; without a caller deadline they get ``max_seconds``.
+    """
+
+    def __init__(self, executor, percentile=95, max_ratio=0.05, min_delay=0.5,
+                 min_samples=20, window=200, max_seconds=30.0):
+        self.executor = executor
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_seconds = max_seconds
+        self.primary_latency = LatencyTracker(window)
+        self.served_latency = LatencyTracker(window)
+        self._counts = {'requests': 0, 'hedged': 0, 'hedge_wins': 0, 'primary_wins': 0, 'over_budget': 0}
+        self._lock = threading.Lock()
+
+    def hedge_delay(self):
+        """Seconds to give the primary before hedging, or None while still learning."""
+        if len(self.primary_latency) < self.min_samples:
+            return None
+        return max(self.min_delay, self.primary_latency.percentile(self.percentile))
+
+    def run(self, primary, hedge, deadline=None):
+        """Return ``primary(deadline)`` or, if that is slow, ``hedge(deadline)``.
+
+        Each attempt gets its own child of ``deadline``. Errors from one
+        attempt are only raised once the other has failed too (the primary's
+        error is preferred). Raises DeadlineExceeded when ``deadline`` runs
+        out first.
+        """
+        start = time.monotonic()
+        with self._lock:
+            self._counts['requests'] += 1
+        delay = self.hedge_delay()
+
+        attempts = {}
+        primary_future = self._submit(primary, deadline, attempts, 'primary', start)
+        try:
+            if delay is not None:
+                done, _ = wait([primary_future], timeout=self._timeout(deadline, delay))
+                if not done and not self._expired(deadline) and self._take_hedge():
+                    self._submit(hedge, deadline, attempts, 'hedge', start)
+            result, winner = self._first_result(attempts, deadline)
+        finally:
+            # Whatever did not win is no longer needed
+            for future, attempt_deadline in attempts.values():
+                if not future.done():
+                    attempt_deadline.cancel()
+                    future.cancel()
+
+        self.served_latency.record(time.monotonic() - start)
+        if len(attempts) > 1:
+            with self._lock:
+                self._counts['hedge_wins' if winner == 'hedge' else 'primary_wins'] += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        delay = self.hedge_delay()
+        return {
+            **counts,
+            'hedge_rate': round(counts['hedged'] / counts['requests'], 3) if counts['requests'] else 0.0,
+            'hedge_delay_ms': round(delay * 1000, 1) if delay is not None else None,
+            'primary_ms': self._percentiles(self.primary_latency),
+            'served_ms': self._percentiles(self.served_latency),
+        }
+
+    @staticmethod
+    def _percentiles(tracker):
+        result = {}
+        for p in (50, 95, 99):
+            value = tracker.percentile(p)
+            result[f'p{p}'] = round(value * 1000, 1) if value is not None else None
+        return result
+
+    def _submit(self, fn, deadline, attempts, name, start):
+        attempt_deadline = deadline.child() if deadline is not None else Deadline(self.max_seconds)
+        ctx = contextvars.copy_context()
+        future = self.executor.submit(ctx.run, profiled, fn, attempt_deadline)
+        if name == 'primary':
+            future.add_done_callback(lambda f: self._record_primary(f, start))
+        attempts[name] = (future, attempt_deadline)
+        return future
+
+    def _record_primary(self, future, start):
+        if not future.cancelled() and future.exception() is None:
+            self.primary_latency.record(time.monotonic() - start)
+
+    def _take_hedge(self):
+        with self._lock:
+            if self._counts['hedged'] >= self.max_ratio * self._counts['requests']:
+                self._counts['over_budget'] += 1
+                return False
+            self._counts['hedged'] += 1
+            return True
+
+    def _first_result(self, attempts, deadline):
+        pending = {future: name for name, (future, _) in attempts.items()}
+        errors = {}
+        while pending:
+            done, _ = wait(list(pending), timeout=self._timeout(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded('Deadline exceeded')
+            for future in done:
+                name = pending.pop(future)
+                if future.exception() is None:
+                    return future.result(), name
+                errors[name] = future.exception()
+        raise errors.get('primary') or errors['hedge']
+
+    @staticmethod
+    def _expired(deadline):
+        return deadline is not None and deadline.expired
+
+    @staticmethod
+    def _timeout(deadline, limit=None):
+        if deadline is None:
+            return limit
+        remaining = deadline.remaining()
+        return remaining if limit is None else min(limit, remaining)
@@ -0,0 +1,268 @@
+"""Long-lived yt-dlp instances so extractions reuse HTTP connections.
+
+A ``with yt_dlp.YoutubeDL(...)`` block builds a fresh requests session and
+closes it on exit, so every extraction pays new TCP and TLS handshakes to
+www.youtube.com, music.youtube.com and the googlevideo hosts. ``YDLPool``
+keeps a few entered YoutubeDL instances per extraction profile instead; each
+one keeps its requests/urllib3 connection pool (keep-alive) and its cached
+player JS between extractions. YoutubeDL is not thread-safe, so instances
+are checked out exclusively and returned when the extraction finishes.
+
+``DNSCache`` optionally memoizes ``socket.getaddrinfo`` for a short TTL, and
+``enable_http2`` opts urllib3 into its (experimental) HTTP/2 support when
+the ``h2`` package is installed.
+"""
+import logging
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def connection_counts(ydl):
+    """Return (connections opened, requests sent) over ``ydl``'s lifetime.
+
+    Summed over the urllib3 pools behind yt-dlp's requests handler. Returns
+    (0, 0) before the first request or when the handler exposes no pools
+    (yt-dlp falls back to urllib, which does not keep connections alive,
+    when requests is missing or older than it supports).
+    """
+    connections = requests_sent = 0
+    if '_request_director' not in getattr(ydl, '__dict__', {}):
+        return connections, requests_sent
+    seen = set()
+    try:
+        for handler in ydl._request_director.handlers.values():
+            # RequestsRH keeps one requests.Session per cookiejar/SSL setting;
+            # the same adapter is mounted for http:// and https://
+            for _, session in getattr(handler, '_InstanceStoreMixin__instances', []):
+                for adapter in getattr(session, 'adapters', {}).values():
+                    if id(adapter) in seen:
+                        continue
+                    seen.add(id(adapter))
+                    pools = adapter.poolmanager.pools
+                    for key in pools.keys():
+                        pool = pools[key]
+                        connections += pool.num_connections
+                        requests_sent += pool.num_requests
+    except (AttributeError, KeyError, TypeError):
+        pass
+    return connections, requests_sent
+
+
+class PooledYDL:
+    """An entered YoutubeDL plus the context needed to close it later."""
+
+    __slots__ = ('ydl', 'context', 'generation', 'last_used')
+
+    def __init__(self, ydl, context, generation):
+        self.ydl = ydl
+        self.context = context
+        self.generation = generation
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.context.__exit__(None, None, None)
+        except Exception as e:
+            logger.warning(f"Error closing pooled YoutubeDL: {e}")
+
+
+class YDLPool:
+    """Per-profile pools of long-lived, exclusively checked-out YoutubeDL instances.
+
+    At most ``size`` instances are kept per profile; when all are busy an
+    extra, throwaway instance is used so a burst never waits on the pool.
+    Instances idle for more than ``idle_timeout`` seconds are closed; the
+    servers will have dropped their keep-alive connections by then.
+    """
+
+    def __init__(self, size=4, idle_timeout=90.0):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = {}    # profile name -> [PooledYDL], most recently used last
+        self._busy = {}    # profile name -> count checked out
+        self._stats = {}   # profile name -> counters
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    @contextmanager
+    def checkout(self, profile, expected=()):
+        """Yield an entered YoutubeDL for ``profile``, reused when possible.
+
+        The instance goes back to the pool unless the block raised something
+        other than ``expected`` (e.g. an unavailable video), which may have
+        left it in a bad state.
+        """
+        item, pooled = self._acquire(profile)
+        healthy = False
+        try:
+            yield item.ydl
+            healthy = True
+        except expected:
+            healthy = True
+            raise
+        finally:
+            self._release(profile, item, pooled, healthy)
+
+    def record(self, profile, connections, requests_sent):
+        """Add one extraction's connection counts to the profile's totals."""
+        with self._lock:
+            stats = self._profile_stats(profile.name)
+            stats['extractions'] += 1
+            stats['connections'] += connections
+            stats['requests'] += requests_sent
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                reused = max(0, stats['requests'] - stats['connections'])
+                result[name] = {
+                    **stats,
+                    'idle': len(self._idle.get(name, [])),
+                    'busy': self._busy.get(name, 0),
+                    'reuse_ratio': round(reused / stats['requests'], 3) if stats['requests'] else 0.0,
+                }
+            return result
+
+    def clear(self):
+        """Close all idle instances; busy ones are closed when returned."""
+        with self._lock:
+            self._generation += 1
+            idle = [item for items in self._idle.values() for item in items]
+            self._idle.clear()
+            self._busy.clear()
+            self._stats.clear()
+        for item in idle:
+            item.close()
+
+    def _profile_stats(self, name):
+        # Caller holds the lock
+        return self._stats.setdefault(name, {
+            'extractions': 0, 'connections': 0, 'requests': 0,
+            'created': 0, 'reused': 0, 'overflow': 0, 'expired': 0,
+        })
+
+    def _acquire(self, profile):
+        with self._lock:
+            stats = self._profile_stats(profile.name)
+            idle = self._idle.setdefault(profile.name, [])
+            now = time.monotonic()
+            expired = [c for c in idle if now - c.last_used > self.idle_timeout]
+            idle[:] = [c for c in idle if now - c.last_used <= self.idle_timeout]
+            item = idle.pop() if idle else None
+            stats['expired'] += len(expired)
+            busy = self._busy.get(profile.name, 0)
+            pooled = item is not None or busy + len(idle) < self.size
+            if item is not None:
+                stats['reused'] += 1
+            elif pooled:
+                stats['created'] += 1
+            else:
+                stats['overflow'] += 1
+            if pooled:
+                self._busy[profile.name] = busy + 1
+            generation = self._generation
+
+        for candidate in expired:
+            candidate.close()
+        if item is None:
+            try:
+                item = self._create(profile, generation)
+            except Exception:
+                if pooled:
+                    with self._lock:
+                        if generation == self._generation:
+                            self._busy[profile.name] = max(0, self._busy.get(profile.name, 0) - 1)
+                raise
+        return item, pooled
+
+    def _release(self, profile, item, pooled, healthy):
+        item.last_used = time.monotonic()
+        keep = False
+        with self._lock:
+            if pooled and item.generation == self._generation:
+                self._busy[profile.name] = max(0, self._busy.get(profile.name, 0) - 1)
+                keep = healthy
+                if keep:
+                    self._idle.setdefault(profile.name, []).append(item)
+        if not keep:
+            item.close()
+
+    @staticmethod
+    def _create(profile, generation):
+        import yt_dlp
+
+        context = yt_dlp.YoutubeDL(profile.ydl_opts)
+        return PooledYDL(context.__enter__(), context, generation)
+
+
+class DNSCache:
+    """Memoizes ``socket.getaddrinfo`` results for ``ttl`` seconds.
+
+    Installed process-wide; only successful lookups are cached.
+    """
+
+    def __init__(self, ttl=60.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._original = None
+
+    def install(self):
+        if self._original is None:
+            self._original = socket.getaddrinfo
+            socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        if self._original is not None:
+            socket.getaddrinfo = self._original
+            self._original = None
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+
+        resolve = self._original or socket.getaddrinfo
+        result = resolve(host, port, family, type, proto, flags)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if now - v[0] < self.ttl}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (now, list(result))
+        return result
+
+    def stats(self):
+        return {'ttl': self.ttl, 'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def enable_http2():
+    """Opt urllib3 (and so yt-dlp's requests handler) into HTTP/2.
+
+    Needs urllib3 >= 2.3 and the ``h2`` package; urllib3 still labels its
+    HTTP/2 support experimental. Returns whether it was enabled.
+    """
+    try:
+        import urllib3.http2
+        urllib3.http2.inject_into_urllib3()
+    except (ImportError, AttributeError) as e:
+        logger.warning(f"HTTP/2 not available, staying on HTTP/1.1: {e}")
+        return False
+    return True
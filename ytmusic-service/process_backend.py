@@ -0,0 +1,309 @@
+"""Extraction in a pool of worker processes.
+
+Part of every ``extract_info`` is CPU-bound Python: parsing the player
+responses, deciphering signatures and the n parameter, sorting formats. On
+extraction threads that work holds the GIL, so a cold extraction also slows
+the cache hits served by the same process. ``ProcessBackend`` runs
+extractions in warm worker processes instead; request threads only wait on
+the result.
+
+Workers get the extraction profiles once, when they start, and keep a small
+``YDLPool`` of their own, so connections and player JS are reused between
+tasks. A task sends a profile name and target and gets back only the trimmed
+info dict. When the caller has a deadline, the task also gets a cancel flag
+(an Event held by a manager process) that the worker's deadline checks, so
+work the caller gave up on stops at its next HTTP request.
+
+Workers are replaced after ``max_tasks_per_child`` tasks. When a worker
+reports more than ``max_rss_mb`` resident memory, or a task overruns its
+timeout, the pool is rebuilt; tasks already running on the old pool finish
+there. A crashed worker costs the tasks it was running one retry on the new
+pool, not an outage.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from deadline import Deadline, DeadlineExceeded
+from timing import phase
+
+logger = logging.getLogger(__name__)
+
+# Per worker process, set by _init_worker
+_profiles = None
+_pool = None
+
+
+def _init_worker(profiles):
+    """Import yt-dlp and build one pooled YoutubeDL per profile."""
+    global _profiles, _pool
+    from http_pool import YDLPool
+
+    _profiles = profiles
+    _pool = YDLPool(size=1)
+    for profile in profiles.values():
+        try:
+            with _pool.checkout(profile) as ydl:
+                ydl.get_info_extractor(profile.ie_key)
+        except Exception as e:
+            logger.warning(f"Worker warm-up failed for {profile.name}: {e}")
+
+
+def _rss_bytes():
+    """Current resident set size of this process."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        # Peak rather than current, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _run(fn, args, seconds, cancelled=None):
+    """Worker side of a task: ``fn(*args, deadline)`` plus the worker's RSS.
+
+    ``cancelled`` is the caller's cancel flag for this task, if any.
+    """
+    return fn(*args, Deadline(seconds, cancelled=cancelled)), _rss_bytes()
+
+
+def _extract(profile_name, target, deadline):
+    from yt_dlp.utils import DownloadError, ExtractorError
+    from extraction import extract
+
+    try:
+        return extract(_profiles[profile_name], target, deadline, _pool)
+    except (DownloadError, ExtractorError) as e:
+        # Their exc_info holds a traceback, which can't be pickled back to
+        # the caller; send the message alone so it still maps to a 404
+        raise DownloadError(str(e)) from None
+
+
+def _ping(deadline):
+    return os.getpid()
+
+
+class ProcessBackend:
+    """Runs extractions on ``workers`` warm worker processes.
+
+    ``task_timeout`` bounds every task (and is passed to the worker as its
+    deadline, so extractions stop at their next HTTP request). If a task is
+    still running ``grace`` seconds later the pool is rebuilt and its worker
+    killed. ``max_rss_mb`` (0 disables) recycles the pool once a worker
+    reports more memory than that. The ``fork`` start method does not
+    support ``max_tasks_per_child``; it is ignored there.
+    """
+
+    def __init__(self, profiles, workers=2, max_tasks_per_child=100, max_rss_mb=0,
+                 task_timeout=20.0, grace=2.0, start_method='forkserver'):
+        self.profiles = profiles
+        self.workers = workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.max_rss_mb = max_rss_mb
+        self.task_timeout = task_timeout
+        self.grace = grace
+        if start_method not in multiprocessing.get_all_start_methods():
+            start_method = 'spawn'
+        if start_method == 'fork' and max_tasks_per_child:
+            logger.warning("max_tasks_per_child is not supported with the fork start method, ignoring it")
+            self.max_tasks_per_child = 0
+        self.start_method = start_method
+        self._executor = None
+        self._running = {}  # future -> executor it runs on
+        self._manager = None
+        self._generation = 0
+        self._max_rss = 0
+        self._counts = {'tasks': 0, 'errors': 0, 'timeouts': 0, 'crashes': 0, 'retries': 0,
+                        'cancelled': 0, 'memory_recycles': 0, 'rebuilds': 0}
+        self._lock = threading.Lock()
+
+    def extract(self, profile, target, deadline=None):
+        """``extraction.extract`` for ``profile``, run in a worker process."""
+        with phase('process_extract'):
+            return self.call(_extract, profile.name, target, deadline=deadline)
+
+    def call(self, fn, *args, deadline=None):
+        """Run ``fn(*args, worker_deadline)`` in a worker and return its result.
+
+        ``fn`` and its arguments must be picklable (module-level functions).
+        Raises DeadlineExceeded when ``deadline`` or the task timeout runs
+        out, and BrokenProcessPool if the task crashed its worker twice.
+        When ``deadline`` expires or is cancelled, the worker's deadline is
+        cancelled too.
+        """
+        cancelled = None
+        if deadline is not None:
+            deadline.check()
+            cancelled = self._cancel_flag()
+        seconds = self.task_timeout if deadline is None else min(self.task_timeout, deadline.remaining())
+        with self._lock:
+            self._counts['tasks'] += 1
+
+        for attempt in range(2):
+            executor, generation = self._current()
+            try:
+                future = executor.submit(_run, fn, args, seconds, cancelled)
+            except (BrokenProcessPool, RuntimeError):
+                # Another thread rebuilt (or is rebuilding) the pool
+                self._rebuild(generation)
+                continue
+            self._running[future] = executor
+            future.add_done_callback(self._done)
+            try:
+                result, rss = self._wait(future, seconds + self.grace, deadline)
+            except FutureTimeout:
+                with self._lock:
+                    self._counts['timeouts'] += 1
+                logger.warning(f"Worker task {fn.__name__} overran {seconds:.1f}s, rebuilding pool")
+                self._rebuild(generation, stuck=future)
+                raise DeadlineExceeded('Extraction timed out')
+            except BrokenProcessPool:
+                with self._lock:
+                    self._counts['crashes'] += 1
+                self._rebuild(generation)
+                if attempt == 0:
+                    with self._lock:
+                        self._counts['retries'] += 1
+                    continue
+                raise
+            except DeadlineExceeded:
+                if cancelled is not None:
+                    # The caller gave up; stop the worker at its next check
+                    cancelled.set()
+                    with self._lock:
+                        self._counts['cancelled'] += 1
+                raise
+            except Exception:
+                with self._lock:
+                    self._counts['errors'] += 1
+                raise
+            self._check_memory(rss, generation)
+            return result
+        raise BrokenProcessPool('Extraction worker pool unavailable')
+
+    def warm(self):
+        """Start the workers (and their yt-dlp warm-up) and the cancel flag
+        manager ahead of traffic."""
+        self._cancel_flag()
+        executor, _ = self._current()
+        futures = [executor.submit(_run, _ping, (), self.task_timeout) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                'workers': self.workers,
+                'start_method': self.start_method,
+                'generation': self._generation,
+                'max_rss_mb': round(self._max_rss / 1024 / 1024, 1),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            manager, self._manager = self._manager, None
+            self._generation += 1
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
+
+    @staticmethod
+    def _wait(future, timeout, deadline):
+        """``future.result`` that also gives up when ``deadline`` is cancelled."""
+        end = time.monotonic() + timeout
+        while True:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded('Deadline exceeded')
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise FutureTimeout()
+            try:
+                return future.result(timeout=min(remaining, 0.1))
+            except FutureTimeout:
+                continue
+
+    def _check_memory(self, rss, generation):
+        recycle = False
+        with self._lock:
+            self._max_rss = max(self._max_rss, rss)
+            if self.max_rss_mb and rss > self.max_rss_mb * 1024 * 1024 and generation == self._generation:
+                self._counts['memory_recycles'] += 1
+                recycle = True
+        if recycle:
+            logger.info(f"Worker at {rss / 1024 / 1024:.0f} MB, recycling extraction workers")
+            self._rebuild(generation)
+
+    def _cancel_flag(self):
+        """A new Event the caller can set and a worker can read."""
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context(self.start_method).Manager()
+            manager = self._manager
+        return manager.Event()
+
+    def _current(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create()
+            return self._executor, self._generation
+
+    def _create(self):
+        context = multiprocessing.get_context(self.start_method)
+        if self.start_method == 'forkserver':
+            # Imported once in the fork server, so new workers start warm
+            context.set_forkserver_preload(['yt_dlp', 'extraction', 'http_pool'])
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.profiles,),
+            max_tasks_per_child=self.max_tasks_per_child or None,
+        )
+
+    def _done(self, future):
+        self._running.pop(future, None)
+
+    def _rebuild(self, generation, stuck=None):
+        """Replace the pool, unless another thread already replaced ``generation``.
+
+        New tasks go to the new pool; tasks already running on the old one
+        finish there. ``stuck`` is a task that overran its timeout: its
+        worker is killed once the old pool's other tasks are done.
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            old, self._executor = self._executor, None
+            self._generation += 1
+            self._counts['rebuilds'] += 1
+        if old is None:
+            return
+        # shutdown() forgets the worker processes
+        processes = list((getattr(old, '_processes', None) or {}).values())
+        old.shutdown(wait=False)
+        if stuck is not None:
+            threading.Thread(target=self._reap, args=(old, processes, stuck),
+                             name='extract-reaper', daemon=True).start()
+
+    def _reap(self, executor, processes, stuck):
+        """Kill the worker running ``stuck`` on the retired ``executor``.
+
+        Any worker dying breaks a ProcessPoolExecutor and fails every task
+        still on it, so the kill waits until the others are done (at most a
+        task timeout); by then the stuck worker is the only busy one.
+        """
+        others = [future for future, owner in self._running.copy().items()
+                  if owner is executor and future is not stuck]
+        wait(others, timeout=self.task_timeout + self.grace)
+        if stuck.done():
+            return
+        for process in processes:
+            process.kill()
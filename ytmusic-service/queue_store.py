@@ -0,0 +1,137 @@
+"""Server-side play queues for Alexa sessions.
+
+The Lambda used to carry the whole playlist (and search results) back and
+forth in Alexa session attributes on every request, and AudioPlayer events,
+which have no session at all, could not see it. The queue now lives here,
+keyed by an id the Lambda chooses (the device id). The Lambda sends only
+that id, and because the service knows what comes next it can resolve the
+upcoming stream URL before it is asked for.
+
+Memory is bounded: queues expire after ``ttl`` seconds without use, at most
+``max_queues`` are kept (least recently used dropped first) and each keeps
+at most ``max_tracks`` tracks with only the fields playback needs.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+TRACK_FIELDS = ('video_id', 'title', 'artist')
+
+
+class PlayQueue:
+    __slots__ = ('tracks', 'index', 'touched')
+
+    def __init__(self, tracks, index):
+        self.tracks = tracks
+        self.index = index
+        self.touched = time.time()
+
+
+class QueueStore:
+    """Thread-safe, bounded, TTL'd map of queue id -> PlayQueue."""
+
+    def __init__(self, ttl=3600 * 4, max_queues=1000, max_tracks=200):
+        self.ttl = ttl
+        self.max_queues = max_queues
+        self.max_tracks = max_tracks
+        self._queues = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._queues)
+
+    def create(self, queue_id, tracks, start_index=0):
+        """Create (or replace) a queue. Tracks without a video_id are dropped."""
+        compact = [{k: t.get(k, '') for k in TRACK_FIELDS}
+                   for t in tracks if isinstance(t, dict) and t.get('video_id')][:self.max_tracks]
+        if not compact:
+            raise ValueError('tracks must contain at least one item with a video_id')
+        start_index = min(max(0, start_index), len(compact) - 1)
+
+        with self._lock:
+            self._queues.pop(queue_id, None)
+            self._queues[queue_id] = PlayQueue(compact, start_index)
+            self._evict()
+        return self.current(queue_id)
+
+    def delete(self, queue_id):
+        with self._lock:
+            return self._queues.pop(queue_id, None) is not None
+
+    def current(self, queue_id):
+        """Return the current track (with its index), or None if no queue."""
+        with self._lock:
+            queue = self._get(queue_id)
+            if queue is None:
+                return None
+            return self._track(queue, queue.index)
+
+    def target(self, queue_id, step=1, wrap=True):
+        """Return the track ``step`` positions from the current one, without moving.
+
+        Returns None if there is no such queue, or the move would leave the
+        queue and ``wrap`` is false.
+        """
+        with self._lock:
+            queue = self._get(queue_id)
+            if queue is None:
+                return None
+            index = queue.index + step
+            if wrap:
+                index %= len(queue.tracks)
+            elif not 0 <= index < len(queue.tracks):
+                return None
+            return self._track(queue, index)
+
+    def move_to(self, queue_id, index):
+        """Make ``index`` the current position. Returns False if the queue is gone."""
+        with self._lock:
+            queue = self._get(queue_id)
+            if queue is None or not 0 <= index < len(queue.tracks):
+                return False
+            queue.index = index
+            return True
+
+    def peek(self, queue_id, count=1):
+        """Return up to ``count`` upcoming tracks (no wrap-around), or None if no queue."""
+        with self._lock:
+            queue = self._get(queue_id)
+            if queue is None:
+                return None
+            end = min(len(queue.tracks), queue.index + 1 + count)
+            return [self._track(queue, i) for i in range(queue.index + 1, end)]
+
+    def info(self, queue_id):
+        with self._lock:
+            queue = self._get(queue_id)
+            if queue is None:
+                return None
+            return {'index': queue.index, 'length': len(queue.tracks)}
+
+    def cleanup(self):
+        """Drop expired queues."""
+        with self._lock:
+            now = time.time()
+            for queue_id in [q for q, v in self._queues.items() if now - v.touched > self.ttl]:
+                del self._queues[queue_id]
+
+    def _get(self, queue_id):
+        # Caller holds the lock
+        queue = self._queues.get(queue_id)
+        if queue is None:
+            return None
+        now = time.time()
+        if now - queue.touched > self.ttl:
+            del self._queues[queue_id]
+            return None
+        queue.touched = now
+        self._queues.move_to_end(queue_id)
+        return queue
+
+    def _evict(self):
+        while len(self._queues) > self.max_queues:
+            self._queues.popitem(last=False)
+
+    @staticmethod
+    def _track(queue, index):
+        return dict(queue.tracks[index], index=index)
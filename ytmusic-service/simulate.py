@@ -0,0 +1,176 @@
+"""Replay cache traces against alternative cache settings.
+
+Feeds a trace captured with ``CACHE_TRACE_FILE`` (see ``cache_trace.py``)
+through simulated caches and reports, per configuration, the projected hit
+rate, number of yt-dlp extractions and cache memory. Every combination of
+the given values is simulated::
+
+    python simulate.py trace.ndjson
+    python simulate.py trace.ndjson --policy ttl,lru --stream-ttl 14400,19800 --max-entries 50,200
+
+Policies:
+    ttl  what app.py does today: entries live until their TTL, and once the
+         cache grows past ``max-entries`` everything older than the stale
+         window is dropped (the 50/100 cleanup thresholds)
+    lru  at most ``max-entries`` entries, least recently used evicted first
+    lfu  at most ``max-entries`` entries, least frequently used evicted first
+"""
+import argparse
+import itertools
+import sys
+from collections import OrderedDict, defaultdict
+
+from cache_trace import read_trace
+
+DEFAULT_ENTRY_SIZE = 500  # bytes, when a key's size never appeared in the trace
+
+# Current app.py settings: (ttl, cleanup threshold, stale window)
+CURRENT = {
+    '/stream': (3600 * 4, 50, 3600 * 5.5),
+    '/search': (600, 100, 3600),
+}
+
+
+class SimCache:
+    """A simulated cache: tracks which keys are live and their total size."""
+
+    def __init__(self, policy, ttl, max_entries, retain=None):
+        self.policy = policy
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.retain = max(retain or ttl, ttl)
+        self.entries = OrderedDict()  # key -> [timestamp, size, uses]
+        self.memory = 0
+
+    def lookup(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None or now - entry[0] >= self.ttl:
+            return False
+        entry[2] += 1
+        if self.policy == 'lru':
+            self.entries.move_to_end(key)
+        return True
+
+    def insert(self, key, size, now):
+        self._remove(key)
+        self.entries[key] = [now, size, 1]
+        self.memory += size
+
+        if self.policy == 'ttl':
+            if len(self.entries) > self.max_entries:
+                for k in [k for k, e in self.entries.items() if now - e[0] > self.retain]:
+                    self._remove(k)
+            return
+
+        while len(self.entries) > self.max_entries:
+            if self.policy == 'lru':
+                victim = next(iter(self.entries))
+            else:
+                victim = min(self.entries, key=lambda k: self.entries[k][2])
+            self._remove(victim)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.memory -= entry[1]
+
+
+def entry_sizes(records):
+    """Best-known size per key, falling back to the per-endpoint average."""
+    sizes = {}
+    per_endpoint = defaultdict(list)
+    for r in records:
+        if r.get('size'):
+            sizes[(r['endpoint'], r['key'])] = r['size']
+            per_endpoint[r['endpoint']].append(r['size'])
+    averages = {ep: sum(v) / len(v) for ep, v in per_endpoint.items()}
+    return sizes, averages
+
+
+def simulate(records, caches):
+    """Replay ``records`` (sorted by ts) against ``caches`` ({endpoint: SimCache}).
+
+    Endpoints without a cache always extract. Returns per-endpoint stats.
+    """
+    sizes, averages = entry_sizes(records)
+    stats = defaultdict(lambda: {'requests': 0, 'hits': 0, 'extractions': 0, 'observed_hits': 0})
+    peak_memory = 0
+    memory_samples = 0
+
+    for r in records:
+        endpoint, key, now = r['endpoint'], r['key'], r['ts']
+        s = stats[endpoint]
+        s['requests'] += 1
+        s['observed_hits'] += 1 if r.get('hit') else 0
+
+        cache = caches.get(endpoint)
+        if cache is not None and cache.lookup(key, now):
+            s['hits'] += 1
+        else:
+            s['extractions'] += 1
+            if cache is not None:
+                size = sizes.get((endpoint, key), averages.get(endpoint, DEFAULT_ENTRY_SIZE))
+                cache.insert(key, size, now)
+
+        memory = sum(c.memory for c in caches.values())
+        peak_memory = max(peak_memory, memory)
+        memory_samples += memory
+
+    total = {
+        'requests': sum(s['requests'] for s in stats.values()),
+        'hits': sum(s['hits'] for s in stats.values()),
+        'extractions': sum(s['extractions'] for s in stats.values()),
+        'peak_memory': peak_memory,
+        'mean_memory': memory_samples / len(records) if records else 0,
+    }
+    return {'endpoints': dict(stats), 'total': total}
+
+
+def build_caches(policy, stream_ttl, search_ttl, max_entries, get_song_ttl):
+    caches = {}
+    for endpoint, ttl in (('/stream', stream_ttl), ('/search', search_ttl), ('/get_song', get_song_ttl)):
+        if not ttl:
+            continue
+        _, threshold, retain = CURRENT.get(endpoint, (ttl, 100, ttl))
+        caches[endpoint] = SimCache(policy, ttl, max_entries or threshold, retain)
+    return caches
+
+
+def parse_list(value, cast=float):
+    return [cast(v) for v in value.split(',') if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace')
+    parser.add_argument('--policy', default='ttl', help='comma-separated: ttl,lru,lfu')
+    parser.add_argument('--stream-ttl', default=str(CURRENT['/stream'][0]), help='seconds, comma-separated')
+    parser.add_argument('--search-ttl', default=str(CURRENT['/search'][0]), help='seconds, comma-separated')
+    parser.add_argument('--get-song-ttl', default='0', help='seconds; 0 keeps /get_song uncached')
+    parser.add_argument('--max-entries', default='0',
+                        help='entries per cache (cleanup threshold for ttl); 0 uses the current 50/100')
+    args = parser.parse_args(argv)
+
+    records = sorted(read_trace(args.trace), key=lambda r: r['ts'])
+    if not records:
+        print('Trace is empty.')
+        return 1
+
+    observed = sum(1 for r in records if r.get('hit'))
+    print(f'{len(records)} requests, observed hit rate {100 * observed / len(records):.1f}%\n')
+    print(f"{'policy':6s} {'stream_ttl':>10s} {'search_ttl':>10s} {'song_ttl':>8s} {'max':>5s} "
+          f"{'hit%':>6s} {'extract':>8s} {'peak_KiB':>9s} {'mean_KiB':>9s}")
+
+    grid = itertools.product(args.policy.split(','), parse_list(args.stream_ttl), parse_list(args.search_ttl),
+                             parse_list(args.get_song_ttl), parse_list(args.max_entries, int))
+    for policy, stream_ttl, search_ttl, get_song_ttl, max_entries in grid:
+        caches = build_caches(policy, stream_ttl, search_ttl, max_entries, get_song_ttl)
+        total = simulate(records, caches)['total']
+        print(f"{policy:6s} {stream_ttl:10.0f} {search_ttl:10.0f} {get_song_ttl:8.0f} {max_entries or '-':>5} "
+              f"{100 * total['hits'] / total['requests']:6.1f} {total['extractions']:8d} "
+              f"{total['peak_memory'] / 1024:9.1f} {total['mean_memory'] / 1024:9.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
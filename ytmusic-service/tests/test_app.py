@@ -1,5 +1,6 @@
 """Tests for the YouTube Music API service (yt-dlp based)."""
 import json
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 import sys
@@ -8,7 +9,7 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from app import app, stream_cache, search_cache
+from app import app, stream_cache, search_cache, ydl_pool
 
 
 @pytest.fixture
@@ -22,12 +23,14 @@ def client():
 
 @pytest.fixture(autouse=True)
 def clear_cache():
-    """Clear caches between tests."""
+    """Clear caches (and pooled YoutubeDL instances built from mocks) between tests."""
     stream_cache.clear()
     search_cache.clear()
+    ydl_pool.clear()
     yield
     stream_cache.clear()
     search_cache.clear()
+    ydl_pool.clear()
 
 
 class TestHealthCheck:
@@ -39,6 +42,30 @@ class TestHealthCheck:
         assert 'cache_size' in data
 
 
+class TestReadiness:
+    def test_ready_when_warmup_not_started(self, client):
+        response = client.get('/ready')
+        assert response.status_code == 200
+
+    def test_not_ready_during_warmup(self, client):
+        from warmup import Warmup
+        import app as app_module
+        warmup = Warmup()
+        warmup.status = 'running'
+        with patch.object(app_module, 'warmup', warmup):
+            response = client.get('/ready')
+            assert response.status_code == 503
+            assert client.get('/health').status_code == 200
+
+    def test_canary_uses_stand_in_resolver(self):
+        import app as app_module
+        calls = []
+        with patch.object(app_module, 'WARMUP_CANARY_VIDEO_ID', 'canary1'):
+            result = app_module.warm_canary(resolver=lambda vid: calls.append(vid) or {'video_id': vid})
+        assert calls == ['canary1']
+        assert result == {'video_id': 'canary1'}
+
+
 class TestSearch:
     def test_search_requires_query(self, client):
         response = client.post('/search',
@@ -113,6 +140,199 @@ class TestSearch:
         assert data['results'][0]['artist'] == 'Queen'
 
 
+class TestSearchBatch:
+    @staticmethod
+    def search_side_effect(target, download=False, ie_key=None):
+        query = target.split(':', 1)[1]
+        if query == 'broken':
+            raise Exception('extraction failed')
+        return {'entries': [{'id': f'id-{query}', 'title': query, 'uploader': 'Artist'}]}
+
+    def test_batch_requires_list(self, client):
+        response = client.post('/search/batch',
+                               data=json.dumps({'queries': 'oasis'}),
+                               content_type='application/json')
+        assert response.status_code == 400
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_batch_dedupes_and_keeps_order(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_ydl.extract_info.side_effect = self.search_side_effect
+
+        response = client.post('/search/batch',
+                               data=json.dumps({'queries': [
+                                   {'query': 'wonderwall', 'limit': 5},
+                                   {'query': 'queen'},
+                                   {'query': '  Wonderwall ', 'limit': 5},
+                               ]}),
+                               content_type='application/json')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert [r['query'] for r in data['results']] == ['wonderwall', 'queen', '  Wonderwall ']
+        assert data['results'][0]['results'][0]['video_id'] == 'id-wonderwall'
+        assert data['results'][2]['results'] == data['results'][0]['results']
+        assert data['unique'] == 2
+        assert mock_ydl.extract_info.call_count == 2
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_batch_serves_cache_hits(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_ydl.extract_info.side_effect = self.search_side_effect
+
+        client.post('/search',
+                    data=json.dumps({'query': 'queen', 'limit': 10}),
+                    content_type='application/json')
+        response = client.post('/search/batch',
+                               data=json.dumps({'queries': [{'query': 'Queen'}]}),
+                               content_type='application/json')
+        data = json.loads(response.data)
+        assert data['extracted'] == 0
+        assert data['results'][0]['count'] == 1
+        assert mock_ydl.extract_info.call_count == 1
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_batch_reports_per_item_errors(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_ydl.extract_info.side_effect = self.search_side_effect
+
+        response = client.post('/search/batch',
+                               data=json.dumps({'queries': [
+                                   {'query': 'broken'}, {'query': ''}, {'query': 'oasis'},
+                               ]}),
+                               content_type='application/json')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['results'][0]['error'] == 'extraction failed'
+        assert 'error' in data['results'][1]
+        assert data['results'][2]['count'] == 1
+
+    def test_batch_timeout_without_request_deadline(self, client):
+        # The process backend raises DeadlineExceeded on a task overrun even
+        # when the request sent no deadline
+        import app as app_module
+
+        def run_extract(profile, target, deadline=None):
+            if target.endswith(':slow'):
+                raise app_module.DeadlineExceeded('Extraction timed out')
+            return {'entries': [{'id': 'id-fast', 'title': 'fast', 'uploader': 'Artist'}]}
+
+        with patch.object(app_module, 'run_extract', run_extract):
+            response = client.post('/search/batch',
+                                   data=json.dumps({'queries': [{'query': 'slow'}, {'query': 'fast'}]}),
+                                   content_type='application/json')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['partial'] is True
+        assert data['results'][0]['error'] == 'Deadline exceeded'
+        assert data['results'][1]['count'] == 1
+
+
+class TestSearchStream:
+    @staticmethod
+    def events(response):
+        return [json.loads(line) for line in response.data.decode().splitlines()]
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_streams_results_as_they_are_yielded(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        pulled = []
+
+        def entries():
+            for i in range(3):
+                pulled.append(i)
+                yield {'id': f'vid{i}', 'title': f'Song {i}', 'uploader': 'Artist - Topic'}
+
+        mock_ydl.extract_info.return_value = {'entries': entries()}
+
+        response = client.post('/search/stream',
+                               data=json.dumps({'query': 'oasis', 'limit': 3}),
+                               content_type='application/json',
+                               buffered=False)
+        assert response.mimetype == 'application/x-ndjson'
+        body = iter(response.response)
+        first = json.loads(next(body))
+        # The first result is sent before yt-dlp was asked for the second
+        assert first == {'type': 'result', 'index': 0, 'result': {
+            'video_id': 'vid0', 'title': 'Song 0', 'artist': 'Artist', 'duration': 'Unknown',
+            'duration_seconds': 0, 'thumbnail': ''}}
+        assert pulled == [0]
+        rest = [json.loads(line) for line in body]
+        response.close()
+
+        assert [e['type'] for e in rest] == ['result', 'result', 'done']
+        assert rest[-1]['count'] == 3
+        assert mock_ydl.extract_info.call_args[1]['process'] is False
+        # The complete set is cached for /search
+        assert search_cache['oasis:3']['data']['count'] == 3
+
+    def test_cache_hit_streams_cached_results(self, client):
+        search_cache['oasis:10'] = {
+            'data': {'query': 'oasis', 'results': [{'video_id': 'a'}, {'video_id': 'b'}], 'count': 2},
+            'timestamp': time.time(),
+        }
+        response = client.post('/search/stream',
+                               data=json.dumps({'query': 'Oasis'}),
+                               content_type='application/json')
+        events = self.events(response)
+        assert [e['type'] for e in events] == ['result', 'result', 'done']
+        assert events[-1]['cached'] is True
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_prefetches_top_hit(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+
+        def extract_info(target, **kwargs):
+            if target.startswith('ytsearch'):
+                return {'entries': iter([{'id': 'top', 'title': 'Top'}, {'id': 'second', 'title': 'Second'}])}
+            return {'url': 'https://audio/top'}
+
+        mock_ydl.extract_info.side_effect = extract_info
+        client.post('/search/stream',
+                    data=json.dumps({'query': 'oasis', 'prefetch': True}),
+                    content_type='application/json')
+        for _ in range(50):
+            if 'top' in stream_cache:
+                break
+            time.sleep(0.02)
+        assert stream_cache['top']['data']['stream_url'] == 'https://audio/top'
+        assert 'second' not in stream_cache
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_failure_part_way_is_not_cached(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+
+        def entries():
+            yield {'id': 'a', 'title': 'A'}
+            raise Exception('page 2 failed')
+
+        mock_ydl.extract_info.return_value = {'entries': entries()}
+        response = client.post('/search/stream',
+                               data=json.dumps({'query': 'oasis'}),
+                               content_type='application/json')
+        events = self.events(response)
+        assert [e['type'] for e in events] == ['result', 'error']
+        assert events[-1]['partial'] is True
+        assert not search_cache
+
+    def test_requires_query(self, client):
+        response = client.post('/search/stream',
+                               data=json.dumps({}),
+                               content_type='application/json')
+        assert response.status_code == 400
+
+
 class TestStreamExtraction:
     @patch('app.yt_dlp.YoutubeDL')
     def test_stream_requires_video_id(self, mock_ydl, client):
@@ -190,6 +410,256 @@ class TestStreamExtraction:
         assert data['stream_url'] == 'https://audio-only.url'
 
 
+class TestDeadlines:
+    @staticmethod
+    def slow_extract(target, download=False, ie_key=None):
+        time.sleep(0.5)
+        if target.startswith('ytsearch'):
+            return {'entries': [{'id': 'slow', 'title': 'Slow'}]}
+        return {'url': 'https://fresh.url', 'title': 'Fresh'}
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_stream_returns_504_with_retry_hint(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_ydl.extract_info.side_effect = self.slow_extract
+
+        start = time.monotonic()
+        response = client.post('/stream',
+                               data=json.dumps({'video_id': 'slow123'}),
+                               content_type='application/json',
+                               headers={'X-Request-Deadline-Ms': '400'})
+        assert time.monotonic() - start < 0.45
+        assert response.status_code == 504
+        assert response.headers['Retry-After'] == '1'
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_stream_serves_stale_entry(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_ydl.extract_info.side_effect = self.slow_extract
+        stream_cache['old123'] = {
+            'data': {'video_id': 'old123', 'stream_url': 'https://stale.url'},
+            'timestamp': time.time() - 3600 * 5,
+        }
+
+        response = client.post('/stream',
+                               data=json.dumps({'video_id': 'old123'}),
+                               content_type='application/json',
+                               headers={'X-Request-Deadline-Ms': '400'})
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['stream_url'] == 'https://stale.url'
+        assert data['stale'] is True
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_batch_returns_partial_results(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_ydl.extract_info.side_effect = self.slow_extract
+        search_cache['fast:10'] = {
+            'data': {'query': 'fast', 'results': [], 'count': 0},
+            'timestamp': time.time(),
+        }
+
+        response = client.post('/search/batch',
+                               data=json.dumps({'queries': [{'query': 'fast'}, {'query': 'slow'}]}),
+                               content_type='application/json',
+                               headers={'X-Request-Deadline-Ms': '500'})
+        data = json.loads(response.data)
+        assert data['partial'] is True
+        assert data['results'][0]['count'] == 0
+        assert data['results'][1]['error'] == 'Deadline exceeded'
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_no_header_waits_for_extraction(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_ydl.extract_info.side_effect = self.slow_extract
+
+        response = client.post('/stream',
+                               data=json.dumps({'video_id': 'slow456'}),
+                               content_type='application/json')
+        assert response.status_code == 200
+
+
+class TestStreamHedging:
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_slow_primary_client_is_hedged(self, mock_ydl_class, client):
+        from concurrent.futures import ThreadPoolExecutor
+        from extraction import build_profiles
+        from hedging import Hedger
+        import app as app_module
+
+        def make_ydl(opts):
+            clients = opts['extractor_args']['youtube'].get('player_client')
+            ydl = MagicMock()
+            if clients == ['tv']:
+                ydl.extract_info.return_value = {'url': 'https://audio/hedge'}
+            else:
+                def slow_extract(*args, **kwargs):
+                    time.sleep(0.3)
+                    return {'url': 'https://audio/primary'}
+                ydl.extract_info.side_effect = slow_extract
+            context = MagicMock()
+            context.__enter__ = MagicMock(return_value=ydl)
+            context.__exit__ = MagicMock(return_value=False)
+            return context
+
+        mock_ydl_class.side_effect = make_ydl
+        hedger = Hedger(ThreadPoolExecutor(max_workers=2), max_ratio=1.0, min_delay=0.05, min_samples=1)
+        hedger.primary_latency.record(0.01)
+        hedge_profile = build_profiles(hedge_player_clients=['tv'])['stream_hedge']
+        with patch.object(app_module, 'stream_hedger', hedger), \
+                patch.dict(app_module.PROFILES, {'stream_hedge': hedge_profile}):
+            response = client.post('/stream',
+                                   data=json.dumps({'video_id': 'slow'}),
+                                   content_type='application/json')
+            data = json.loads(response.data)
+            assert data['stream_url'] == 'https://audio/hedge'
+            assert json.loads(client.get('/health').data)['stream_hedging']['hedge_wins'] == 1
+
+
+class TestCacheTrace:
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_stream_lookups_are_traced(self, mock_ydl_class, client, tmp_path):
+        from cache_trace import CacheTracer, read_trace
+        import app as app_module
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_ydl.extract_info.return_value = {'url': 'https://audio.url', 'title': 'Song'}
+
+        tracer = CacheTracer(str(tmp_path / 'trace.ndjson'), hash_keys=False)
+        with patch.object(app_module, 'cache_tracer', tracer):
+            for _ in range(2):
+                client.post('/stream',
+                            data=json.dumps({'video_id': 'traced1'}),
+                            content_type='application/json')
+        tracer.flush()
+
+        records = list(read_trace(tracer.path))
+        assert [(r['endpoint'], r['key'], r['hit']) for r in records] == [
+            ('/stream', 'traced1', False), ('/stream', 'traced1', True)]
+
+
+class TestQueue:
+    TRACKS = [
+        {'video_id': 'qa', 'title': 'Song A', 'artist': 'Artist 1'},
+        {'video_id': 'qb', 'title': 'Song B', 'artist': 'Artist 2'},
+        {'video_id': 'qc', 'title': 'Song C', 'artist': 'Artist 3'},
+    ]
+
+    @pytest.fixture(autouse=True)
+    def mock_streams(self):
+        import app as app_module
+        with patch('app.yt_dlp.YoutubeDL') as mock_ydl_class, \
+                patch.object(app_module, 'QUEUE_PREFETCH_DEPTH', 0):
+            mock_ydl = MagicMock()
+            mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+            mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+            mock_ydl.extract_info.side_effect = lambda url, **kw: {
+                'url': f"https://audio/{url.split('=')[-1]}", 'title': 'x'}
+            self.mock_ydl = mock_ydl
+            yield
+        app_module.queue_store._queues.clear()
+
+    def create(self, client, **extra):
+        return client.post('/queue',
+                           data=json.dumps({'queue_id': 'device-1', 'tracks': self.TRACKS, **extra}),
+                           content_type='application/json')
+
+    def advance(self, client, **body):
+        return client.post('/queue/device-1/advance',
+                           data=json.dumps(body),
+                           content_type='application/json')
+
+    def test_create_resolves_first_track(self, client):
+        response = self.create(client)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['current']['video_id'] == 'qa'
+        assert data['current']['stream_url'] == 'https://audio/qa'
+        assert data['length'] == 3
+
+    def test_create_requires_tracks(self, client):
+        response = client.post('/queue',
+                               data=json.dumps({'tracks': []}),
+                               content_type='application/json')
+        assert response.status_code == 400
+
+    def test_advance_and_previous(self, client):
+        self.create(client)
+        data = json.loads(self.advance(client).data)
+        assert data['current']['video_id'] == 'qb'
+        assert data['current']['stream_url'] == 'https://audio/qb'
+        assert data['index'] == 1
+
+        data = json.loads(self.advance(client, step=-1).data)
+        assert data['current']['video_id'] == 'qa'
+        data = json.loads(self.advance(client, step=-1).data)
+        assert data['current']['video_id'] == 'qc'
+
+    def test_advance_without_wrap_reports_done(self, client):
+        self.create(client, start_index=2)
+        data = json.loads(self.advance(client, wrap=False).data)
+        assert data['done'] is True
+        assert data['current'] is None
+
+    def test_create_rejects_bad_start_index(self, client):
+        for start_index in (None, [1], 'first'):
+            response = self.create(client, start_index=start_index)
+            assert response.status_code == 400
+            assert json.loads(response.data) == {'error': 'start_index must be an integer'}
+        assert client.get('/queue/device-1').status_code == 404
+
+    def test_advance_rejects_bad_step(self, client):
+        self.create(client)
+        assert self.advance(client, step='next').status_code == 400
+        data = json.loads(client.get('/queue/device-1').data)
+        assert data['current']['video_id'] == 'qa'
+
+    def test_failed_stream_does_not_move(self, client):
+        import yt_dlp
+        self.create(client)
+        self.mock_ydl.extract_info.side_effect = yt_dlp.utils.DownloadError('gone')
+        response = self.advance(client)
+        assert response.status_code == 404
+        peek = json.loads(client.get('/queue/device-1').data)
+        assert peek['current']['video_id'] == 'qa'
+
+    def test_unknown_queue(self, client):
+        assert self.advance(client).status_code == 404
+        assert client.get('/queue/device-1').status_code == 404
+
+    def test_peek_includes_cached_stream_urls(self, client):
+        self.create(client)
+        stream_cache['qb'] = {'data': {'stream_url': 'https://cached/qb'}, 'timestamp': time.time()}
+        data = json.loads(client.get('/queue/device-1?count=5').data)
+        assert [t['video_id'] for t in data['upcoming']] == ['qb', 'qc']
+        assert data['upcoming'][0]['stream_url'] == 'https://cached/qb'
+        assert 'stream_url' not in data['upcoming'][1]
+
+    def test_advance_prefetches_next_track(self, client):
+        import app as app_module
+        with patch.object(app_module, 'QUEUE_PREFETCH_DEPTH', 1):
+            self.create(client)
+            for _ in range(50):
+                if 'qb' in stream_cache:
+                    break
+                time.sleep(0.02)
+        assert stream_cache['qb']['data']['stream_url'] == 'https://audio/qb'
+
+    def test_delete(self, client):
+        self.create(client)
+        assert client.delete('/queue/device-1').status_code == 200
+        assert client.get('/queue/device-1').status_code == 404
+
+
 class TestGetSongDetails:
     @patch('app.yt_dlp.YoutubeDL')
     def test_get_song_details(self, mock_ydl_class, client):
@@ -219,6 +689,233 @@ class TestGetSongDetails:
         assert response.status_code == 400
 
 
+class TestServerTiming:
+    def test_health_has_server_timing(self, client):
+        response = client.get('/health')
+        assert 'total;dur=' in response.headers['Server-Timing']
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_stream_reports_phases(self, mock_ydl_class, client):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_ydl.extract_info.return_value = {
+            'url': 'https://audio-stream.example.com/audio.m4a',
+            'title': 'Wonderwall',
+            'ext': 'm4a',
+        }
+
+        response = client.post('/stream',
+                               data=json.dumps({'video_id': 'abc123'}),
+                               content_type='application/json')
+        header = response.headers['Server-Timing']
+        for name in ('cache', 'ydl_init', 'extract', 'serialize', 'total'):
+            assert f'{name};dur=' in header
+
+        # Cache hits skip extraction entirely
+        response = client.post('/stream',
+                               data=json.dumps({'video_id': 'abc123'}),
+                               content_type='application/json')
+        assert 'extract;dur=' not in response.headers['Server-Timing']
+
+    def test_search_stream_logged_after_body(self, client, caplog):
+        def slow_entries(profile, target, deadline=None, pool=None):
+            time.sleep(0.2)
+            yield {'id': 'vid0', 'title': 'Song 0'}
+
+        with patch('app.extract_entries', slow_entries), patch('app.TIMING_LOG', True):
+            with caplog.at_level('INFO', logger='app'):
+                response = client.post('/search/stream',
+                                       data=json.dumps({'query': 'slow'}),
+                                       content_type='application/json')
+                assert len(response.data.decode().splitlines()) == 2
+                response.close()
+
+        # The header would go out before the search ran
+        assert 'Server-Timing' not in response.headers
+        lines = [r.getMessage() for r in caplog.records if r.getMessage().startswith('request_timing ')]
+        logged = json.loads(lines[-1].split(' ', 1)[1])
+        assert logged['path'] == '/search/stream'
+        assert logged['total_ms'] >= 200
+
+
+class TestProfiling:
+    @pytest.fixture
+    def profiling(self, tmp_path):
+        from app import profiler
+        old = (profiler.directory, profiler.profile_key)
+        profiler.directory = str(tmp_path)
+        profiler.profile_key = 'profile-secret'
+        yield profiler
+        profiler.directory, profiler.profile_key = old
+
+    def test_profile_key_captures_profile(self, client, profiling):
+        response = client.get('/health', headers={'X-Profile-Key': 'profile-secret'})
+        profile_id = response.headers['X-Profile-Id']
+
+        listing = client.get('/profiles', headers={'X-Profile-Key': 'profile-secret'})
+        data = json.loads(listing.data)
+        assert data['profiles'][0]['id'] == profile_id
+        assert data['profiles'][0]['path'] == '/health'
+
+        download = client.get(f'/profiles/{profile_id}', headers={'X-Profile-Key': 'profile-secret'})
+        assert download.status_code == 200
+        assert len(download.data) > 0
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_profile_includes_extraction_on_worker_thread(self, mock_ydl_class, client, profiling):
+        import pstats
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+
+        def profiled_extract_marker(*args, **kwargs):
+            return {'url': 'https://audio.url', 'title': 'Song'}
+        mock_ydl.extract_info.side_effect = profiled_extract_marker
+
+        # With a deadline the extraction runs on the extraction executor
+        response = client.post('/stream',
+                               data=json.dumps({'video_id': 'prof1'}),
+                               content_type='application/json',
+                               headers={'X-Profile-Key': 'profile-secret',
+                                        'X-Request-Deadline-Ms': '5000'})
+        assert response.status_code == 200
+        path = profiling.path_for(response.headers['X-Profile-Id'])
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        assert 'profiled_extract_marker' in functions
+
+    def test_search_stream_profile_covers_body(self, client, profiling):
+        import pstats
+
+        def streamed_search_marker(profile, target, deadline=None, pool=None):
+            yield {'id': 'vid0', 'title': 'Song 0'}
+
+        with patch('app.extract_entries', streamed_search_marker):
+            response = client.post('/search/stream',
+                                   data=json.dumps({'query': 'profiled'}),
+                                   content_type='application/json',
+                                   headers={'X-Profile-Key': 'profile-secret'})
+            response.data
+            response.close()
+
+        path = profiling.path_for(response.headers['X-Profile-Id'])
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        assert 'streamed_search_marker' in functions
+
+    def test_no_profile_without_key(self, client, profiling):
+        response = client.get('/health', headers={'X-Profile-Key': 'wrong'})
+        assert 'X-Profile-Id' not in response.headers
+        assert client.get('/profiles').status_code == 404
+
+
+class TestAudioCache:
+    @pytest.fixture
+    def upstream(self, tmp_path):
+        """Serves tmp_path/upstream over HTTP as a googlevideo stand-in."""
+        import functools
+        import http.server
+        import threading
+        directory = tmp_path / 'upstream'
+        directory.mkdir()
+        (directory / 'song.m4a').write_bytes(b'0123456789' * 100)
+        handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(directory))
+        handler.log_message = lambda *args: None
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield f'http://127.0.0.1:{server.server_address[1]}/song.m4a'
+        server.shutdown()
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        from audio_store import AudioStore
+        import app as app_module
+        store = AudioStore(str(tmp_path / 'audio'), max_bytes=10 ** 6, min_plays=2)
+        with patch.object(app_module, 'audio_store', store):
+            yield store
+
+    @patch('app.yt_dlp.YoutubeDL')
+    def test_hot_track_is_served_locally(self, mock_ydl_class, client, store, upstream):
+        mock_ydl = MagicMock()
+        mock_ydl_class.return_value.__enter__ = MagicMock(return_value=mock_ydl)
+        mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_ydl.extract_info.return_value = {'url': upstream, 'title': 'Song', 'ext': 'm4a'}
+
+        def play():
+            response = client.post('/stream', data=json.dumps({'video_id': 'hot1'}),
+                                   content_type='application/json')
+            return json.loads(response.data)
+
+        assert play()['stream_url'] == upstream
+        assert play()['stream_url'] == upstream
+        store.wait()
+
+        data = play()
+        assert data['local'] is True
+        assert data['title'] == 'Song'
+        assert '/audio/hot1?' in data['stream_url']
+        assert mock_ydl.extract_info.call_count == 1
+
+        path = data['stream_url'].split('://', 1)[1].split('/', 1)[1]
+        response = client.get(f'/{path}')
+        assert response.status_code == 200
+        assert response.mimetype == 'audio/mp4'
+        assert response.data == b'0123456789' * 100
+
+        response = client.get(f'/{path}', headers={'Range': 'bytes=10-19'})
+        assert response.status_code == 206
+        assert response.data == b'0123456789'
+        assert response.headers['Content-Range'] == 'bytes 10-19/1000'
+        assert json.loads(client.get('/health').data)['audio_cache']['local_plays'] == 1
+
+    def test_accel_redirect_hands_file_to_nginx(self, client, tmp_path):
+        from audio_store import AudioStore
+        import app as app_module
+        directory = tmp_path / 'accel'
+        directory.mkdir()
+        (directory / 'vid1.m4a').write_bytes(b'audio')
+        (directory / 'vid1.json').write_text(json.dumps({'video_id': 'vid1', 'ext': 'm4a', 'size': 5}))
+        expires = int(time.time()) + 60
+        token = app_module.audio_token('vid1', expires)
+        with patch.object(app_module, 'audio_store', AudioStore(str(directory), max_bytes=10 ** 6)), \
+                patch.object(app_module, 'AUDIO_ACCEL_REDIRECT', '/_audio'):
+            response = client.get(f'/audio/vid1?e={expires}&t={token}', headers={'Range': 'bytes=0-1'})
+        assert response.status_code == 200
+        assert response.headers['X-Accel-Redirect'] == '/_audio/vid1.m4a'
+        assert response.mimetype == 'audio/mp4'
+        assert response.data == b''
+
+    def test_token_is_checked_instead_of_api_key(self, client, store):
+        import app as app_module
+        expires = int(time.time()) + 60
+        token = app_module.audio_token('vid1', expires)
+        os.environ['API_KEY'] = 'test-secret-key'
+        try:
+            with patch.object(app_module, 'API_KEY', 'test-secret-key'):
+                assert client.get(f'/audio/vid1?e={expires}&t=bad').status_code == 403
+                assert client.get(f'/audio/vid1?e={expires}&t=%C3%A9').status_code == 403
+                expired = expires - 120
+                assert client.get(f'/audio/vid1?e={expired}&t={app_module.audio_token("vid1", expired)}').status_code == 403
+                # Valid token, but nothing cached yet
+                assert client.get(f'/audio/vid1?e={expires}&t={token}').status_code == 404
+        finally:
+            os.environ['API_KEY'] = ''
+
+
+class TestExtractionBackend:
+    def test_process_backend_runs_extractions(self, client):
+        import app as app_module
+        backend = MagicMock()
+        backend.extract.return_value = {'url': 'https://audio/worker', 'title': 'Song', 'ext': 'm4a'}
+        with patch.object(app_module, 'process_backend', backend):
+            response = client.post('/stream',
+                                   data=json.dumps({'video_id': 'proc1'}),
+                                   content_type='application/json')
+        assert json.loads(response.data)['stream_url'] == 'https://audio/worker'
+        profile, target, _ = backend.extract.call_args[0]
+        assert profile.name == 'stream'
+        assert target.endswith('proc1')
+
+
 class TestApiKeyAuth:
     def test_api_key_required_when_configured(self, client):
         os.environ['API_KEY'] = 'test-secret-key'
@@ -0,0 +1,143 @@
+"""Tests for the disk-backed audio cache."""
+import http.server
+import re
+import threading
+import time
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from audio_store import AudioStore
+
+AUDIO = bytes(range(256)) * 40  # 10 KiB of "audio"
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """googlevideo stand-in: /ranged honours Range, /plain ignores it."""
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []
+
+    def do_GET(self):
+        type(self).requests_seen.append((self.path, self.headers.get('Range')))
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path.startswith('/ranged') and match:
+            start, end = int(match.group(1)), min(int(match.group(2)), len(AUDIO) - 1)
+            body = AUDIO[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(AUDIO)}')
+        else:
+            body = AUDIO
+            self.send_response(200)
+        self.send_header('Content-Type', 'audio/mp4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def upstream():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def reset_requests():
+    RangeHandler.requests_seen = []
+
+
+def stream(upstream, path='/ranged', **extra):
+    return {'stream_url': f'{upstream}{path}', 'title': 'Song', 'artist': 'Artist',
+            'duration': 200, 'format': 'm4a', **extra}
+
+
+def play(store, video_id, data, times=1):
+    for _ in range(times):
+        store.record_play(video_id)
+    started = store.maybe_fetch(video_id, data)
+    store.wait()
+    return started
+
+
+class TestAudioStore:
+    def test_downloads_only_hot_tracks(self, tmp_path, upstream):
+        store = AudioStore(str(tmp_path), max_bytes=10 ** 6, min_plays=3)
+        assert play(store, 'vid1', stream(upstream), times=2) is False
+        assert store.get('vid1') is None
+
+        assert play(store, 'vid1', stream(upstream)) is True
+        entry = store.get('vid1')
+        with open(entry['path'], 'rb') as f:
+            assert f.read() == AUDIO
+        assert entry['title'] == 'Song'
+        assert store.mimetype(entry) == 'audio/mp4'
+        assert store.stats()['downloads'] == 1
+
+    def test_fetches_in_range_chunks(self, tmp_path, upstream):
+        store = AudioStore(str(tmp_path), max_bytes=10 ** 6, min_plays=1, chunk_size=4096)
+        play(store, 'vid1', stream(upstream))
+        assert [r for _, r in RangeHandler.requests_seen] == [
+            'bytes=0-4095', 'bytes=4096-8191', 'bytes=8192-12287']
+        assert store.get('vid1')['size'] == len(AUDIO)
+
+    def test_server_ignoring_range(self, tmp_path, upstream):
+        store = AudioStore(str(tmp_path), max_bytes=10 ** 6, min_plays=1, chunk_size=4096)
+        play(store, 'vid1', stream(upstream, '/plain'))
+        assert len(RangeHandler.requests_seen) == 1
+        assert store.get('vid1')['size'] == len(AUDIO)
+
+    def test_failed_download_leaves_nothing_behind(self, tmp_path, upstream):
+        store = AudioStore(str(tmp_path), max_bytes=10 ** 6, min_plays=1)
+        play(store, 'vid1', stream(upstream, '/missing'))
+        assert store.get('vid1') is None
+        assert store.stats()['download_failures'] == 1
+        assert os.listdir(tmp_path) == []
+
+    def test_oversized_file_is_rejected(self, tmp_path, upstream):
+        store = AudioStore(str(tmp_path), max_bytes=10 ** 6, min_plays=1, max_file_bytes=1000)
+        play(store, 'vid1', stream(upstream))
+        assert store.get('vid1') is None
+
+    def test_evicts_least_popular_over_budget(self, tmp_path, upstream):
+        store = AudioStore(str(tmp_path), max_bytes=len(AUDIO) * 2, min_plays=1)
+        play(store, 'popular', stream(upstream), times=5)
+        play(store, 'rare', stream(upstream))
+        play(store, 'new', stream(upstream), times=2)
+        assert store.get('popular') is not None
+        assert store.get('new') is not None
+        assert store.get('rare') is None
+        assert not os.path.exists(tmp_path / 'rare.m4a')
+        assert store.stats()['evictions'] == 1
+        assert store.total_bytes <= store.max_bytes
+
+    def test_popularity_decays(self, tmp_path):
+        store = AudioStore(str(tmp_path), max_bytes=10 ** 6, half_life=0.01)
+        store.record_play('vid1')
+        store.record_play('vid1')
+        time.sleep(0.05)
+        assert store.record_play('vid1') < 1.5
+
+    def test_reloads_index_after_restart(self, tmp_path, upstream):
+        store = AudioStore(str(tmp_path), max_bytes=10 ** 6, min_plays=1)
+        play(store, 'vid1', stream(upstream))
+        (tmp_path / 'vid2.m4a.part').write_bytes(b'partial')
+
+        reloaded = AudioStore(str(tmp_path), max_bytes=10 ** 6)
+        assert reloaded.get('vid1')['artist'] == 'Artist'
+        assert not (tmp_path / 'vid2.m4a.part').exists()
+
+    def test_rejects_unsafe_video_ids(self, tmp_path, upstream):
+        store = AudioStore(str(tmp_path), max_bytes=10 ** 6, min_plays=0)
+        assert store.maybe_fetch('../etc/passwd', stream(upstream)) is False
@@ -0,0 +1,72 @@
+"""Tests for request deadline propagation."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from deadline import Deadline, DeadlineExceeded, call_with_deadline
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=2)
+    yield executor
+    executor.shutdown(wait=False)
+
+
+class TestDeadline:
+    def test_from_headers_applies_margin_and_cap(self):
+        deadline = Deadline.from_headers({'X-Request-Deadline-Ms': '60000'}, margin=0.5, max_seconds=10)
+        assert 9 < deadline.remaining() <= 9.5
+
+    def test_missing_or_invalid_header(self):
+        assert Deadline.from_headers({}) is None
+        assert Deadline.from_headers({'X-Request-Deadline-Ms': 'soon'}) is None
+
+    def test_cancel_expires(self):
+        deadline = Deadline(10)
+        assert not deadline.expired
+        deadline.cancel()
+        with pytest.raises(DeadlineExceeded):
+            deadline.check()
+
+    def test_child_can_be_cancelled_alone(self):
+        parent = Deadline(10)
+        first, second = parent.child(), parent.child()
+        first.cancel()
+        assert first.expired
+        assert not second.expired and not parent.expired
+        parent.cancel()
+        assert second.expired
+
+
+class TestCallWithDeadline:
+    def test_no_deadline_runs_inline(self, executor):
+        assert call_with_deadline(executor, None, lambda x: x * 2, 21) == 42
+
+    def test_returns_result_within_deadline(self, executor):
+        assert call_with_deadline(executor, Deadline(5), lambda: 'ok') == 'ok'
+
+    def test_gives_up_and_cancels(self, executor):
+        deadline = Deadline(0.1)
+        seen = []
+
+        def slow():
+            time.sleep(0.3)
+            seen.append(deadline.expired)
+
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            call_with_deadline(executor, deadline, slow)
+        assert time.monotonic() - start < 0.25
+        time.sleep(0.3)
+        assert seen == [True]
+
+    def test_expired_deadline_does_not_start_work(self, executor):
+        calls = []
+        with pytest.raises(DeadlineExceeded):
+            call_with_deadline(executor, Deadline(0), calls.append, 1)
+        assert calls == []
@@ -0,0 +1,160 @@
+"""Tests for the purpose-specific yt-dlp extraction profiles."""
+from unittest.mock import patch, MagicMock
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from deadline import Deadline, DeadlineExceeded
+from extraction import build_profiles, extract, extract_entries
+from http_pool import YDLPool
+
+
+def mock_ydl(mock_ydl_class, info):
+    ydl = MagicMock()
+    mock_ydl_class.return_value.__enter__ = MagicMock(return_value=ydl)
+    mock_ydl_class.return_value.__exit__ = MagicMock(return_value=False)
+    ydl.extract_info.return_value = info
+    return ydl
+
+
+class TestProfiles:
+    def test_stream_profile_skips_manifests(self):
+        opts = build_profiles()['stream'].ydl_opts
+        assert opts['extractor_args']['youtube']['skip'] == ['dash', 'hls', 'translated_subs']
+        assert 'player_client' not in opts['extractor_args']['youtube']
+
+    def test_stream_player_clients_are_pinned(self):
+        opts = build_profiles(stream_player_clients=['web_music'])['stream'].ydl_opts
+        assert opts['extractor_args']['youtube']['player_client'] == ['web_music']
+
+    def test_metadata_profile_skips_player_js(self):
+        opts = build_profiles()['metadata'].ydl_opts
+        assert opts['extractor_args']['youtube']['player_skip'] == ['js']
+        assert opts['ignore_no_formats_error']
+
+
+class TestExtract:
+    @patch('yt_dlp.YoutubeDL')
+    def test_pins_extractor(self, mock_ydl_class):
+        ydl = mock_ydl(mock_ydl_class, {'entries': []})
+        extract(build_profiles()['search'], 'ytsearch5:oasis')
+        ydl.extract_info.assert_called_once_with('ytsearch5:oasis', download=False, ie_key='YoutubeSearch')
+
+    @patch('yt_dlp.YoutubeDL')
+    def test_stream_trims_info(self, mock_ydl_class):
+        mock_ydl(mock_ydl_class, {
+            'url': 'https://audio.url',
+            'title': 'Wonderwall',
+            'ext': 'm4a',
+            'formats': [{'url': 'https://audio.url', 'acodec': 'mp4a'}],
+            'subtitles': {'en': [{}]},
+            'thumbnails': [{'url': 'a'}, {'url': 'b'}],
+        })
+        info = extract(build_profiles()['stream'], 'https://music.youtube.com/watch?v=abc')
+        assert info == {'url': 'https://audio.url', 'title': 'Wonderwall', 'ext': 'm4a'}
+
+    @patch('yt_dlp.YoutubeDL')
+    def test_stream_keeps_formats_for_fallback(self, mock_ydl_class):
+        mock_ydl(mock_ydl_class, {
+            'formats': [{'url': 'https://audio.url', 'acodec': 'mp4a', 'vcodec': 'none',
+                         'http_headers': {'User-Agent': 'x'}, 'fragments': []}],
+        })
+        info = extract(build_profiles()['stream'], 'https://music.youtube.com/watch?v=abc')
+        assert info['formats'] == [{'url': 'https://audio.url', 'acodec': 'mp4a', 'vcodec': 'none'}]
+
+    @patch('yt_dlp.YoutubeDL')
+    def test_search_keeps_first_thumbnail(self, mock_ydl_class):
+        mock_ydl(mock_ydl_class, {'entries': [
+            {'id': 'abc', 'title': 'Song', 'description': 'long text',
+             'thumbnails': [{'url': 'first'}, {'url': 'second'}]},
+            None,
+        ]})
+        info = extract(build_profiles()['search'], 'ytsearch1:song')
+        assert info == {'entries': [{'id': 'abc', 'title': 'Song', 'thumbnails': [{'url': 'first'}]}]}
+
+    @patch('yt_dlp.YoutubeDL')
+    def test_deadline_caps_socket_timeout_and_guards_requests(self, mock_ydl_class):
+        ydl = mock_ydl(mock_ydl_class, {'url': 'https://audio.url'})
+        original_urlopen = ydl.urlopen
+        deadline = Deadline(5)
+        sent = []
+
+        def extract_info(*args, **kwargs):
+            ydl.urlopen('https://www.youtube.com/youtubei/v1/player')
+            sent.append(original_urlopen.call_args[0][0])
+            # Once the caller gives up, the next HTTP request is refused
+            deadline.cancel()
+            ydl.urlopen('https://www.youtube.com/youtubei/v1/next')
+
+        ydl.extract_info.side_effect = extract_info
+        with pytest.raises(DeadlineExceeded):
+            extract(build_profiles()['stream'], 'https://music.youtube.com/watch?v=abc', deadline)
+
+        opts = mock_ydl_class.call_args[0][0]
+        assert opts['socket_timeout'] <= 5
+        assert sent[0].extensions['timeout'] <= 5
+        assert original_urlopen.call_count == 1
+        assert ydl.urlopen is original_urlopen
+
+
+class TestExtractEntries:
+    @patch('yt_dlp.YoutubeDL')
+    def test_yields_trimmed_entries_lazily(self, mock_ydl_class):
+        ydl = mock_ydl(mock_ydl_class, None)
+        pulled = []
+
+        def entries():
+            for i in range(2):
+                pulled.append(i)
+                yield {'id': f'v{i}', 'title': 'Song', 'description': 'long text'}
+
+        ydl.extract_info.return_value = {'entries': entries()}
+        results = extract_entries(build_profiles()['search'], 'ytsearch2:song')
+        assert next(results) == {'id': 'v0', 'title': 'Song'}
+        assert pulled == [0]
+        assert list(results) == [{'id': 'v1', 'title': 'Song'}]
+        ydl.extract_info.assert_called_once_with('ytsearch2:song', download=False,
+                                                 ie_key='YoutubeSearch', process=False)
+        mock_ydl_class.return_value.__exit__.assert_called_once()
+
+
+class TestPooledExtract:
+    @pytest.fixture
+    def pool(self):
+        pool = YDLPool(size=1)
+        yield pool
+        pool.clear()
+
+    @patch('yt_dlp.YoutubeDL')
+    def test_reuses_instance(self, mock_ydl_class, pool):
+        ydl = mock_ydl(mock_ydl_class, {'url': 'https://audio.url'})
+        profile = build_profiles()['stream']
+        extract(profile, 'https://music.youtube.com/watch?v=a', pool=pool)
+        extract(profile, 'https://music.youtube.com/watch?v=b', pool=pool)
+
+        assert mock_ydl_class.call_count == 1
+        assert ydl.extract_info.call_count == 2
+        stats = pool.stats()['stream']
+        assert stats['created'] == 1
+        assert stats['reused'] == 1
+        assert stats['extractions'] == 2
+
+    @patch('yt_dlp.YoutubeDL')
+    def test_unavailable_video_keeps_instance(self, mock_ydl_class, pool):
+        import yt_dlp
+        ydl = mock_ydl(mock_ydl_class, {})
+        ydl.extract_info.side_effect = yt_dlp.utils.DownloadError('unavailable')
+        with pytest.raises(yt_dlp.utils.DownloadError):
+            extract(build_profiles()['stream'], 'https://music.youtube.com/watch?v=a', pool=pool)
+        assert pool.stats()['stream']['idle'] == 1
+
+    @patch('yt_dlp.YoutubeDL')
+    def test_unexpected_error_discards_instance(self, mock_ydl_class, pool):
+        ydl = mock_ydl(mock_ydl_class, {})
+        ydl.extract_info.side_effect = RuntimeError('broken')
+        with pytest.raises(RuntimeError):
+            extract(build_profiles()['stream'], 'https://music.youtube.com/watch?v=a', pool=pool)
+        assert pool.stats()['stream']['idle'] == 0
+        mock_ydl_class.return_value.__exit__.assert_called_once()
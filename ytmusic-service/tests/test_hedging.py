@@ -0,0 +1,122 @@
+"""Tests for hedged extraction."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from deadline import Deadline, DeadlineExceeded
+from hedging import Hedger, LatencyTracker, percentile
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield executor
+    executor.shutdown(wait=False)
+
+
+def trained(executor, **kwargs):
+    """A hedger that already knows primaries take ~10 ms."""
+    hedger = Hedger(executor, min_delay=0.05, min_samples=5, **kwargs)
+    for _ in range(5):
+        hedger.primary_latency.record(0.01)
+    return hedger
+
+
+def slow(seconds, value):
+    def attempt(deadline):
+        # Sleep in small steps, stopping like an extraction would at its
+        # next HTTP request once cancelled
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            deadline.check()
+            time.sleep(0.005)
+        return value
+    return attempt
+
+
+class TestPercentile:
+    def test_nearest_rank(self):
+        assert percentile([5, 1, 3, 2, 4], 50) == 3
+        assert percentile([5, 1, 3, 2, 4], 100) == 5
+        assert percentile([], 95) is None
+
+    def test_tracker_window(self):
+        tracker = LatencyTracker(window=3)
+        for value in (10, 1, 2, 3):
+            tracker.record(value)
+        assert len(tracker) == 3
+        assert tracker.percentile(100) == 3
+
+
+class TestHedger:
+    def test_no_hedge_while_learning(self, executor):
+        hedger = Hedger(executor, min_samples=5)
+        assert hedger.run(slow(0.05, 'primary'), slow(0, 'hedge')) == 'primary'
+        assert hedger.stats()['hedged'] == 0
+        assert len(hedger.primary_latency) == 1
+
+    def test_fast_primary_is_not_hedged(self, executor):
+        hedger = trained(executor)
+        assert hedger.run(slow(0, 'primary'), slow(0, 'hedge')) == 'primary'
+        assert hedger.stats()['hedged'] == 0
+
+    def test_slow_primary_is_hedged_and_cancelled(self, executor):
+        hedger = trained(executor, max_ratio=1.0)
+        cancelled = threading.Event()
+
+        def stuck_primary(deadline):
+            while not deadline.expired:
+                time.sleep(0.005)
+            cancelled.set()
+            raise DeadlineExceeded('cancelled')
+
+        start = time.monotonic()
+        assert hedger.run(stuck_primary, slow(0, 'hedge')) == 'hedge'
+        assert time.monotonic() - start < 1
+        assert cancelled.wait(1)
+        stats = hedger.stats()
+        assert stats['hedged'] == 1
+        assert stats['hedge_wins'] == 1
+        assert stats['served_ms']['p50'] is not None
+
+    def test_primary_can_still_win(self, executor):
+        hedger = trained(executor, max_ratio=1.0)
+        assert hedger.run(slow(0.08, 'primary'), slow(1, 'hedge')) == 'primary'
+        assert hedger.stats()['primary_wins'] == 1
+
+    def test_hedges_are_capped(self, executor):
+        # p50 stays at the trained 10 ms, so every primary is slow enough
+        hedger = trained(executor, max_ratio=0.5, percentile=50)
+        for _ in range(4):
+            hedger.run(slow(0.07, 'primary'), slow(0.5, 'hedge'))
+        stats = hedger.stats()
+        assert stats['hedged'] == 2
+        assert stats['over_budget'] == 2
+
+    def test_failed_primary_falls_back_to_hedge(self, executor):
+        hedger = trained(executor, max_ratio=1.0)
+
+        def failing_primary(deadline):
+            time.sleep(0.08)
+            raise RuntimeError('primary failed')
+
+        assert hedger.run(failing_primary, slow(0.1, 'hedge')) == 'hedge'
+
+    def test_errors_raise_when_both_fail(self, executor):
+        hedger = Hedger(executor)
+
+        def failing(deadline):
+            raise RuntimeError('unavailable')
+
+        with pytest.raises(RuntimeError):
+            hedger.run(failing, failing)
+
+    def test_caller_deadline(self, executor):
+        hedger = trained(executor, max_ratio=1.0)
+        with pytest.raises(DeadlineExceeded):
+            hedger.run(slow(1, 'primary'), slow(1, 'hedge'), Deadline(0.15))
@@ -0,0 +1,144 @@
+"""Tests for pooled yt-dlp instances, connection reuse and the DNS cache."""
+import http.server
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import time
+from unittest.mock import MagicMock, patch
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from extraction import ExtractionProfile
+from http_pool import DNSCache, YDLPool, connection_counts
+
+PROFILE = ExtractionProfile('test', ie_key=None, trim=dict, ydl_opts={
+    'quiet': True,
+    'no_warnings': True,
+    'nocheckcertificate': True,
+})
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def https_server(tmp_path_factory):
+    """A local HTTPS stand-in with a throwaway self-signed certificate."""
+    if not shutil.which('openssl'):
+        pytest.skip('openssl is needed to create a test certificate')
+    directory = tmp_path_factory.mktemp('tls')
+    cert, key = directory / 'cert.pem', directory / 'key.pem'
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', str(key), '-out', str(cert)],
+                   check=True, capture_output=True)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(str(cert), str(key))
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'https://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+
+
+class TestConnectionReuse:
+    def test_pooled_instance_keeps_connection_alive(self, https_server):
+        pool = YDLPool(size=1)
+        try:
+            for _ in range(3):
+                with pool.checkout(PROFILE) as ydl:
+                    assert ydl.urlopen(https_server).read() == b'ok'
+            assert connection_counts(ydl) == (1, 3)
+            assert pool.stats()['test']['reused'] == 2
+        finally:
+            pool.clear()
+
+    def test_fresh_instances_reconnect(self, https_server):
+        import yt_dlp
+        total = [0, 0]
+        for _ in range(2):
+            with yt_dlp.YoutubeDL(PROFILE.ydl_opts) as ydl:
+                ydl.urlopen(https_server).read()
+                connections, requests_sent = connection_counts(ydl)
+                total[0] += connections
+                total[1] += requests_sent
+        assert total == [2, 2]
+
+
+class TestYDLPool:
+    @pytest.fixture
+    def ydl_class(self):
+        with patch('yt_dlp.YoutubeDL') as mock_ydl_class:
+            mock_ydl_class.side_effect = lambda opts: MagicMock()
+            yield mock_ydl_class
+
+    def test_overflow_when_all_busy(self, ydl_class):
+        pool = YDLPool(size=1)
+        with pool.checkout(PROFILE) as first:
+            with pool.checkout(PROFILE) as second:
+                assert first is not second
+        stats = pool.stats()['test']
+        assert stats['created'] == 1
+        assert stats['overflow'] == 1
+        assert stats['idle'] == 1
+
+    def test_idle_instances_expire(self, ydl_class):
+        pool = YDLPool(size=1, idle_timeout=0.05)
+        with pool.checkout(PROFILE) as first:
+            pass
+        time.sleep(0.1)
+        with pool.checkout(PROFILE) as second:
+            assert first is not second
+        assert pool.stats()['test']['expired'] == 1
+
+    def test_clear_drops_instances_checked_out_before(self, ydl_class):
+        pool = YDLPool(size=2)
+        with pool.checkout(PROFILE):
+            pool.clear()
+        with pool.checkout(PROFILE):
+            pass
+        assert pool.stats()['test']['created'] == 1
+        assert pool.stats()['test']['idle'] == 1
+
+
+class TestDNSCache:
+    def test_caches_lookups_until_ttl(self):
+        cache = DNSCache(ttl=0.05)
+        resolver = MagicMock(return_value=[('addr',)])
+        cache._original = resolver
+        assert cache.getaddrinfo('example.com', 443) == [('addr',)]
+        cache.getaddrinfo('example.com', 443)
+        assert resolver.call_count == 1
+        time.sleep(0.1)
+        cache.getaddrinfo('example.com', 443)
+        assert resolver.call_count == 2
+        assert cache.stats()['hits'] == 1
+
+    def test_install_and_uninstall(self):
+        original = socket.getaddrinfo
+        cache = DNSCache()
+        cache.install()
+        try:
+            assert socket.getaddrinfo == cache.getaddrinfo
+            assert socket.getaddrinfo('127.0.0.1', 80)
+        finally:
+            cache.uninstall()
+        assert socket.getaddrinfo is original
@@ -0,0 +1,228 @@
+"""Tests for the process-pool extraction backend."""
+import http.server
+import json
+import threading
+import time
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from deadline import Deadline, DeadlineExceeded
+from extraction import BASE_OPTS, ExtractionProfile, _trim_stream
+from process_backend import ProcessBackend
+
+DIRECT = ExtractionProfile('direct', ie_key='Generic', ydl_opts=BASE_OPTS, trim=_trim_stream)
+
+
+# Worker tasks: module-level so they can be pickled by reference
+
+def pid(deadline):
+    return os.getpid()
+
+
+def sleep_for(seconds, deadline):
+    time.sleep(seconds)
+    return seconds
+
+
+def pid_then_sleep(marker, seconds, deadline):
+    with open(marker, 'w') as f:
+        f.write(str(os.getpid()))
+    time.sleep(seconds)
+    return seconds
+
+
+def crash_once(marker, deadline):
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return 'recovered'
+
+
+def remaining(deadline):
+    return deadline.remaining()
+
+
+def wait_for_cancel(marker, deadline):
+    start = time.monotonic()
+    while not deadline.expired:
+        time.sleep(0.05)
+    with open(marker, 'w') as f:
+        f.write(f'{time.monotonic() - start:.1f}')
+
+
+def process_running(pid):
+    """True unless ``pid`` is gone or a zombie."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] not in ('Z', 'X')
+    except FileNotFoundError:
+        return False
+
+
+class AudioHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b'\x00' * 1024
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mp4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MissingHandler(AudioHandler):
+    def do_GET(self):
+        self.send_error(404)
+
+
+@pytest.fixture
+def server():
+    """Local HTTP server; yields a URL template for a handler class."""
+    servers = []
+
+    def serve(handler_class):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}/{{}}.m4a'
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def backend():
+    backend = ProcessBackend({'direct': DIRECT}, workers=2, task_timeout=5)
+    yield backend
+    backend.shutdown()
+
+
+class TestProcessBackend:
+    def test_runs_in_worker_process(self, backend):
+        backend.warm()
+        assert backend.call(pid) != os.getpid()
+        assert backend.stats()['tasks'] == 1
+
+    def test_extract_returns_trimmed_info(self, backend, server):
+        url = server(AudioHandler).format('song')
+        info = backend.extract(DIRECT, url, Deadline(10))
+        assert info['url'] == url
+        assert set(info) <= {'url', 'title', 'artist', 'uploader', 'duration', 'ext'}
+
+    def test_worker_gets_the_callers_time_left(self, backend):
+        assert backend.call(remaining, deadline=Deadline(1)) <= 1
+        assert backend.call(remaining) > 1
+
+    def test_crashed_worker_is_retried_on_new_pool(self, backend, tmp_path):
+        assert backend.call(crash_once, str(tmp_path / 'crashed')) == 'recovered'
+        stats = backend.stats()
+        assert stats['crashes'] == 1
+        assert stats['retries'] == 1
+        assert stats['rebuilds'] == 1
+
+    def test_overrunning_task_is_killed(self):
+        backend = ProcessBackend({}, workers=1, task_timeout=0.2, grace=0.2)
+        try:
+            start = time.monotonic()
+            with pytest.raises(DeadlineExceeded):
+                backend.call(sleep_for, 30)
+            assert time.monotonic() - start < 5
+            assert backend.stats()['timeouts'] == 1
+            # The pool was rebuilt and serves again
+            assert backend.call(sleep_for, 0) == 0
+        finally:
+            backend.shutdown()
+
+    def test_overrun_spares_other_tasks(self, tmp_path):
+        backend = ProcessBackend({}, workers=2, task_timeout=1, grace=0.2)
+        marker = tmp_path / 'stuck'
+        try:
+            backend.warm()
+            results = []
+            other = threading.Thread(target=lambda: results.append(backend.call(sleep_for, 0.9)))
+            threading.Timer(0.5, other.start).start()
+            with pytest.raises(DeadlineExceeded):
+                backend.call(pid_then_sleep, str(marker), 30)
+            other.join()
+            # The task running next to the stuck one finished on the old pool
+            assert results == [0.9]
+            stats = backend.stats()
+            assert stats['timeouts'] == 1
+            assert stats['crashes'] == 0 and stats['retries'] == 0
+            # ...and then the stuck worker was killed
+            stuck = int(marker.read_text())
+            for _ in range(50):
+                if not process_running(stuck):
+                    break
+                time.sleep(0.1)
+            assert not process_running(stuck)
+        finally:
+            backend.shutdown()
+
+    def test_fork_ignores_max_tasks_per_child(self):
+        backend = ProcessBackend({}, workers=1, max_tasks_per_child=1, start_method='fork')
+        try:
+            assert backend.max_tasks_per_child == 0
+            assert backend.call(pid) != os.getpid()
+        finally:
+            backend.shutdown()
+
+    def test_cancelled_deadline_stops_waiting(self, backend):
+        deadline = Deadline(10)
+        threading.Timer(0.2, deadline.cancel).start()
+        with pytest.raises(DeadlineExceeded):
+            backend.call(sleep_for, 2, deadline=deadline)
+
+    def test_cancel_reaches_the_worker(self, backend, tmp_path):
+        marker = tmp_path / 'stopped'
+        deadline = Deadline(10)
+        threading.Timer(0.2, deadline.cancel).start()
+        with pytest.raises(DeadlineExceeded):
+            backend.call(wait_for_cancel, str(marker), deadline=deadline)
+        for _ in range(50):
+            if marker.exists() and marker.read_text():
+                break
+            time.sleep(0.1)
+        # Stopped well before its own 5s timeout
+        assert float(marker.read_text()) < 2
+        assert backend.stats()['cancelled'] == 1
+
+    def test_memory_ceiling_recycles_workers(self):
+        backend = ProcessBackend({}, workers=1, max_rss_mb=1)
+        try:
+            first = backend.call(pid)
+            assert backend.stats()['memory_recycles'] == 1
+            assert backend.call(pid) != first
+            assert backend.stats()['max_rss_mb'] > 1
+        finally:
+            backend.shutdown()
+
+    def test_workers_replaced_after_max_tasks(self):
+        backend = ProcessBackend({}, workers=1, max_tasks_per_child=1)
+        try:
+            assert backend.call(pid) != backend.call(pid)
+        finally:
+            backend.shutdown()
+
+    def test_unavailable_video_is_404_through_pool(self, server, monkeypatch):
+        import app
+
+        # The worker runs app's 'stream' profile as a direct download
+        stream = ExtractionProfile('stream', ie_key='Generic', ydl_opts=BASE_OPTS, trim=_trim_stream)
+        backend = ProcessBackend({'stream': stream}, workers=1, task_timeout=5)
+        monkeypatch.setattr(app, 'process_backend', backend)
+        monkeypatch.setattr(app, 'VIDEO_URL', server(MissingHandler))
+        try:
+            with app.app.test_client() as client:
+                response = client.post('/stream', data=json.dumps({'video_id': 'gone1'}),
+                                       content_type='application/json')
+        finally:
+            backend.shutdown()
+        assert response.status_code == 404
+        assert backend.stats()['errors'] == 1
@@ -0,0 +1,70 @@
+"""Tests for the server-side play queue store."""
+import time
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from queue_store import QueueStore
+
+TRACKS = [
+    {'video_id': 'a', 'title': 'Song A', 'artist': 'Artist 1', 'thumbnail': 'https://x', 'duration': '3:00'},
+    {'video_id': 'b', 'title': 'Song B', 'artist': 'Artist 2'},
+    {'video_id': 'c', 'title': 'Song C', 'artist': 'Artist 3'},
+]
+
+
+class TestQueueStore:
+    def test_create_keeps_compact_tracks(self):
+        store = QueueStore()
+        current = store.create('q1', TRACKS + [{'title': 'no id'}])
+        assert current == {'video_id': 'a', 'title': 'Song A', 'artist': 'Artist 1', 'index': 0}
+        assert store.info('q1') == {'index': 0, 'length': 3}
+
+    def test_create_requires_tracks(self):
+        with pytest.raises(ValueError):
+            QueueStore().create('q1', [{'title': 'no id'}])
+
+    def test_target_wraps_both_ways(self):
+        store = QueueStore()
+        store.create('q1', TRACKS)
+        assert store.target('q1', -1)['video_id'] == 'c'
+        store.move_to('q1', 2)
+        assert store.target('q1', 1)['video_id'] == 'a'
+
+    def test_target_without_wrap_stops_at_end(self):
+        store = QueueStore()
+        store.create('q1', TRACKS, start_index=2)
+        assert store.target('q1', 1, wrap=False) is None
+
+    def test_target_does_not_move(self):
+        store = QueueStore()
+        store.create('q1', TRACKS)
+        store.target('q1', 1)
+        assert store.current('q1')['index'] == 0
+
+    def test_peek_returns_upcoming(self):
+        store = QueueStore()
+        store.create('q1', TRACKS)
+        assert [t['video_id'] for t in store.peek('q1', 5)] == ['b', 'c']
+
+    def test_expired_queue_is_gone(self):
+        store = QueueStore(ttl=0.05)
+        store.create('q1', TRACKS)
+        time.sleep(0.1)
+        assert store.current('q1') is None
+
+    def test_evicts_least_recently_used(self):
+        store = QueueStore(max_queues=2)
+        store.create('q1', TRACKS)
+        store.create('q2', TRACKS)
+        store.current('q1')
+        store.create('q3', TRACKS)
+        assert store.current('q2') is None
+        assert store.current('q1') is not None
+
+    def test_max_tracks(self):
+        store = QueueStore(max_tracks=2)
+        store.create('q1', TRACKS)
+        assert store.info('q1')['length'] == 2
@@ -0,0 +1,99 @@
+"""Tests for cache trace capture and the cache-policy simulator."""
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from cache_trace import CacheTracer, hash_key, read_trace
+from simulate import SimCache, build_caches, main, simulate
+
+
+def record(ts, key, endpoint='/stream', hit=False, size=None):
+    r = {'ts': ts, 'endpoint': endpoint, 'key': key, 'hit': hit}
+    if size:
+        r['size'] = size
+    return r
+
+
+class TestCacheTracer:
+    def test_writes_ndjson_with_hashed_keys(self, tmp_path):
+        path = str(tmp_path / 'trace.ndjson')
+        tracer = CacheTracer(path)
+        tracer.record('/search', 'oasis:10', False)
+        tracer.record('/search', 'oasis:10', True, {'results': []})
+        assert tracer.flush()
+
+        records = list(read_trace(path))
+        assert [r['hit'] for r in records] == [False, True]
+        assert records[0]['key'] == hash_key('oasis:10')
+        assert 'size' not in records[0]
+        assert records[1]['size'] == len('{"results":[]}')
+
+    def test_plain_keys(self, tmp_path):
+        path = str(tmp_path / 'trace.ndjson')
+        tracer = CacheTracer(path, hash_keys=False)
+        tracer.record('/stream', 'abc123', False)
+        tracer.flush()
+        assert next(read_trace(path))['key'] == 'abc123'
+
+
+class TestSimCache:
+    def test_ttl_expiry(self):
+        cache = SimCache('ttl', ttl=10, max_entries=100)
+        cache.insert('a', 100, now=0)
+        assert cache.lookup('a', now=5)
+        assert not cache.lookup('a', now=10)
+
+    def test_ttl_policy_cleans_up_past_threshold(self):
+        cache = SimCache('ttl', ttl=10, max_entries=2)
+        cache.insert('a', 100, now=0)
+        cache.insert('b', 100, now=1)
+        assert cache.memory == 200
+        cache.insert('c', 100, now=20)
+        assert list(cache.entries) == ['c']
+        assert cache.memory == 100
+
+    def test_lru_evicts_least_recent(self):
+        cache = SimCache('lru', ttl=100, max_entries=2)
+        cache.insert('a', 1, now=0)
+        cache.insert('b', 1, now=1)
+        cache.lookup('a', now=2)
+        cache.insert('c', 1, now=3)
+        assert set(cache.entries) == {'a', 'c'}
+
+    def test_lfu_evicts_least_used(self):
+        cache = SimCache('lfu', ttl=100, max_entries=2)
+        cache.insert('a', 1, now=0)
+        cache.insert('b', 1, now=1)
+        cache.lookup('b', now=2)
+        cache.lookup('b', now=3)
+        cache.insert('c', 1, now=4)
+        assert set(cache.entries) == {'b', 'c'}
+
+
+class TestSimulate:
+    def test_counts_hits_and_extractions(self):
+        records = [record(0, 'a'), record(1, 'a', hit=True, size=400), record(2, 'b'),
+                   record(3, 'x', endpoint='/get_song')]
+        result = simulate(records, build_caches('ttl', 3600, 600, 0, 0))
+
+        assert result['endpoints']['/stream'] == {'requests': 3, 'hits': 1, 'extractions': 2, 'observed_hits': 1}
+        assert result['endpoints']['/get_song']['extractions'] == 1
+        assert result['total']['peak_memory'] == 800
+
+    def test_longer_ttl_projects_more_hits(self):
+        records = [record(0, 'a'), record(700, 'a', endpoint='/stream')]
+        short = simulate(records, build_caches('ttl', 600, 600, 0, 0))['total']
+        long = simulate(records, build_caches('ttl', 3600, 600, 0, 0))['total']
+        assert short['hits'] == 0
+        assert long['hits'] == 1
+
+    def test_cli_reports_grid(self, tmp_path, capsys):
+        path = tmp_path / 'trace.ndjson'
+        path.write_text('\n'.join(json.dumps(record(i, 'a')) for i in range(3)))
+
+        assert main([str(path), '--policy', 'ttl,lru', '--max-entries', '10']) == 0
+        out = capsys.readouterr().out
+        assert '3 requests' in out
+        assert out.count('\nttl ') == 1 and out.count('\nlru ') == 1
@@ -0,0 +1,73 @@
+"""Tests for startup warm-up and hot key persistence."""
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from warmup import Warmup, save_hot_keys, load_hot_keys
+
+
+class TestWarmup:
+    def test_ready_until_started(self):
+        warmup = Warmup()
+        assert warmup.ready
+        assert warmup.as_dict()['status'] == 'disabled'
+
+    def test_runs_steps_in_order(self):
+        calls = []
+        warmup = Warmup()
+        warmup.add_step('first', lambda: calls.append('first'))
+        warmup.add_step('second', lambda: calls.append('second'))
+        warmup.start(background=False)
+
+        assert calls == ['first', 'second']
+        assert warmup.ready
+        assert warmup.results['first']['ok']
+
+    def test_not_ready_while_running(self):
+        warmup = Warmup()
+        warmup.add_step('slow', lambda: time.sleep(0.2))
+        warmup.start()
+        assert not warmup.ready
+        assert warmup.wait(timeout=5)
+
+    def test_failing_step_does_not_block_readiness(self):
+        def boom():
+            raise RuntimeError('no network')
+
+        warmup = Warmup()
+        warmup.add_step('canary', boom)
+        warmup.start(background=False)
+
+        assert warmup.ready
+        assert warmup.results['canary'] == {'ok': False, 'error': 'no network',
+                                            'ms': warmup.results['canary']['ms']}
+
+
+class TestHotKeys:
+    def test_roundtrip_keeps_fresh_entries(self, tmp_path):
+        path = str(tmp_path / 'hot.json')
+        now = time.time()
+        cache = {
+            'fresh': {'data': {'video_id': 'fresh'}, 'timestamp': now},
+            'stale': {'data': {'video_id': 'stale'}, 'timestamp': now - 7200},
+        }
+        assert save_hot_keys(path, {'stream': (cache, 3600)}, max_entries=10) == 1
+
+        restored = {}
+        assert load_hot_keys(path, {'stream': (restored, 3600)}) == 1
+        assert list(restored) == ['fresh']
+
+    def test_save_keeps_most_recent(self, tmp_path):
+        path = str(tmp_path / 'hot.json')
+        now = time.time()
+        cache = {f'k{i}': {'data': i, 'timestamp': now - i} for i in range(5)}
+        save_hot_keys(path, {'search': (cache, 3600)}, max_entries=2)
+
+        restored = {}
+        load_hot_keys(path, {'search': (restored, 3600)})
+        assert sorted(restored) == ['k0', 'k1']
+
+    def test_missing_file_loads_nothing(self, tmp_path):
+        assert load_hot_keys(str(tmp_path / 'missing.json'), {'stream': ({}, 60)}) == 0
@@ -0,0 +1,218 @@
+"""Per-request phase timing and on-demand profiling for the Flask service.
+
+Endpoints wrap their expensive steps in ``phase('name')``. The durations are
+sent back in a ``Server-Timing`` header and written as one structured log
+line per request, so a slow ``/stream`` shows where the time went (cache
+lookup, YoutubeDL construction, ``extract_info``, format fallback, jsonify).
+
+Individual requests can also be profiled with cProfile, either on demand with
+the ``X-Profile-Key`` header or by random sampling. Profiles are written to a
+directory as pstats dumps and can be downloaded later. cProfile only follows
+the thread it was enabled on, so work a profiled request hands to an executor
+runs through ``profiled`` and is merged into the same dump.
+"""
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+logger = logging.getLogger(__name__)
+
+# Profiles of work the request being profiled ran on other threads
+_thread_profiles = contextvars.ContextVar('thread_profiles', default=None)
+
+PROFILE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class RequestTimer:
+    """Collects named phase durations for a single request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []
+        self.counters = {}
+
+    def add(self, name, duration):
+        self.phases.append((name, duration))
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        """Format the phases (plus the total) as a Server-Timing header value."""
+        parts = [f'{name};dur={duration * 1000:.1f}' for name, duration in self.phases]
+        parts.append(f'total;dur={self.total() * 1000:.1f}')
+        return ', '.join(parts)
+
+    def as_dict(self):
+        phases = {}
+        for name, duration in self.phases:
+            phases[name] = round(phases.get(name, 0) + duration * 1000, 1)
+        result = {'total_ms': round(self.total() * 1000, 1), 'phases_ms': phases}
+        if self.counters:
+            result['counters'] = dict(self.counters)
+        return result
+
+
+@contextmanager
+def phase(name):
+    """Time a block and record it on the current request's timer.
+
+    Outside a request (background warm-up, batch workers without a request
+    context) this is a no-op, so shared code can call it unconditionally.
+    """
+    timer = g.get('timer') if has_request_context() else None
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def count(name, value=1):
+    """Add ``value`` to a named counter on the current request's timer.
+
+    Counters (e.g. HTTP connections opened) go into the timing log line.
+    Like ``phase``, this is a no-op outside a request.
+    """
+    timer = g.get('timer') if has_request_context() else None
+    if timer is not None:
+        timer.count(name, value)
+
+
+def profiled(fn, *args):
+    """Call ``fn(*args)``, profiling it if the calling request is being profiled.
+
+    For executor workers; run it in a copy of the request's context.
+    """
+    collected = _thread_profiles.get()
+    if collected is None:
+        return fn(*args)
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return fn(*args)
+    try:
+        return fn(*args)
+    finally:
+        profile.disable()
+        collected.append(profile)
+
+
+class Profiler:
+    """Captures cProfile dumps of individual requests.
+
+    A request is profiled when it carries ``X-Profile-Key`` matching
+    ``profile_key`` or when it is picked by ``sample_rate``. Only one request
+    is profiled at a time; cProfile cannot safely run several profilers in
+    one process, so concurrent candidates are simply skipped.
+    """
+
+    def __init__(self, directory, profile_key='', sample_rate=0.0, max_files=50):
+        self.directory = directory
+        self.profile_key = profile_key
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.profile_key) or self.sample_rate > 0
+
+    def is_authorized(self, headers):
+        return bool(self.profile_key) and headers.get('X-Profile-Key', '') == self.profile_key
+
+    def should_profile(self, headers):
+        if self.is_authorized(headers):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, headers):
+        """Start profiling the current request if it qualifies. Returns the profile or None."""
+        if not self.enabled or not self.should_profile(headers):
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiling tool is active (e.g. a debugger)
+            self._lock.release()
+            return None
+        profile.thread_profiles = []
+        _thread_profiles.set(profile.thread_profiles)
+        return profile
+
+    def stop(self, profile, method, path, profile_id=None):
+        """Stop ``profile`` and write it to disk. Returns the profile id.
+
+        ``profile_id`` is used when the id was already handed out (streamed
+        responses send their headers before the profile is stopped).
+        """
+        try:
+            profile.disable()
+            _thread_profiles.set(None)
+        finally:
+            self._lock.release()
+
+        # Workers still running (the request gave up on them) are left out
+        stats = pstats.Stats(profile)
+        for thread_profile in list(profile.thread_profiles):
+            stats.add(thread_profile)
+
+        profile_id = profile_id or uuid.uuid4().hex
+        os.makedirs(self.directory, exist_ok=True)
+        stats.dump_stats(os.path.join(self.directory, f'{profile_id}.prof'))
+        with open(os.path.join(self.directory, f'{profile_id}.json'), 'w') as f:
+            json.dump({'id': profile_id, 'method': method, 'path': path, 'timestamp': time.time()}, f)
+        self._prune()
+        return profile_id
+
+    def list(self):
+        """Return metadata for stored profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        profiles.sort(key=lambda p: p.get('timestamp', 0), reverse=True)
+        return profiles
+
+    def path_for(self, profile_id):
+        """Return the pstats file for ``profile_id``, or None if unknown."""
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f'{profile_id}.prof')
+        return path if os.path.exists(path) else None
+
+    def _prune(self):
+        for meta in self.list()[self.max_files:]:
+            for ext in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, f"{meta['id']}{ext}"))
+                except OSError:
+                    pass
@@ -0,0 +1,120 @@
+"""Startup warm-up and readiness tracking.
+
+A fresh process (systemd restart, new container) serves its first requests
+fully cold: yt-dlp's extractor registry is not imported yet, caches are empty
+and no player JS has been fetched. ``Warmup`` runs a list of named steps in a
+background thread and reports readiness, so ``/ready`` can stay 503 until the
+process is actually warm while ``/health`` keeps answering liveness probes.
+
+Hot cache entries are persisted on shutdown with ``save_hot_keys`` and loaded
+back by a warm-up step, so a restart within the cache TTL starts with them.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Runs warm-up steps once, in order, and tracks readiness.
+
+    Status is ``disabled`` until ``start()`` is called, then ``running`` and
+    finally ``done``. A failing step is logged and recorded but does not keep
+    the process unready: serving cold is better than not serving at all.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.status = 'disabled'
+        self.results = {}
+        self.started_at = None
+        self.finished_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def add_step(self, name, func):
+        self.steps.append((name, func))
+
+    @property
+    def ready(self):
+        return self.status in ('disabled', 'done')
+
+    def start(self, background=True):
+        """Begin warm-up. Readiness flips to false immediately."""
+        with self._lock:
+            if self.status != 'disabled':
+                return
+            self.status = 'running'
+            self.started_at = time.time()
+        if background:
+            self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+            self._thread.start()
+        else:
+            self._run()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _run(self):
+        for name, func in self.steps:
+            start = time.perf_counter()
+            try:
+                detail = func()
+                self.results[name] = {'ok': True, 'ms': round((time.perf_counter() - start) * 1000, 1)}
+                if detail is not None:
+                    self.results[name]['detail'] = detail
+            except Exception as e:
+                logger.warning(f"Warm-up step '{name}' failed: {e}")
+                self.results[name] = {'ok': False, 'error': str(e),
+                                      'ms': round((time.perf_counter() - start) * 1000, 1)}
+        self.finished_at = time.time()
+        self.status = 'done'
+        logger.info(f"Warm-up finished in {self.finished_at - self.started_at:.2f}s: {self.results}")
+
+    def as_dict(self):
+        data = {'status': self.status, 'ready': self.ready, 'steps': self.results}
+        if self.started_at and self.finished_at:
+            data['duration_ms'] = round((self.finished_at - self.started_at) * 1000, 1)
+        return data
+
+
+def save_hot_keys(path, caches, max_entries):
+    """Persist the most recently written entries of each named cache.
+
+    ``caches`` maps a name to ``(cache_dict, ttl)``. Expired entries are
+    skipped. Writes atomically so a crash mid-save never leaves a torn file.
+    """
+    now = time.time()
+    payload = {}
+    for name, (cache, ttl) in caches.items():
+        live = [(k, v) for k, v in list(cache.items()) if now - v['timestamp'] < ttl]
+        live.sort(key=lambda kv: kv[1]['timestamp'], reverse=True)
+        payload[name] = dict(live[:max_entries])
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+    return sum(len(entries) for entries in payload.values())
+
+
+def load_hot_keys(path, caches):
+    """Load entries saved by ``save_hot_keys`` that are still within TTL."""
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        payload = json.load(f)
+
+    now = time.time()
+    loaded = 0
+    for name, (cache, ttl) in caches.items():
+        for key, entry in payload.get(name, {}).items():
+            if now - entry.get('timestamp', 0) < ttl and key not in cache:
+                cache[key] = entry
+                loaded += 1
+    return loaded